@@ -0,0 +1,510 @@
+#!/usr/bin/env python3
+"""
+Measure torrent creation throughput on synthetic datasets
+
+    python benchmarks/bench.py run -o results.json
+    python benchmarks/bench.py compare baseline.json results.json
+
+Datasets are generated once in --data-dir from a fixed seed, so runs on
+different versions hash the same bytes. Every case runs in a fresh
+process to measure its peak RSS, and the median of --repeat runs is
+reported. The first run of a case usually reads from disk and the others
+from the page cache, so compare results from the same host only.
+"""
+
+import argparse
+import itertools
+import json
+import os
+import platform
+import random
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+# Benchmark the tree this script is in, not an installed torf-gui
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from torf_gui import __version__, engine
+from torf_gui.hasher import READERS
+
+DATA_DIR = os.path.join(tempfile.gettempdir(), "torf-gui-bench")
+
+SEED = 1
+
+KiB = 1024
+MiB = 1024 * KiB
+
+# Default regression threshold in percent
+THRESHOLD = 10
+
+
+def _fill(path, size, rng, block):
+    # Random blocks at random offsets are incompressible and reproducible
+    # without generating every byte
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as f:
+        while size > 0:
+            offset = rng.randrange(len(block) // 2)
+            chunk = block[offset : offset + min(size, len(block) // 2)]
+            f.write(chunk)
+            size -= len(chunk)
+
+
+def _huge(path, scale, rng, block):
+    _fill(os.path.join(path, "huge.bin"), int(1024 * MiB * scale), rng, block)
+
+
+def _tiny(path, scale, rng, block):
+    for i in range(max(1, int(20000 * scale))):
+        filepath = os.path.join(path, f"{i // 1000:03d}", f"{i:06d}.txt")
+        _fill(filepath, rng.randrange(1, 8 * KiB), rng, block)
+
+
+def _release(path, scale, rng, block):
+    for i in range(8):
+        filepath = os.path.join(path, f"release.part{i + 1:02d}.rar")
+        _fill(filepath, int(50 * MiB * scale) or 1, rng, block)
+    _fill(os.path.join(path, "release.nfo"), 12 * KiB, rng, block)
+    _fill(os.path.join(path, "release.sfv"), 1 * KiB, rng, block)
+    _fill(
+        os.path.join(path, "Sample", "sample.mkv"),
+        int(30 * MiB * scale) or 1,
+        rng,
+        block,
+    )
+    for lang in ("en", "de", "fr", "es"):
+        filepath = os.path.join(path, "Subs", f"release.{lang}.srt")
+        _fill(filepath, 80 * KiB, rng, block)
+
+
+def _batch(path, scale, rng, block):
+    for i in range(max(1, int(40 * scale))):
+        entry = os.path.join(path, f"entry{i:03d}")
+        for depth in range(4):
+            subdir = os.path.join(entry, *[f"d{d}" for d in range(depth)])
+            for j in range(5):
+                filepath = os.path.join(subdir, f"file{j}.bin")
+                _fill(filepath, rng.randrange(64 * KiB, 1 * MiB), rng, block)
+
+
+# Name -> (generator, created in batch mode)
+DATASETS = {
+    "huge": (_huge, False),
+    "tiny": (_tiny, False),
+    "release": (_release, False),
+    "batch": (_batch, True),
+}
+
+
+def generate(name, data_dir, scale):
+    """Return the path of dataset `name`, generating it if necessary"""
+    path = os.path.join(data_dir, f"{name}-{scale:g}")
+    marker = os.path.join(data_dir, f"{name}-{scale:g}.done")
+    if os.path.exists(marker):
+        return path
+    if os.path.exists(path):
+        shutil.rmtree(path)
+    print(f"Generating {name} dataset in {path}", file=sys.stderr)
+    rng = random.Random(f"{SEED}-{name}")
+    block = rng.randbytes(2 * MiB)
+    generator, _ = DATASETS[name]
+    generator(path, scale, rng, block)
+    open(marker, "w").close()
+    return path
+
+
+def peak_rss():
+    """Return the peak resident set size of this process in bytes"""
+    try:
+        import resource
+    except ImportError:
+        return None
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Bytes on macOS, KiB elsewhere
+    return maxrss if sys.platform == "darwin" else maxrss * KiB
+
+
+def run_single(path, save_dir, piece_size, threads, reader, md5, prefetch):
+    # Like CreateTorrentQThread, which emits a signal for each callback
+    signals = 0
+
+    def callback(torrent, filepath, pieces_done, pieces_total):
+        nonlocal signals
+        signals += 1
+
+    files = engine.scan(path)
+    torrent = engine.torrent_from_scan(path, files)
+    torrent.include_md5 = md5
+    engine.set_piece_size(torrent, piece_size)
+    engine.create_torrent(
+        torrent,
+        os.path.join(save_dir, "bench.torrent"),
+        threads=threads,
+        callback=callback,
+        interval=engine.PROGRESS_INTERVAL,
+        files=files,
+        reader=reader,
+        prefetch=prefetch,
+    )
+    return torrent.size, len(files), signals
+
+
+def run_batch(
+    path, save_dir, piece_size, threads, jobs, reader, md5, prefetch
+):
+    # Like CreateTorrentBatchQThread; piece sizes are always picked by torf
+    signals = 0
+
+    def callback(name, done, total):
+        nonlocal signals
+        signals += 1
+
+    batch = engine.BatchCreator(
+        path=path,
+        exclude=[],
+        save_dir=save_dir,
+        trackers=[],
+        web_seeds=[],
+        private=False,
+        source="",
+        randomize_infohash=False,
+        comment="",
+        include_md5=md5,
+        jobs=jobs,
+        threads=threads,
+        reader=reader,
+        prefetch=prefetch,
+    )
+    batch.run(progress=callback, entry_progress=callback)
+    files = engine.scan(path)
+    return sum(size for _, size in files), len(files), signals
+
+
+def run_case(case):
+    """Run one benchmark case in this process and return its result"""
+    # Don't measure the time it takes to import torf
+    import torf  # noqa: F401
+
+    started = time.perf_counter()
+    with tempfile.TemporaryDirectory() as save_dir:
+        if case["batch"]:
+            size, files, signals = run_batch(
+                case["path"],
+                save_dir,
+                case["piece_size"],
+                case["threads"],
+                case["jobs"],
+                case["reader"],
+                case["md5"],
+                case["prefetch"],
+            )
+        else:
+            size, files, signals = run_single(
+                case["path"],
+                save_dir,
+                case["piece_size"],
+                case["threads"],
+                case["reader"],
+                case["md5"],
+                case["prefetch"],
+            )
+    seconds = time.perf_counter() - started
+    return {
+        "seconds": seconds,
+        "size": size,
+        "files": files,
+        "mb_per_s": size / MiB / seconds,
+        "files_per_s": files / seconds,
+        "peak_rss": peak_rss(),
+        "signals": signals,
+    }
+
+
+def case_name(dataset, piece_size, threads, jobs, reader, md5, prefetch):
+    ps = (
+        engine.format_size(piece_size).replace(" ", "")
+        if piece_size
+        else "auto"
+    )
+    name = f"{dataset}/ps={ps}/threads={threads}"
+    if jobs:
+        name += f"/jobs={jobs}"
+    # Names of stock reader cases stay comparable with older baselines
+    if reader != "stock":
+        name += f"/reader={reader}"
+    if md5:
+        name += "/md5"
+    if prefetch:
+        name += f"/prefetch={prefetch}"
+    return name
+
+
+def cases(args):
+    for dataset in args.datasets:
+        path = generate(dataset, args.data_dir, args.scale)
+        batch = DATASETS[dataset][1]
+        # Batch entries always get the piece size picked by torf
+        piece_sizes = [None] if batch else args.piece_sizes
+        jobs = args.jobs if batch else [None]
+        for (
+            prefetch,
+            md5,
+            reader,
+            threads,
+            piece_size,
+            job_count,
+        ) in itertools.product(
+            args.prefetch,
+            args.md5,
+            args.readers,
+            args.threads,
+            piece_sizes,
+            jobs,
+        ):
+            yield {
+                "name": case_name(
+                    dataset,
+                    piece_size,
+                    threads,
+                    job_count,
+                    reader,
+                    md5,
+                    prefetch,
+                ),
+                "path": path,
+                "batch": batch,
+                "piece_size": piece_size,
+                "threads": threads,
+                "jobs": job_count,
+                "reader": reader,
+                "md5": md5,
+                "prefetch": prefetch,
+            }
+
+
+def measure(case, repeat):
+    runs = []
+    for _ in range(repeat):
+        proc = subprocess.run(
+            [sys.executable, __file__, "case", json.dumps(case)],
+            stdout=subprocess.PIPE,
+            check=True,
+        )
+        runs.append(json.loads(proc.stdout))
+    result = {
+        "name": case["name"],
+        "threads": case["threads"],
+        "piece_size": case["piece_size"],
+        "jobs": case["jobs"],
+        "reader": case["reader"],
+        "md5": case["md5"],
+        "prefetch": case["prefetch"],
+        "size": runs[0]["size"],
+        "files": runs[0]["files"],
+        "signals": runs[0]["signals"],
+    }
+    for key in ("seconds", "mb_per_s", "files_per_s"):
+        result[key] = round(statistics.median(r[key] for r in runs), 3)
+    rss = [r["peak_rss"] for r in runs if r["peak_rss"] is not None]
+    result["peak_rss"] = max(rss) if rss else None
+    return result
+
+
+def environment():
+    import torf
+
+    return {
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "version": __version__,
+        "torf_version": torf.__version__,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "host": platform.node(),
+        "cpu_count": os.cpu_count(),
+    }
+
+
+def run(args):
+    os.makedirs(args.data_dir, exist_ok=True)
+    results = []
+    for case in cases(args):
+        result = measure(case, args.repeat)
+        results.append(result)
+        print(
+            f"{result['name']:<45} {result['mb_per_s']:>9.1f} MB/s "
+            f"{result['files_per_s']:>9.1f} files/s "
+            f"{engine.format_size(result['peak_rss'] or 0):>10} RSS "
+            f"{result['signals']:>6} signals",
+            file=sys.stderr,
+        )
+    data = {
+        "environment": environment(),
+        "scale": args.scale,
+        "repeat": args.repeat,
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(data, f, indent=4)
+    else:
+        print(json.dumps(data, indent=4))
+    return 0
+
+
+def compare(args):
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    with open(args.results) as f:
+        results = json.load(f)
+    if baseline.get("scale") != results.get("scale"):
+        print("Warning: results were run with different --scale")
+    before = {r["name"]: r for r in baseline["results"]}
+    regressions = 0
+    for result in results["results"]:
+        old = before.get(result["name"])
+        if old is None:
+            continue
+        changes = []
+        # Higher is better for throughput, lower for memory and signals
+        for key, sign in (
+            ("mb_per_s", 1),
+            ("files_per_s", 1),
+            ("peak_rss", -1),
+            ("signals", -1),
+        ):
+            if not old.get(key) or result.get(key) is None:
+                continue
+            change = 100 * (result[key] - old[key]) / old[key]
+            flag = ""
+            if sign * change < -args.threshold:
+                flag = " REGRESSION"
+                regressions += 1
+            changes.append(f"{key} {change:+.1f}%{flag}")
+        print(f"{result['name']:<45} {', '.join(changes)}")
+    print(f"{regressions} regressions beyond {args.threshold:g}%")
+    return 1 if regressions else 0
+
+
+def _sizes(value):
+    return [
+        None if size == "auto" else int(size) * KiB
+        for size in value.split(",")
+    ]
+
+
+def _ints(value):
+    return [int(i) for i in value.split(",")]
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = commands.add_parser("run", help="run the benchmarks")
+    run_parser.add_argument(
+        "-o", "--output", help="write results to this JSON file"
+    )
+    run_parser.add_argument(
+        "--data-dir",
+        default=DATA_DIR,
+        help=f"where datasets are generated (default: {DATA_DIR})",
+    )
+    run_parser.add_argument(
+        "--datasets",
+        type=lambda value: value.split(","),
+        default=list(DATASETS),
+        help=f"comma separated (default: {','.join(DATASETS)})",
+    )
+    run_parser.add_argument(
+        "--scale",
+        type=float,
+        default=1,
+        help="dataset size factor, 1 is about 3 GiB in total (default: 1)",
+    )
+    run_parser.add_argument(
+        "--piece-sizes",
+        type=_sizes,
+        default=[None, 256 * KiB, 1 * MiB, 4 * MiB],
+        help="KiB or auto, comma separated (default: auto,256,1024,4096)",
+    )
+    default_threads = sorted({1, engine.THREAD_BUDGET})
+    run_parser.add_argument(
+        "--threads",
+        type=_ints,
+        default=default_threads,
+        help=(
+            "hasher thread counts, comma separated "
+            f"(default: {','.join(map(str, default_threads))})"
+        ),
+    )
+    run_parser.add_argument(
+        "--jobs",
+        type=_ints,
+        default=[1, 4],
+        help="concurrent batch entries, comma separated (default: 1,4)",
+    )
+    run_parser.add_argument(
+        "--readers",
+        type=lambda value: value.split(","),
+        default=list(READERS),
+        help=(
+            f"piece readers, comma separated (default: {','.join(READERS)})"
+        ),
+    )
+    run_parser.add_argument(
+        "--md5",
+        type=lambda value: [md5 == "on" for md5 in value.split(",")],
+        default=[False],
+        help=(
+            "off, on or off,on to compare torrents with and without MD5 "
+            "digests (default: off)"
+        ),
+    )
+    run_parser.add_argument(
+        "--prefetch",
+        type=_ints,
+        default=[0],
+        help=(
+            "files read ahead of the hashers, comma separated, e.g. 0,16 "
+            "to measure prefetching on a network share (default: 0)"
+        ),
+    )
+    run_parser.add_argument(
+        "--repeat", type=int, default=3, help="runs per case (default: 3)"
+    )
+
+    compare_parser = commands.add_parser(
+        "compare", help="compare results with a baseline"
+    )
+    compare_parser.add_argument("baseline")
+    compare_parser.add_argument("results")
+    compare_parser.add_argument(
+        "--threshold",
+        type=float,
+        default=THRESHOLD,
+        help=(
+            f"percent change that counts as regression (default: {THRESHOLD})"
+        ),
+    )
+
+    case_parser = commands.add_parser("case")
+    case_parser.add_argument("case", type=json.loads)
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.command == "case":
+        print(json.dumps(run_case(args.case)))
+        return 0
+    if args.command == "compare":
+        return compare(args)
+    return run(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -7,10 +7,12 @@ setup(
     name="torf-gui",
     version=__version__,  # noqa: F821
     packages=find_packages(),
-    entry_points={"gui_scripts": ["torf-gui = torf_gui.gui:main"]},
+    entry_points={
+        "gui_scripts": ["torf-gui = torf_gui.gui:main"],
+        "console_scripts": ["torf-gui-cli = torf_gui.cli:main"],
+    },
     install_requires=[
         "torf>=4.2.4",
-        "humanfriendly>=10.0",
         "PyQt5>=5.15.9",
         "pyqtdarktheme>=2.1.0",
     ],
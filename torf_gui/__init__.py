@@ -1,3 +1,15 @@
-from .ui_about import Ui_AboutDialog
-from .ui_mainwindow import Ui_MainWindow
 from .version import __version__
+
+
+def __getattr__(name):
+    # The Qt UI classes are imported on first use so the engine and CLI can
+    # run without PyQt
+    if name == "Ui_AboutDialog":
+        from .ui_about import Ui_AboutDialog
+
+        return Ui_AboutDialog
+    if name == "Ui_MainWindow":
+        from .ui_mainwindow import Ui_MainWindow
+
+        return Ui_MainWindow
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,104 @@
+from datetime import datetime
+
+# Bytes of encoded chunks collected before write() passes them on
+WRITE_BUFFER_SIZE = 2**20
+
+
+class _Writer:
+    # Collects encoded chunks like a list, but passes them to `write` once
+    # they add up to `buffer_size` bytes
+
+    def __init__(self, write, buffer_size=WRITE_BUFFER_SIZE):
+        self.write = write
+        self.buffer_size = buffer_size
+        self.chunks = []
+        self.size = 0
+
+    def append(self, chunk):
+        self.chunks.append(chunk)
+        self.size += len(chunk)
+        if self.size >= self.buffer_size:
+            self.flush()
+
+    def flush(self):
+        self.write(b"".join(self.chunks))
+        self.chunks = []
+        self.size = 0
+
+
+def _utf8(string):
+    # Like torf, unencodable characters (e.g. surrogate escapes of file
+    # names) are replaced
+    return string.encode("utf-8", errors="replace")
+
+
+def _encode(value, out):
+    # Append the bencoded parts of `value` to `out`
+    if isinstance(value, dict):
+        out.append(b"d")
+        items = [
+            (_utf8(key) if isinstance(key, str) else key, item)
+            for key, item in value.items()
+        ]
+        # Keys are sorted as raw strings
+        for key, item in sorted(items, key=lambda i: i[0]):
+            _encode(key, out)
+            _encode(item, out)
+        out.append(b"e")
+    elif isinstance(value, list | tuple):
+        out.append(b"l")
+        for item in value:
+            _encode(item, out)
+        out.append(b"e")
+    elif isinstance(value, bool | int | float | datetime):
+        # Like torf, dates are encoded as timestamps
+        if isinstance(value, datetime):
+            value = value.timestamp()
+        out.append(b"i%de" % value)
+    elif isinstance(value, bytes | bytearray | str):
+        if isinstance(value, str):
+            value = _utf8(value)
+        out.append(b"%d:" % len(value))
+        out.append(bytes(value))
+    else:
+        raise ValueError(f"Can't bencode {type(value).__name__}")
+
+
+def encode(value):
+    """
+    Return `value` bencoded
+
+    Dictionary keys may be :class:`str` or :class:`bytes`, e.g. the merkle
+    roots of BitTorrent v2 "piece layers" that torf can't encode. Values
+    may also be :class:`datetime.datetime`, which is encoded as timestamp
+    like torf does.
+    """
+    out = []
+    _encode(value, out)
+    return b"".join(out)
+
+
+def write(value, f):
+    """
+    Write `value` bencoded to the binary file object `f`
+
+    Unlike :func:`encode`, at most about :data:`WRITE_BUFFER_SIZE` bytes of
+    the encoding are kept in memory, so huge torrents aren't held in memory
+    once more.
+    """
+    out = _Writer(f.write)
+    _encode(value, out)
+    out.flush()
+
+
+def digest(value, hash_object):
+    """
+    Update the :mod:`hashlib` object `hash_object` with `value` bencoded and
+    return it
+
+    Like :func:`write`, this doesn't keep the whole encoding in memory.
+    """
+    out = _Writer(hash_object.update)
+    _encode(value, out)
+    out.flush()
+    return hash_object
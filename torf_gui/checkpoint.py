@@ -0,0 +1,156 @@
+import json
+import os
+import time
+from datetime import datetime
+from hashlib import sha1
+
+from torf_gui.hashcache import HashCache
+from torf_gui.hasher import read_pieces
+
+CHECKPOINT_SUFFIX = ".resume"
+
+# Seconds between writes of newly hashed pieces to the checkpoint file
+CHECKPOINT_INTERVAL = 5
+
+
+class Checkpoint:
+    """
+    Piece hashes of an unfinished torrent, kept in a file next to its output
+
+    The file starts with a JSON header line that identifies the input like
+    :meth:`HashCache.key` and records the creation date and entropy of the
+    torrent, so a resumed torrent is identical to an uninterrupted one. The
+    header is followed by the hashes of all pieces completed so far, in
+    order. Hashes are only ever appended, so a crash can at worst leave an
+    incomplete last hash, which is ignored.
+    """
+
+    def __init__(self, path, interval=CHECKPOINT_INTERVAL):
+        self.path = path
+        self.interval = interval
+        self._file = None
+        self._buffer = bytearray()
+        self._last_flush = 0
+
+    @classmethod
+    def for_output(cls, save_path):
+        """Return the checkpoint of the torrent written to `save_path`"""
+        return cls(save_path + CHECKPOINT_SUFFIX)
+
+    def _read_file(self):
+        # Return the header and hashes of the checkpoint file or (None, b"")
+        try:
+            with open(self.path, "rb") as f:
+                header = json.loads(f.readline())
+                header["size"] = f.tell()
+                hashes = f.read()
+        except (OSError, ValueError, TypeError):
+            return None, b""
+        return header, hashes
+
+    def _read(self, torrent):
+        header, hashes = self._read_file()
+        # The key stat()s every input file, so it's only computed if there
+        # is a checkpoint at all
+        if header is None or header.get("key") != HashCache.key(torrent):
+            return None, b""
+        # Ignore hashes beyond the last piece in case the file was damaged
+        hashes = hashes[: min(len(hashes) // 20, torrent.pieces - 1) * 20]
+        return header, hashes
+
+    def pieces_done(self, torrent):
+        """Return how many pieces of `torrent` can be resumed from"""
+        return len(self._read(torrent)[1]) // 20
+
+    def pieces_stored(self, torrent):
+        """
+        Return how many pieces of `torrent` the checkpoint file has hashes
+        for, without checking that it was written for the same input
+
+        Unlike :meth:`pieces_done`, this doesn't stat() any input file, so it
+        is cheap enough to ask about resuming in the GUI thread.
+        :meth:`open` starts over if the checkpoint belongs to other input.
+        """
+        hashes = self._read_file()[1]
+        return min(len(hashes) // 20, max(0, torrent.pieces - 1))
+
+    def for_group(self, index):
+        """
+        Return the checkpoint of the `index`th group of output profiles
+        that are hashed separately, see
+        :func:`~torf_gui.engine.write_profile_torrents`
+
+        The first group uses this checkpoint.
+        """
+        if not index:
+            return self
+        base = self.path.removesuffix(CHECKPOINT_SUFFIX)
+        return type(self)(f"{base}.{index}{CHECKPOINT_SUFFIX}", self.interval)
+
+    def _verify(self, torrent, hashes):
+        # The last stored piece is hashed again in case the file was
+        # written out of order, e.g. on power loss
+        if not hashes:
+            return True
+        last = len(hashes) // 20 - 1
+        for _, _, data in read_pieces(torrent, last):
+            return sha1(data).digest() == hashes[-20:]
+        return False
+
+    def open(self, torrent):
+        """
+        Start checkpointing `torrent`
+
+        If the checkpoint file belongs to the same input, the creation date
+        and entropy of `torrent` are restored from it.
+
+        :return: hashes of the pieces that don't have to be hashed again
+        """
+        header, hashes = self._read(torrent)
+        if header is not None and self._verify(torrent, hashes):
+            if header.get("creation_date") is not None:
+                torrent.creation_date = datetime.fromtimestamp(
+                    header["creation_date"]
+                )
+            if header.get("entropy") is not None:
+                torrent.metainfo["info"]["entropy"] = header["entropy"]
+            self._file = open(self.path, "r+b")
+            self._file.truncate(header["size"] + len(hashes))
+            self._file.seek(0, os.SEEK_END)
+            return hashes
+        creation_date = torrent.creation_date
+        header = {
+            "key": HashCache.key(torrent),
+            "creation_date": creation_date and creation_date.timestamp(),
+            "entropy": torrent.metainfo["info"].get("entropy"),
+        }
+        self._file = open(self.path, "wb")
+        self._file.write(json.dumps(header).encode() + b"\n")
+        self._file.flush()
+        return b""
+
+    def add(self, piece_hash):
+        """Append the hash of the next piece"""
+        self._buffer += piece_hash
+        if time.monotonic() - self._last_flush >= self.interval:
+            self.flush()
+
+    def flush(self):
+        if self._file is None:
+            return
+        self._file.write(self._buffer)
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._buffer.clear()
+        self._last_flush = time.monotonic()
+
+    def close(self):
+        if self._file is not None:
+            self.flush()
+            self._file.close()
+            self._file = None
+
+    def remove(self):
+        self.close()
+        if os.path.exists(self.path):
+            os.remove(self.path)
@@ -0,0 +1,577 @@
+import argparse
+import contextlib
+import json
+import os
+import signal
+import sys
+import time
+
+from torf_gui import __version__, engine, merkle, tuning, watch
+from torf_gui.hashcache import HashCache
+from torf_gui.hasher import READERS
+from torf_gui.metrics import FORMATS, JobMetrics, MetricsFile
+from torf_gui.outputindex import FORMATS as INDEX_FORMATS
+from torf_gui.outputindex import OutputIndex
+from torf_gui.verify import read_torrent, verify_torrent
+
+PROGRAM_NAME = "torf-gui-cli"
+
+
+def thread_count(value):
+    if value == "auto":
+        return tuning.AUTO
+    try:
+        count = int(value)
+    except ValueError:
+        count = -1
+    if count < 1:
+        msg = f"must be 'auto' or a positive number: {value!r}"
+        raise argparse.ArgumentTypeError(msg)
+    return count
+
+
+def prefetch_count(value):
+    if value == "auto":
+        return None
+    try:
+        count = int(value)
+    except ValueError:
+        count = -1
+    if count < 0:
+        msg = f"must be 'auto' or a number: {value!r}"
+        raise argparse.ArgumentTypeError(msg)
+    return count
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        prog=PROGRAM_NAME,
+        description="Create torrents without the torf-gui window.",
+    )
+    parser.add_argument(
+        "path", help="file or directory to create a torrent of"
+    )
+    parser.add_argument(
+        "-o",
+        "--output",
+        help=(
+            "torrent file to write, or output directory in batch and watch "
+            "mode and with --output-profile (default: current directory)"
+        ),
+    )
+    parser.add_argument(
+        "-b",
+        "--batch",
+        action="store_true",
+        help="create one torrent per file and directory beneath PATH",
+    )
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help=(
+            "with --batch, skip entries whose files and settings haven't "
+            "changed since the last batch into the same output directory"
+        ),
+    )
+    parser.add_argument(
+        "-W",
+        "--watch",
+        action="store_true",
+        help=(
+            "keep running and create one torrent per file and directory "
+            "that appears beneath PATH once it stops changing"
+        ),
+    )
+    parser.add_argument(
+        "--settle",
+        type=float,
+        default=watch.SETTLE_TIME,
+        metavar="SECONDS",
+        help=(
+            "seconds a watched entry must be unchanged before its torrent "
+            f"is created (default: {watch.SETTLE_TIME})"
+        ),
+    )
+    parser.add_argument(
+        "--poll-interval",
+        type=float,
+        default=watch.POLL_INTERVAL,
+        metavar="SECONDS",
+        help=(
+            "seconds between checks of watched entries "
+            f"(default: {watch.POLL_INTERVAL})"
+        ),
+    )
+    parser.add_argument(
+        "--verify",
+        metavar="TORRENT",
+        help=(
+            "check PATH against an existing torrent instead of creating "
+            "one; exits with status 2 if it doesn't match"
+        ),
+    )
+    parser.add_argument(
+        "--fail-fast",
+        action="store_true",
+        help="stop verifying at the first bad piece or file",
+    )
+    parser.add_argument(
+        "-p",
+        "--profile",
+        help="JSON profile to read settings from (as exported by torf-gui)",
+    )
+    parser.add_argument(
+        "-P",
+        "--output-profile",
+        action="append",
+        default=[],
+        metavar="PROFILE",
+        help=(
+            "write one torrent per JSON profile from a single hashing pass "
+            "(may be given multiple times)"
+        ),
+    )
+    parser.add_argument(
+        "-x",
+        "--exclude",
+        action="append",
+        metavar="PATTERN",
+        help=(
+            "exclude files matching a glob, a glob anchored below the "
+            "torrent name like /dir/*.txt, or re:REGEX (may be given "
+            "multiple times)"
+        ),
+    )
+    parser.add_argument(
+        "-t",
+        "--tracker",
+        action="append",
+        metavar="URL",
+        help="tracker URL (may be given multiple times)",
+    )
+    parser.add_argument(
+        "-w",
+        "--web-seed",
+        action="append",
+        metavar="URL",
+        help="HTTP/FTP seed URL (may be given multiple times)",
+    )
+    parser.add_argument(
+        "--private",
+        action=argparse.BooleanOptionalAction,
+        default=None,
+        help="set the private flag",
+    )
+    parser.add_argument("-s", "--source", help="source string")
+    parser.add_argument("-c", "--comment", help="comment")
+    parser.add_argument(
+        "--randomize-infohash",
+        action=argparse.BooleanOptionalAction,
+        default=None,
+        help="add random entropy to the info hash",
+    )
+    parser.add_argument(
+        "--md5",
+        action=argparse.BooleanOptionalAction,
+        default=None,
+        help="include the MD5 digest of every file (v1 torrents only)",
+    )
+    parser.add_argument(
+        "--piece-size",
+        type=int,
+        choices=engine.PIECE_SIZES[1:],
+        metavar="BYTES",
+        help="piece size in bytes (default: automatic)",
+    )
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        default=1,
+        help=(
+            "batch or watched entries to hash at the same time (default: 1)"
+        ),
+    )
+    parser.add_argument(
+        "--threads",
+        type=thread_count,
+        help=(
+            "hasher threads shared by all jobs, or 'auto' to time a few "
+            "counts on the first read of each storage device and remember "
+            "the fastest (default: auto)"
+        ),
+    )
+    parser.add_argument(
+        "--reader",
+        choices=READERS,
+        default="stock",
+        help=(
+            "how pieces are read: 'readinto' fills reusable buffers instead "
+            "of allocating every piece (default: stock)"
+        ),
+    )
+    parser.add_argument(
+        "--prefetch",
+        type=prefetch_count,
+        metavar="FILES",
+        help=(
+            "files to open and read ahead of the hashers at the same time, "
+            "0 to disable or 'auto' to read "
+            f"{tuning.PREFETCH_FILES} files ahead on network filesystems "
+            "(default: auto)"
+        ),
+    )
+    parser.add_argument(
+        "--torrent-version",
+        choices=merkle.VERSIONS,
+        help=(
+            "BitTorrent version: v2 has a SHA-256 merkle tree per file, "
+            "hybrid has that and v1 pieces for older clients, both from "
+            "one read of the data (default: v1)"
+        ),
+    )
+    parser.add_argument(
+        "--hash-cache",
+        metavar="FILE",
+        help="SQLite file to reuse piece hashes of unchanged files from",
+    )
+    parser.add_argument(
+        "--metrics",
+        metavar="FILE",
+        help="append timing and throughput of each torrent to FILE",
+    )
+    parser.add_argument(
+        "--metrics-format",
+        choices=FORMATS,
+        help=(
+            "format of the --metrics file: JSON lines, CSV or a Prometheus "
+            "textfile (default: from the extension, .csv, .prom or JSON)"
+        ),
+    )
+    parser.add_argument(
+        "--index",
+        metavar="FILE",
+        help=(
+            "append the name, path, infohash, magnet link, size, file count, "
+            "piece size and creation time of each written torrent to FILE"
+        ),
+    )
+    parser.add_argument(
+        "--index-format",
+        choices=INDEX_FORMATS,
+        help=(
+            "format of the --index file: JSON lines or CSV (default: from "
+            "the extension, .csv or JSON)"
+        ),
+    )
+    parser.add_argument(
+        "--json",
+        action="store_true",
+        help="print progress as JSON lines to stdout",
+    )
+    parser.add_argument(
+        "-V", "--version", action="version", version=f"%(prog)s {__version__}"
+    )
+    return parser.parse_args(argv)
+
+
+def job_settings(args):
+    """Merge the profile given with --profile and command line options"""
+    settings = dict(engine.PROFILE_DEFAULTS)
+    if args.profile:
+        settings.update(engine.read_profile(args.profile))
+    overrides = {
+        "exclude": args.exclude,
+        "trackers": args.tracker,
+        "web_seeds": args.web_seed,
+        "private": args.private,
+        "randomize_infohash": args.randomize_infohash,
+        "source": args.source,
+        "compute_md5": args.md5,
+        "threads": args.threads,
+        "torrent_version": args.torrent_version,
+    }
+    for key, value in overrides.items():
+        if value is not None:
+            settings[key] = value
+    engine.check_profile(settings)
+    return settings
+
+
+class Reporter:
+    """Print progress as text to stderr or as JSON lines to stdout"""
+
+    def __init__(self, json_lines):
+        self.json_lines = json_lines
+        self.started = time.monotonic()
+        self.throughput = engine.Throughput(0)
+
+    def emit(self, event, **data):
+        if self.json_lines:
+            data = {"event": event, "time": self.elapsed(), **data}
+            print(json.dumps(data), flush=True)
+        elif event == "progress" and "eta" in data:
+            print(
+                f"\r{data['name']}: {self.throughput}\033[K",
+                end="",
+                file=sys.stderr,
+                flush=True,
+            )
+        elif event == "progress":
+            print(
+                f"\r{data['name']} ({data['done']}/{data['total']})\033[K",
+                end="",
+                file=sys.stderr,
+                flush=True,
+            )
+        elif event == "entry":
+            print(
+                f"\r({data['done']}/{data['total']}) {data['name']}",
+                file=sys.stderr,
+                flush=True,
+            )
+        elif event in ("queued", "created", "skipped", "removed", "failed"):
+            message = f": {data['message']}" if "message" in data else ""
+            print(
+                f"\r{event.capitalize()} {data['name']}{message}\033[K",
+                file=sys.stderr,
+                flush=True,
+            )
+        elif event == "bad_file":
+            print(
+                f"\r{data['path']}: {data['message']}\033[K", file=sys.stderr
+            )
+        elif event in ("verified", "report"):
+            print(f"\r{data['summary']}\033[K", file=sys.stderr)
+        elif event == "error":
+            print(f"\nError: {data['message']}", file=sys.stderr)
+        elif event == "finished":
+            status = "Finished" if data["success"] else "Canceled"
+            print(f"\n{status} in {self.elapsed()}s", file=sys.stderr)
+
+    def elapsed(self):
+        return round(time.monotonic() - self.started, 3)
+
+    def torrent_progress(self, torrent, filepath, pieces_done, pieces_total):
+        self.throughput.update(
+            engine.bytes_hashed(torrent, pieces_done), torrent.size
+        )
+        self.emit(
+            "progress",
+            name=os.path.split(filepath)[1],
+            done=pieces_done,
+            total=pieces_total,
+            bytes_done=self.throughput.done,
+            bytes_total=self.throughput.total,
+            rate=round(self.throughput.rate),
+            eta=self.throughput.eta,
+        )
+
+    def entry_progress(self, name, pieces_done, pieces_total):
+        self.emit("progress", name=name, done=pieces_done, total=pieces_total)
+
+    def batch_progress(self, name, done, total):
+        self.emit("entry", name=name, done=done, total=total)
+
+
+def thread_tuner(settings):
+    """Return a ThreadTuner if the thread count is 'auto'"""
+    if settings["threads"]:
+        return None
+    return tuning.ThreadTuner(tuning.default_path(), engine.THREAD_BUDGET)
+
+
+def output_index(args):
+    """Return the OutputIndex given with --index"""
+    if not args.index:
+        return None
+    return OutputIndex(args.index, args.index_format)
+
+
+def output_profiles(fns):
+    return [
+        (os.path.splitext(os.path.split(fn)[1])[0], engine.read_profile(fn))
+        for fn in fns
+    ]
+
+
+def create_single(args, settings, cache, reporter, metrics=None):
+    if metrics is None:
+        return _create_single(args, settings, cache, reporter, None)
+    job_metrics = JobMetrics(os.path.basename(os.path.normpath(args.path)))
+    success = False
+    try:
+        success = _create_single(args, settings, cache, reporter, job_metrics)
+    finally:
+        metrics.write(job_metrics.record(success))
+    return success
+
+
+def _create_single(args, settings, cache, reporter, metrics):
+    with metrics.phase("scan") if metrics else contextlib.nullcontext():
+        files = engine.scan(args.path)
+    torrent = engine.torrent_from_scan(
+        args.path,
+        files,
+        exclude=settings["exclude"],
+        trackers=settings["trackers"],
+        webseeds=settings["web_seeds"],
+        private=settings["private"],
+        source=settings["source"] or None,
+        randomize_infohash=settings["randomize_infohash"],
+        comment=args.comment,
+    )
+    torrent.include_md5 = settings["compute_md5"]
+    torrent.torrent_version = settings["torrent_version"]
+    engine.set_piece_size(torrent, args.piece_size)
+    name = engine.output_name(args.path)
+    profiles = output_profiles(args.output_profile)
+    if profiles:
+        save_path = os.path.join(args.output or os.curdir, name)
+    elif args.output and os.path.isdir(args.output):
+        save_path = os.path.join(args.output, name + ".torrent")
+    else:
+        save_path = args.output or name + ".torrent"
+    return engine.create_torrent(
+        torrent,
+        save_path,
+        threads=settings["threads"],
+        callback=reporter.torrent_progress,
+        interval=engine.PROGRESS_INTERVAL,
+        cache=cache,
+        profiles=profiles,
+        files=files,
+        metrics=metrics,
+        tuner=thread_tuner(settings),
+        reader=args.reader,
+        prefetch=args.prefetch,
+        index=output_index(args),
+    )
+
+
+def batch_creator(args, settings, cache, metrics=None):
+    save_dir = args.output or os.curdir
+    os.makedirs(save_dir, exist_ok=True)
+    return engine.BatchCreator(
+        path=args.path,
+        exclude=settings["exclude"],
+        save_dir=save_dir,
+        trackers=settings["trackers"],
+        web_seeds=settings["web_seeds"],
+        private=settings["private"],
+        source=settings["source"],
+        randomize_infohash=settings["randomize_infohash"],
+        comment=args.comment,
+        include_md5=settings["compute_md5"],
+        jobs=args.jobs,
+        threads=settings["threads"],
+        cache=cache,
+        profiles=output_profiles(args.output_profile),
+        metrics=metrics,
+        tuner=thread_tuner(settings),
+        reader=args.reader,
+        torrent_version=settings["torrent_version"],
+        incremental=args.incremental,
+        prefetch=args.prefetch,
+        index=output_index(args),
+    )
+
+
+def create_batch(args, settings, cache, reporter, metrics=None):
+    batch = batch_creator(args, settings, cache, metrics)
+    try:
+        success = batch.run(
+            progress=reporter.batch_progress,
+            entry_progress=reporter.entry_progress,
+        )
+    except KeyboardInterrupt:
+        batch.cancel()
+        return False
+    if args.incremental:
+        for name in batch.report["removed"]:
+            reporter.emit("removed", name=name, message="No longer in input")
+        reporter.emit("report", summary=batch.summary(), **batch.report)
+    return success
+
+
+def watch_directory(args, settings, cache, reporter, metrics=None):
+    watcher = watch.Watcher(
+        batch_creator(args, settings, cache, metrics),
+        settle_time=args.settle,
+        poll_interval=args.poll_interval,
+    )
+    # Service managers stop daemons with SIGTERM
+    signal.signal(signal.SIGTERM, lambda signum, frame: watcher.stop())
+    try:
+        watcher.run(
+            report=reporter.emit, entry_progress=reporter.entry_progress
+        )
+    except KeyboardInterrupt:
+        return False
+    return True
+
+
+def verify_data(args, reporter):
+    torrent = read_torrent(args.verify)
+    reporter.throughput = engine.Throughput(torrent.size)
+    threads = args.threads
+    if not threads:
+        tuner = tuning.ThreadTuner(tuning.default_path(), engine.THREAD_BUDGET)
+        threads = tuner.threads(args.path)
+    try:
+        result = verify_torrent(
+            torrent,
+            args.path,
+            threads=threads,
+            callback=reporter.torrent_progress,
+            stop_on_error=args.fail_fast,
+            reader=args.reader,
+            prefetch=args.prefetch,
+        )
+    except KeyboardInterrupt:
+        reporter.emit("finished", success=False)
+        return 1
+    for filepath in result.bad_files:
+        message = result.file_errors.get(filepath, "Bad pieces")
+        reporter.emit("bad_file", path=filepath, message=message)
+    reporter.emit(
+        "verified",
+        ok=result.ok,
+        summary=str(result),
+        pieces_checked=result.pieces_checked,
+        bad_pieces=result.bad_pieces,
+    )
+    reporter.emit("finished", success=True)
+    return 0 if result.ok else 2
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    reporter = Reporter(args.json)
+    try:
+        settings = job_settings(args)
+        if args.verify:
+            return verify_data(args, reporter)
+        cache = HashCache(args.hash_cache) if args.hash_cache else None
+        metrics = (
+            MetricsFile(args.metrics, args.metrics_format)
+            if args.metrics
+            else None
+        )
+        if args.watch:
+            success = watch_directory(args, settings, cache, reporter, metrics)
+        elif args.batch:
+            success = create_batch(args, settings, cache, reporter, metrics)
+        else:
+            success = create_single(args, settings, cache, reporter, metrics)
+    except KeyboardInterrupt:
+        success = False
+    except Exception as e:
+        reporter.emit("error", message=str(e))
+        return 1
+    reporter.emit("finished", success=success)
+    return 0 if success else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,1204 @@
+import json
+import math
+import os
+import pathlib
+import stat
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import nullcontext
+from datetime import datetime
+from hashlib import sha1
+
+from torf_gui import bencode, merkle
+from torf_gui.exclude import matcher
+from torf_gui.filetable import FileTable
+from torf_gui.hasher import (
+    FileMD5,
+    iter_piece_hashes,
+    read_pieces,
+    torrent_files,
+)
+from torf_gui.manifest import BatchManifest, fingerprint
+from torf_gui.tuning import prefetch_files
+from torf_gui.version import __version__
+
+CREATOR = f"torf-gui/{__version__} (https://github.com/SavageCore/torf-gui)"
+
+PIECE_SIZES = [None] + [2**i for i in range(14, 27)]
+
+# Hasher threads shared by all torrents created at the same time
+THREAD_BUDGET = os.cpu_count() or 1
+
+# Minimum seconds between progress reports while hashing
+PROGRESS_INTERVAL = 0.1
+
+# Categories of BatchCreator.report
+REPORT_KEYS = ("created", "rebuilt", "skipped", "removed")
+
+PROFILE_DEFAULTS = {
+    "exclude": [],
+    "trackers": [],
+    "web_seeds": [],
+    "private": False,
+    "compute_md5": False,
+    "randomize_infohash": False,
+    "source": "",
+    # Hasher threads, 0 lets torf_gui.tuning pick them per storage device
+    "threads": 0,
+    # One of torf_gui.merkle.VERSIONS
+    "torrent_version": "v1",
+}
+
+
+def format_size(num_bytes):
+    """Format `num_bytes` with binary units like 1.5 MiB"""
+    if num_bytes == 1:
+        return "1 byte"
+    size = float(num_bytes)
+    for unit in ("bytes", "KiB", "MiB", "GiB", "TiB", "PiB"):
+        if abs(size) < 1024 or unit == "PiB":
+            break
+        size /= 1024
+    number = f"{size:.2f}".rstrip("0").rstrip(".")
+    return f"{number} {unit}"
+
+
+def format_duration(seconds):
+    minutes, seconds = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours}:{minutes:02d}:{seconds:02d}"
+
+
+def bytes_hashed(torrent, pieces_done):
+    return min(pieces_done * torrent.piece_size, torrent.size)
+
+
+class Throughput:
+    """Hashing speed and estimated time left for `total` bytes"""
+
+    def __init__(self, total):
+        self.total = total
+        self.restart()
+
+    def restart(self):
+        self.started = time.monotonic()
+        self.done = 0
+
+    @property
+    def elapsed(self):
+        return time.monotonic() - self.started
+
+    def update(self, done, total=None):
+        if total is not None:
+            self.total = total
+        # Hashing starts over for each exclusion group of output profiles
+        if done < self.done:
+            self.restart()
+        self.done = done
+
+    @property
+    def rate(self):
+        elapsed = self.elapsed
+        return self.done / elapsed if elapsed > 0 else 0
+
+    @property
+    def eta(self):
+        rate = self.rate
+        return (self.total - self.done) / rate if rate > 0 else None
+
+    def __str__(self):
+        eta = self.eta
+        eta = format_duration(eta) if eta is not None else "?"
+        return (
+            f"{format_size(self.done)} / {format_size(self.total)}, "
+            f"{format_size(self.rate)}/s, {eta} left"
+        )
+
+
+class ProgressCallback:
+    """
+    :meth:`torf.Torrent.generate` callback that checks `cancelled` after
+    every piece but only calls `callback` every `interval` seconds
+
+    torf's own `interval` would also delay cancellation by up to `interval`
+    seconds, so torf is called with an interval of 0 and the reports are
+    coalesced here.
+    """
+
+    def __init__(self, callback=None, interval=0, cancelled=None):
+        self.callback = callback
+        self.interval = interval
+        self.cancelled = cancelled
+        self.last_call = -1
+
+    def __call__(self, torrent, filepath, pieces_done, pieces_total):
+        if self.cancelled is not None and self.cancelled.is_set():
+            return True
+        now = time.monotonic()
+        if self.callback is not None and (
+            pieces_done >= pieces_total
+            or now - self.last_call >= self.interval
+        ):
+            self.last_call = now
+            return self.callback(torrent, filepath, pieces_done, pieces_total)
+        return None
+
+
+def _phase(metrics, name):
+    return metrics.phase(name) if metrics is not None else nullcontext()
+
+
+def file_count(torrent):
+    """Return the number of files of `torrent` without listing them"""
+    info = torrent.metainfo["info"]
+    if "files" in info:
+        return len(info["files"])
+    return 1 if "length" in info else 0
+
+
+def _check_hashed(torrent):
+    # torf.Torrent.validate() would stat() every file and create an object
+    # for each of them; only make sure the torrent was hashed
+    import torf
+
+    if not torrent.metainfo["info"].get("pieces"):
+        raise torf.MetainfoError("Torrent is not hashed")
+
+
+def infohash(torrent):
+    """Return the info hash of `torrent`, the v1 one of hybrid torrents"""
+    layers = getattr(torrent, "layers", None)
+    if layers is not None:
+        return merkle.infohash(torrent, layers)
+    _check_hashed(torrent)
+    return bencode.digest(torrent.metainfo["info"], sha1()).hexdigest()
+
+
+def write_torrent(torrent, filepath, metrics=None, index=None):
+    """
+    Write `torrent` without leaving a partial file behind on errors
+
+    The metainfo is bencoded straight to the file instead of being encoded
+    in memory first. The torrent is recorded in `metrics` and the
+    :class:`~torf_gui.outputindex.OutputIndex` `index` if they are given.
+    """
+    tmp = f"{filepath}.part"
+    layers = getattr(torrent, "layers", None)
+    with _phase(metrics, "write"):
+        try:
+            if layers is None:
+                _check_hashed(torrent)
+                meta = torrent.metainfo
+            else:
+                meta = merkle.metainfo(torrent, layers)
+            with open(tmp, "wb") as f:
+                bencode.write(meta, f)
+            os.replace(tmp, filepath)
+        except BaseException:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            raise
+    if metrics is None and index is None:
+        return
+    # The whole info dictionary is encoded for it, so it's only done once
+    torrent_infohash = infohash(torrent)
+    if metrics is not None:
+        metrics.written(torrent_infohash)
+    if index is not None:
+        index.add(torrent, filepath, torrent_infohash)
+
+
+def output_name(path):
+    """Return the name of the torrent file of `path` without extension"""
+    if os.path.isfile(path):
+        return os.path.splitext(os.path.split(path)[1])[0]
+    return os.path.split(os.path.normpath(path))[1]
+
+
+def check_profile(profile):
+    """Raise :class:`ValueError` if settings of `profile` contradict"""
+    if profile["compute_md5"] and profile["torrent_version"] != "v1":
+        raise ValueError("MD5 digests can only be computed for v1 torrents")
+
+
+def read_profile(fn):
+    with open(fn) as f:
+        data = json.load(f)
+    profile = {
+        key: data.get(key, value) for key, value in PROFILE_DEFAULTS.items()
+    }
+    check_profile(profile)
+    return profile
+
+
+def write_profile(fn, profile):
+    with open(fn, "w") as f:
+        json.dump(profile, f, indent=4, sort_keys=True)
+
+
+def apply_profile(torrent, profile):
+    torrent.trackers = profile["trackers"]
+    torrent.webseeds = profile["web_seeds"]
+    torrent.private = profile["private"]
+    torrent.source = profile["source"] or None
+    torrent.randomize_infohash = profile["randomize_infohash"]
+
+
+def split_thread_budget(budget, jobs):
+    """Return the hasher threads each of `jobs` concurrent torrents may use"""
+    return max(1, (budget or 1) // max(1, jobs))
+
+
+def set_piece_size(torrent, piece_size):
+    # torf limits piece sizes to 16 MiB unless piece_size_max is raised
+    if piece_size is not None and piece_size > torrent.piece_size_max:
+        torrent.piece_size_max = piece_size
+    torrent.piece_size = piece_size
+
+
+def bencoded_size(value):
+    """Return the length of `value` when bencoded without encoding it"""
+    if isinstance(value, dict):
+        return 2 + sum(
+            bencoded_size(k) + bencoded_size(v) for k, v in value.items()
+        )
+    if isinstance(value, list | tuple):
+        return 2 + sum(bencoded_size(v) for v in value)
+    if isinstance(value, datetime):
+        value = int(value.timestamp())
+    if isinstance(value, int):
+        return len(str(value)) + 2
+    if not isinstance(value, bytes):
+        value = str(value).encode()
+    return len(str(len(value))) + 1 + len(value)
+
+
+class PiecePlanner:
+    """
+    Piece count, .torrent size and hashing time for every piece size
+
+    Everything is taken from the scanned `torrent` once, so plans are
+    computed without touching the torrent or the file system again.
+    """
+
+    def __init__(self, torrent):
+        self.size = torrent.size or 0
+        self.files = len(torrent.metainfo["info"].get("files", ())) or 1
+        self.calculate_piece_size = torrent.calculate_piece_size
+        metainfo = dict(torrent.metainfo)
+        metainfo["info"] = {
+            key: value
+            for key, value in metainfo["info"].items()
+            if key not in ("piece length", "pieces")
+        }
+        self.metainfo_size = bencoded_size(metainfo)
+
+    def piece_size(self, piece_size=None):
+        """Return `piece_size` or the automatic piece size if it is `None`"""
+        if piece_size is None:
+            return self.calculate_piece_size(self.size)
+        return piece_size
+
+    def pieces(self, piece_size=None):
+        return math.ceil(self.size / self.piece_size(piece_size))
+
+    def torrent_size(self, piece_size=None):
+        """Return the estimated size of the .torrent file in bytes"""
+        pieces_size = 20 * self.pieces(piece_size)
+        return (
+            self.metainfo_size
+            + bencoded_size("piece length")
+            + bencoded_size(self.piece_size(piece_size))
+            + bencoded_size("pieces")
+            + len(str(pieces_size))
+            + 1
+            + pieces_size
+        )
+
+    def plan(self, hash_rate=None):
+        """
+        Return (piece size, pieces, .torrent size, hashing seconds) for each
+        of :data:`PIECE_SIZES`
+
+        Hashing seconds are ``None`` unless `hash_rate` in bytes per second
+        is known.
+        """
+        seconds = self.size / hash_rate if hash_rate else None
+        return [
+            (
+                self.piece_size(piece_size),
+                self.pieces(piece_size),
+                self.torrent_size(piece_size),
+                seconds,
+            )
+            for piece_size in PIECE_SIZES
+        ]
+
+
+# Hidden attributes need a stat() call, so they are only checked where
+# they exist
+_HIDDEN_ATTRIBUTES = os.name == "nt" or hasattr(os, "chflags")
+
+
+def is_hidden(entry):
+    """
+    Return whether the :class:`os.DirEntry` `entry` is hidden
+
+    Names starting with "." are hidden everywhere. On Windows the hidden
+    file attribute and on macOS and BSD the hidden flag count as well.
+    """
+    if entry.name.startswith("."):
+        return True
+    if not _HIDDEN_ATTRIBUTES:
+        return False
+    st = entry.stat()
+    attributes = getattr(st, "st_file_attributes", 0)
+    flags = getattr(st, "st_flags", 0)
+    return bool(
+        attributes & stat.FILE_ATTRIBUTE_HIDDEN or flags & stat.UF_HIDDEN
+    )
+
+
+def _walk(top):
+    # Yield (filepath, stat_result); `top` is a path or an os.DirEntry whose
+    # cached stat() result is reused
+    if isinstance(top, os.DirEntry):
+        if not top.is_dir():
+            yield top.path, top.stat()
+            return
+        directories = [top.path]
+    elif not os.path.isdir(top):
+        yield top, os.stat(top)
+        return
+    else:
+        directories = [top]
+    while directories:
+        with os.scandir(directories.pop()) as entries:
+            for entry in entries:
+                # torf ignores hidden files and directories anyway
+                if entry.name.startswith("."):
+                    continue
+                # Symlinks are followed like torf does
+                if entry.is_dir():
+                    directories.append(entry.path)
+                else:
+                    yield entry.path, entry.stat()
+
+
+def scan(path, progress=None, cancelled=None, interval=PROGRESS_INTERVAL):
+    """
+    Return a :class:`~torf_gui.filetable.FileTable` of (filepath, size) for
+    every file beneath `path`
+
+    `path` may also be an :class:`os.DirEntry`. Every file and directory is
+    only stat()ed once, and hidden ones are skipped.
+
+    `progress` is called with the number of files and bytes found so far at
+    most every `interval` seconds. Scanning stops once the
+    :class:`threading.Event` `cancelled` is set.
+
+    :raises torf.ReadError: if `path` or anything beneath it isn't readable
+    :return: ``None`` if scanning was cancelled
+    """
+    import torf
+
+    if not isinstance(path, os.DirEntry):
+        # Paths must start like the path select_files() is called with
+        path = os.path.normpath(path)
+    files = FileTable()
+    total = 0
+    last_report = time.monotonic()
+    try:
+        for filepath, st in _walk(path):
+            files.append(filepath, st.st_size)
+            total += st.st_size
+            if cancelled is not None and cancelled.is_set():
+                return None
+            now = time.monotonic()
+            if progress is not None and now - last_report >= interval:
+                last_report = now
+                progress(len(files), total)
+    except OSError as exc:
+        raise torf.ReadError(exc.errno, exc.filename) from exc
+    if progress is not None:
+        progress(len(files), total)
+    return files
+
+
+def snapshot(path):
+    """
+    Return the path, size and modification time of every file beneath
+    `path`, which may also be an :class:`os.DirEntry`
+
+    The result is hashable and changes whenever a file is added, removed
+    or written to.
+    """
+    return frozenset(
+        (filepath, st.st_size, st.st_mtime_ns) for filepath, st in _walk(path)
+    )
+
+
+def entry_files(entry):
+    """
+    Return [relative path, size, modification time] of every file beneath
+    the :class:`os.DirEntry` `entry`, sorted
+
+    Unlike :func:`snapshot`, the result can be stored as JSON.
+    """
+    prefix = len(entry.path.rstrip(os.sep)) + 1
+    return sorted(
+        [filepath[prefix:], size, mtime]
+        for filepath, size, mtime in snapshot(entry)
+    )
+
+
+def _set_path(torrent, path):
+    # torf.Torrent has no public way to set its path without walking it again
+    # (Torrent.path) or matching every file against its filters again
+    # (Torrent.files), so the attribute behind Torrent.path is set like
+    # torf's own Torrent._set_files() does
+    torrent._path = pathlib.Path(path)
+
+
+def select_files(torrent, path, files, exclude=()):
+    """
+    Set the files of `torrent` to `files` from :func:`scan` of `path`
+
+    Files matched by `exclude`, a list of patterns or an
+    :class:`~torf_gui.exclude.ExcludeMatcher`, are left out. Like with
+    torf, empty files are kept unless all files are empty. This is the same
+    as setting :attr:`torf.Torrent.path`, but without walking `path` or
+    stat()ing any file again.
+
+    :return: number and total size of the excluded files
+    """
+    exclude = matcher(exclude)
+    path = os.path.normpath(path)
+    name = os.path.basename(os.path.abspath(path))
+    singlefile = len(files) == 1 and files[0][0] == path
+    prefix = len(path.rstrip(os.sep)) + 1
+    included = []
+    excluded_files = excluded_size = 0
+    for filepath, size in files:
+        relpath = name if singlefile else os.path.join(name, filepath[prefix:])
+        if exclude and exclude.match(relpath):
+            excluded_files += 1
+            excluded_size += size
+        else:
+            included.append((relpath, size))
+    # Sorted by path components; "\0" sorts before any other character and
+    # is cheaper than a list of components per file
+    included.sort(key=lambda f: os.path.normcase(f[0]).replace(os.sep, "\0"))
+
+    info = torrent.metainfo["info"]
+    for key in ("files", "length", "pieces", "md5sum"):
+        info.pop(key, None)
+    # Like with torf, there are no files if they are all empty
+    if not any(size for _, size in included):
+        included = []
+    if singlefile and included:
+        info["name"] = name
+        info["length"] = included[0][1]
+    elif included:
+        info["name"] = name
+        # Directory names are repeated for every file beneath them
+        info["files"] = [
+            {
+                "length": size,
+                "path": [
+                    sys.intern(part) for part in relpath.split(os.sep)[1:]
+                ],
+            }
+            for relpath, size in included
+        ]
+    _set_path(torrent, path)
+    torrent.piece_size = None
+    return excluded_files, excluded_size
+
+
+def torrent_from_scan(path, files, exclude=(), **kwargs):
+    """
+    Return a :class:`torf.Torrent` for `path` from the result of :func:`scan`
+
+    `exclude` is passed on to :func:`select_files` and `kwargs` to
+    :class:`torf.Torrent`.
+    """
+    import torf
+
+    torrent = torf.Torrent(**kwargs)
+    select_files(torrent, path, files, exclude)
+    return torrent
+
+
+def profile_groups(profiles):
+    """
+    Group (name, profile) pairs that are hashed the same way
+
+    Return a list of ``(exclude, version, md5, group)`` tuples in the order
+    of `profiles`, where `group` is the list of (name, profile) pairs with
+    the exclusion patterns `exclude`, the torrent version `version` and
+    MD5 digests if `md5` is true.
+    """
+    groups = {}
+    for name, profile in profiles:
+        key = (
+            tuple(profile["exclude"]),
+            profile.get("torrent_version", "v1"),
+            profile.get("compute_md5", False),
+        )
+        groups.setdefault(key, []).append((name, profile))
+    return [(*key, group) for key, group in groups.items()]
+
+
+def write_profile_torrents(
+    torrent,
+    profiles,
+    generate,
+    save_base,
+    files=None,
+    metrics=None,
+    index=None,
+):
+    """
+    Write one torrent per (name, profile) pair to "<save_base>.<name>.torrent"
+
+    Profiles are hashed in the groups of :func:`profile_groups`, so
+    `generate` is only called once for each group with the torrent and the
+    index of the group, which it can use to keep a checkpoint per group.
+    `files` is the :func:`scan` result of the torrent's path; it is scanned
+    again if it isn't given. `metrics` and `index` are passed on to
+    :func:`write_torrent`.
+    """
+    path = str(torrent.path)
+    if files is None:
+        files = scan(path)
+    piece_size = torrent.piece_size
+    groups = profile_groups(profiles)
+    for i, (exclude, version, md5, group) in enumerate(groups):
+        # Selecting files resets the piece size
+        select_files(torrent, path, files, exclude)
+        if piece_size and torrent.size:
+            torrent.piece_size = piece_size
+        torrent.torrent_version = version
+        torrent.include_md5 = md5
+        if not generate(torrent, i):
+            return False
+        for name, profile in group:
+            t = torrent.copy()
+            t.layers = torrent.layers
+            apply_profile(t, profile)
+            write_torrent(t, f"{save_base}.{name}.torrent", metrics, index)
+    return True
+
+
+class _NoCheckpoint:
+    # Checkpoint for hashing all pieces without saving them
+
+    def open(self, torrent):
+        return b""
+
+    def add(self, piece_hash):
+        pass
+
+    def close(self):
+        pass
+
+    def remove(self):
+        pass
+
+
+def generate_resumable(
+    torrent,
+    checkpoint,
+    threads=None,
+    callback=None,
+    metrics=None,
+    reader=None,
+    md5=False,
+    prefetch=0,
+):
+    """
+    Hash `torrent` while saving finished pieces to `checkpoint`
+
+    Hashing continues after the pieces `checkpoint` already has. The
+    checkpoint is removed once all pieces are hashed and kept otherwise.
+    Without a `checkpoint`, all pieces are hashed with the `reader` from
+    :data:`~torf_gui.hasher.READERS`. If `md5` is true, the MD5 digest of
+    every file is computed from the same reads and added to the metainfo;
+    resumed pieces are read again for it, but not hashed. `prefetch` files
+    are read ahead, see :class:`~torf_gui.hasher.Prefetcher`.
+
+    :return: ``False`` if hashing was cancelled by `callback`
+    """
+    import torf
+
+    if not torrent.size:
+        raise torf.PathError(torrent.path, msg="Empty or all files excluded")
+    if checkpoint is None:
+        checkpoint = _NoCheckpoint()
+    pieces = bytearray(checkpoint.open(torrent))
+    if metrics is not None:
+        metrics.skipped(torrent, len(pieces) // 20)
+    pieces_total = torrent.pieces
+    files = torrent_files(torrent)
+    md5 = FileMD5(files, torrent.piece_size, threads) if md5 else None
+    try:
+        if md5 is not None and pieces:
+            _add_md5(torrent, md5, len(pieces) // 20, files)
+        for index, filepath, piece_hash in iter_piece_hashes(
+            torrent,
+            len(pieces) // 20,
+            threads,
+            files,
+            reader=reader,
+            md5=md5,
+            prefetch=prefetch,
+        ):
+            pieces += piece_hash
+            checkpoint.add(piece_hash)
+            if callback is not None and callback(
+                torrent, filepath, index + 1, pieces_total
+            ):
+                return False
+        if md5 is not None:
+            set_md5sums(torrent, md5.hexdigests())
+    finally:
+        checkpoint.close()
+        if md5 is not None:
+            md5.close()
+    torrent.metainfo["info"]["pieces"] = bytes(pieces)
+    checkpoint.remove()
+    return True
+
+
+def _add_md5(torrent, md5, pieces, files):
+    # Add the first `pieces` pieces, which were resumed, to `md5`
+    for index, _, data in read_pieces(torrent, 0, files):
+        if index >= pieces:
+            break
+        for future in md5.add(index, data):
+            future.result()
+
+
+def set_md5sums(torrent, digests):
+    """Set the "md5sum" of each file of `torrent` to one of `digests`"""
+    info = torrent.metainfo["info"]
+    if "files" in info:
+        for file, digest in zip(info["files"], digests, strict=True):
+            file["md5sum"] = digest
+    else:
+        info["md5sum"] = digests[0]
+
+
+def generate(
+    torrent,
+    threads=None,
+    callback=None,
+    interval=0,
+    cache=None,
+    cancelled=None,
+    checkpoint=None,
+    metrics=None,
+    reader=None,
+    prefetch=None,
+):
+    """
+    Hash `torrent` or load its piece hashes from `cache`
+
+    `callback` is called like the :meth:`torf.Torrent.generate` callback at
+    most every `interval` seconds.  Hashing stops after the current piece
+    once the :class:`threading.Event` `cancelled` is set. If `checkpoint` is
+    given, hashing resumes from it and keeps it up to date. `metrics` is a
+    :class:`~torf_gui.metrics.JobMetrics` that records time and speed.
+    `reader` is one of :data:`~torf_gui.hasher.READERS`; torf hashes
+    torrents without a checkpoint itself unless another reader is given or
+    the :attr:`include_md5` attribute of `torrent` is set, which torf
+    doesn't support. MD5 digests are never loaded from `cache`.
+
+    `prefetch` is the number of files to read ahead of the hashers, which
+    is also done by our own pipeline instead of torf. If it is ``None``,
+    files are read ahead on network filesystems, see
+    :func:`~torf_gui.tuning.prefetch_files`.
+
+    v2 and hybrid torrents, see :data:`~torf_gui.merkle.VERSIONS`, are
+    always hashed from the start by :func:`torf_gui.merkle.generate`
+    without `cache`, `checkpoint` or `reader`. Their hashes are kept in the
+    :attr:`layers` attribute of `torrent`, which is ``None`` for v1.
+
+    :return: ``False`` if hashing was cancelled
+    """
+    if metrics is None:
+        return _generate(
+            torrent,
+            threads,
+            callback,
+            interval,
+            cache,
+            cancelled,
+            checkpoint,
+            reader=reader,
+            prefetch=prefetch,
+        )
+
+    def sampling_callback(torrent, filepath, pieces_done, pieces_total):
+        metrics.sample(torrent, pieces_done)
+        if callback is not None:
+            return callback(torrent, filepath, pieces_done, pieces_total)
+        return None
+
+    with metrics.hashing(torrent, threads):
+        return _generate(
+            torrent,
+            threads,
+            sampling_callback,
+            interval,
+            cache,
+            cancelled,
+            checkpoint,
+            metrics,
+            reader,
+            prefetch,
+        )
+
+
+def _generate(
+    torrent,
+    threads,
+    callback,
+    interval,
+    cache,
+    cancelled,
+    checkpoint,
+    metrics=None,
+    reader=None,
+    prefetch=None,
+):
+    version = getattr(torrent, "torrent_version", "v1")
+    torrent.layers = None
+    if version != "v1":
+        callback = ProgressCallback(callback, interval, cancelled)
+        return merkle.generate(torrent, version, threads, callback)
+    include_md5 = getattr(torrent, "include_md5", False)
+    if cache is not None and not include_md5 and cache.load(torrent):
+        if metrics is not None:
+            metrics.cached = True
+            metrics.skipped(torrent, torrent.pieces)
+        if callback is not None:
+            pieces = torrent.pieces
+            callback(torrent, str(torrent.path), pieces, pieces)
+        return True
+    callback = ProgressCallback(callback, interval, cancelled)
+    if prefetch is None:
+        prefetch = prefetch_files(str(torrent.path))
+    if (
+        checkpoint is not None
+        or include_md5
+        or prefetch
+        or reader not in (None, "stock")
+    ):
+        success = generate_resumable(
+            torrent,
+            checkpoint,
+            threads,
+            callback,
+            metrics,
+            reader,
+            include_md5,
+            prefetch,
+        )
+    else:
+        success = torrent.generate(threads=threads, callback=callback)
+    if success and cache is not None:
+        cache.store(torrent)
+    return success
+
+
+def create_torrent(
+    torrent,
+    save_path,
+    threads=None,
+    callback=None,
+    interval=0,
+    cache=None,
+    profiles=None,
+    cancelled=None,
+    checkpoint=None,
+    files=None,
+    metrics=None,
+    tuner=None,
+    reader=None,
+    prefetch=None,
+    index=None,
+):
+    """
+    Hash `torrent` and write it to `save_path`
+
+    If `profiles` is given, `save_path` is the output path without the
+    ".torrent" extension and one torrent is written per profile. `files`
+    is passed on to :func:`write_profile_torrents`.
+    `checkpoint` is a :class:`~torf_gui.checkpoint.Checkpoint` to resume
+    from and to save progress to; each group of profiles uses its own, see
+    :meth:`~torf_gui.checkpoint.Checkpoint.for_group`. `metrics` is a
+    :class:`~torf_gui.metrics.JobMetrics` to record the job in. If
+    `threads` isn't given, the :class:`~torf_gui.tuning.ThreadTuner`
+    `tuner` picks them. `reader` and `prefetch` are passed on to
+    :func:`generate`. Written torrents are added to the
+    :class:`~torf_gui.outputindex.OutputIndex` `index` if it is given.
+
+    :return: ``False`` if hashing was cancelled
+    """
+    torrent.creation_date = datetime.now()
+    torrent.created_by = CREATOR
+    if not threads and tuner is not None:
+        threads = tuner.threads(str(torrent.path), files, cancelled)
+
+    def _generate(t, group=0):
+        return generate(
+            t,
+            threads=threads,
+            callback=callback,
+            interval=interval,
+            cache=cache,
+            cancelled=cancelled,
+            checkpoint=(
+                checkpoint.for_group(group) if checkpoint is not None else None
+            ),
+            metrics=metrics,
+            reader=reader,
+            prefetch=prefetch,
+        )
+
+    if profiles:
+        return write_profile_torrents(
+            torrent, profiles, _generate, save_path, files, metrics, index
+        )
+    success = _generate(torrent)
+    if success:
+        write_torrent(torrent, save_path, metrics, index)
+    return success
+
+
+class BatchCreator:
+    """
+    Create one torrent for each file and directory directly beneath `path`
+
+    Up to `jobs` entries are hashed at the same time and share `threads`
+    hasher threads, or as many as the :class:`~torf_gui.tuning.ThreadTuner`
+    `tuner` picks for the device of `path`. If `metrics` is a
+    :class:`~torf_gui.metrics.MetricsFile`, a record is written to it for
+    each entry. `reader` and `prefetch` are passed on to :func:`generate`.
+    `torrent_version` is one of :data:`~torf_gui.merkle.VERSIONS`. Every
+    written torrent is added to the
+    :class:`~torf_gui.outputindex.OutputIndex` `index` if it is given.
+
+    If `incremental` is true, the entries are recorded in a
+    :class:`~torf_gui.manifest.BatchManifest` in `save_dir`, and entries
+    whose files and settings haven't changed since are skipped.
+    :attr:`report` lists the names of the created, rebuilt, skipped and
+    removed entries of the last :meth:`run`.
+    """
+
+    def __init__(
+        self,
+        path,
+        exclude,
+        save_dir,
+        trackers,
+        web_seeds,
+        private,
+        source,
+        randomize_infohash,
+        comment,
+        include_md5,
+        jobs=1,
+        threads=None,
+        cache=None,
+        profiles=None,
+        metrics=None,
+        tuner=None,
+        reader=None,
+        torrent_version="v1",
+        incremental=False,
+        prefetch=None,
+        index=None,
+    ):
+        self.path = os.path.normpath(path)
+        self.exclude = matcher(exclude)
+        self.save_dir = save_dir
+        self.trackers = trackers
+        self.web_seeds = web_seeds
+        self.private = private
+        self.source = source
+        self.randomize_infohash = randomize_infohash
+        self.comment = comment
+        self.include_md5 = include_md5
+        self.jobs = max(1, jobs)
+        self.threads = threads or THREAD_BUDGET
+        self.cache = cache
+        self.profiles = profiles
+        self.metrics = metrics
+        self.tuner = tuner
+        self.reader = reader
+        self.torrent_version = torrent_version
+        self.prefetch = prefetch
+        self.index = index
+        self.manifest = (
+            BatchManifest.for_output(save_dir) if incremental else None
+        )
+        self.report = {name: [] for name in REPORT_KEYS}
+        # Entry name -> entry_files() result of entries about to be created
+        self._entry_files = {}
+        self._cancelled = threading.Event()
+
+    def cancel(self):
+        self._cancelled.set()
+
+    @property
+    def cancelled(self):
+        return self._cancelled.is_set()
+
+    def thread_budget(self):
+        """Return the hasher threads shared by all entries"""
+        if self.tuner is not None:
+            return self.tuner.threads(self.path, cancelled=self._cancelled)
+        return self.threads
+
+    def files_to_prefetch(self):
+        """
+        Return the number of files to read ahead of the hashers of each
+        entry
+
+        Unless it was given, it is looked up once for the device of `path`.
+        """
+        if self.prefetch is None:
+            self.prefetch = prefetch_files(self.path)
+        return self.prefetch
+
+    def entries(self):
+        """Return an :class:`os.DirEntry` for each torrent to create"""
+        with os.scandir(self.path) as entries:
+            return [
+                entry
+                for entry in entries
+                if not self.exclude.match(entry.name) and not is_hidden(entry)
+            ]
+
+    def fingerprint(self):
+        """Return the fingerprint of the settings that affect the torrents"""
+        return fingerprint(
+            {
+                "exclude": self.exclude.patterns,
+                "trackers": self.trackers,
+                "web_seeds": self.web_seeds,
+                "private": self.private,
+                "source": self.source,
+                "randomize_infohash": self.randomize_infohash,
+                "comment": self.comment,
+                "include_md5": self.include_md5,
+                "torrent_version": self.torrent_version,
+                "profiles": self.profiles or [],
+            }
+        )
+
+    def changed_entries(self, entries):
+        """
+        Return the `entries` that have to be created because they aren't
+        recorded in the manifest or changed since
+
+        Unchanged entries are added to the skipped ones of :attr:`report`
+        and entries that no longer exist to the removed ones.
+        """
+        settings = self.fingerprint()
+        self.report["removed"] = self.manifest.forget(e.name for e in entries)
+        changed = []
+        for entry in entries:
+            try:
+                files = entry_files(entry)
+            except OSError:
+                # Creating the torrent reports the error
+                changed.append(entry)
+                continue
+            outputs = self.output_paths(entry.name)
+            if self.manifest.is_current(entry.name, files, settings, outputs):
+                self.report["skipped"].append(entry.name)
+            else:
+                self._entry_files[entry.name] = files
+                changed.append(entry)
+        return changed
+
+    def summary(self):
+        """Return the number of entries in each category of :attr:`report`"""
+        return ", ".join(
+            f"{len(self.report[key])} {key}"
+            for key in REPORT_KEYS
+            if self.report[key]
+        )
+
+    def output_paths(self, name):
+        """Return the torrent files written for the entry `name`"""
+        save_base = os.path.join(self.save_dir, name)
+        if self.profiles:
+            return [f"{save_base}.{p}.torrent" for p, _ in self.profiles]
+        return [save_base + ".torrent"]
+
+    def generate_entry(self, t, sfn, threads, entry_progress, metrics=None):
+        last_pc = -1
+
+        def callback(torrent, filepath, pieces_done, pieces_total):
+            nonlocal last_pc
+            # Only report whole percent steps so concurrent entries don't
+            # flood the caller
+            pc = 100 * pieces_done // pieces_total
+            if pc != last_pc and entry_progress is not None:
+                last_pc = pc
+                entry_progress(sfn, pieces_done, pieces_total)
+
+        return generate(
+            t,
+            threads=threads,
+            callback=callback,
+            interval=PROGRESS_INTERVAL,
+            cache=self.cache,
+            cancelled=self._cancelled,
+            metrics=metrics,
+            reader=self.reader,
+            prefetch=self.files_to_prefetch(),
+        )
+
+    def create_entry(self, entry, threads, entry_progress=None):
+        if self.metrics is None and self.manifest is None:
+            self._create_entry(entry, threads, entry_progress, None)
+            return
+        # Imported here because torf_gui.metrics imports this module
+        from torf_gui.metrics import JobMetrics
+
+        files = None
+        if self.manifest is not None:
+            # Files are recorded as they were before hashing, so changes
+            # while hashing are picked up by the next batch
+            files = self._entry_files.pop(entry.name, None)
+            if files is None:
+                files = entry_files(entry)
+        metrics = JobMetrics(entry.name, "batch")
+        success = False
+        try:
+            success = self._create_entry(
+                entry, threads, entry_progress, metrics
+            )
+        finally:
+            # Empty and canceled entries aren't recorded
+            if self.metrics is not None and (
+                success or (success is not None and not self.cancelled)
+            ):
+                self.metrics.write(metrics.record(bool(success)))
+        if success and self.manifest is not None:
+            known = self.manifest.update(
+                entry.name, files, self.fingerprint(), metrics.infohashes
+            )
+            self.report["rebuilt" if known else "created"].append(entry.name)
+
+    def _create_entry(self, entry, threads, entry_progress, metrics):
+        # Return whether the torrent was created, None for empty entries
+        # torf is imported on first use so the GUI can paint before loading it
+        import torf
+
+        save_base = os.path.join(self.save_dir, entry.name)
+        sfn = entry.name + ".torrent"
+
+        def _generate(t, group=0):
+            return self.generate_entry(
+                t, sfn, threads, entry_progress, metrics
+            )
+
+        with _phase(metrics, "scan"):
+            files = scan(entry, cancelled=self._cancelled)
+        if files is None:
+            return False
+        t = torrent_from_scan(
+            entry.path,
+            files,
+            exclude=self.exclude,
+            trackers=self.trackers,
+            webseeds=self.web_seeds,
+            private=self.private,
+            source=self.source,
+            randomize_infohash=self.randomize_infohash,
+            comment=self.comment,
+            creation_date=datetime.now(),
+            created_by=CREATOR,
+        )
+        t.include_md5 = self.include_md5
+        t.torrent_version = self.torrent_version
+        try:
+            if self.profiles:
+                return write_profile_torrents(
+                    t,
+                    self.profiles,
+                    _generate,
+                    save_base,
+                    files,
+                    metrics,
+                    self.index,
+                )
+            success = _generate(t)
+        # Ignore empty inputs
+        except torf.TorfError as exc:
+            if "Empty or all files excluded" in str(exc):
+                return None
+            raise
+        if success and not self.cancelled:
+            write_torrent(t, save_base + ".torrent", metrics, self.index)
+            return True
+        return False
+
+    def run(self, progress=None, entry_progress=None):
+        """
+        Create all torrents
+
+        `progress` is called with the output file name, the number of
+        finished entries and the total number of entries after each entry.
+        `entry_progress` is called with the output file name, hashed pieces
+        and total pieces while an entry is hashed.
+
+        :raises: the first exception raised by any entry after all other
+            entries were cancelled
+        :return: ``False`` if the batch was cancelled
+        """
+        self.report = {name: [] for name in REPORT_KEYS}
+        entries = self.entries()
+        total = len(entries)
+        if self.manifest is not None:
+            entries = self.changed_entries(entries)
+
+        # Entries share one thread budget, so running more of them at the
+        # same time overlaps I/O instead of oversubscribing the CPU
+        jobs = min(self.jobs, len(entries)) or 1
+        threads = split_thread_budget(self.thread_budget(), jobs)
+        done = total - len(entries)
+        if total and progress is not None:
+            progress("", done, total)
+        with ThreadPoolExecutor(max_workers=jobs) as executor:
+            futures = {
+                executor.submit(
+                    self.create_entry, entry, threads, entry_progress
+                ): entry
+                for entry in entries
+            }
+            try:
+                for future in as_completed(futures):
+                    done += 1
+                    sfn = futures[future].name + ".torrent"
+                    if progress is not None:
+                        progress(sfn, done, total)
+                    future.result()
+            except BaseException:
+                # Also stop running entries on KeyboardInterrupt
+                self.cancel()
+                executor.shutdown(wait=True, cancel_futures=True)
+                raise
+            finally:
+                if self.manifest is not None:
+                    self.manifest.save()
+        return not self.cancelled
@@ -0,0 +1,87 @@
+import os
+import re
+from fnmatch import translate
+
+REGEX_PREFIX = "re:"
+
+_WILDCARDS = frozenset("*?[")
+
+
+def _compile(expressions, flags=0):
+    if not expressions:
+        return None
+    return re.compile("|".join(f"(?:{e})" for e in expressions), flags)
+
+
+class ExcludeMatcher:
+    """
+    Exclusion patterns compiled into one regular expression per kind
+
+    Patterns are matched against "/"-separated paths that start with the
+    torrent name, e.g. "Album/CD1/cover.jpg".
+
+    - "re:<regex>" is searched for anywhere in the path.
+    - "/<glob>" is anchored below the torrent name, e.g. "/CD1/*.jpg".
+    - Any other glob is matched against the whole path like torf does and
+      against the file name, so "Thumbs.db" excludes it in every directory.
+
+    Globs ignore case. Empty lines are ignored.
+
+    :raises ValueError: if a regular expression is invalid
+    """
+
+    def __init__(self, patterns=()):
+        self.patterns = [p.strip() for p in patterns if p.strip()]
+        globs, anchored, regexs, suffixes = [], [], [], []
+        for pattern in self.patterns:
+            if pattern.startswith(REGEX_PREFIX):
+                regex = pattern[len(REGEX_PREFIX) :]
+                try:
+                    re.compile(regex)
+                except re.error as e:
+                    msg = f"Invalid pattern {pattern!r}: {e}"
+                    raise ValueError(msg) from e
+                regexs.append(regex)
+            elif pattern.startswith("/"):
+                anchored.append(translate(pattern[1:]))
+            elif pattern[0] == "*" and not _WILDCARDS & set(pattern[1:]):
+                # "*.nfo" and the like are by far the most common patterns
+                suffixes.append(pattern[1:].casefold())
+            else:
+                globs.append(translate(pattern))
+        self._suffixes = tuple(suffixes)
+        self._globs = _compile(globs, re.IGNORECASE)
+        self._anchored = _compile(anchored, re.IGNORECASE)
+        self._regexs = _compile(regexs)
+
+    def __bool__(self):
+        return bool(self.patterns)
+
+    def __repr__(self):
+        return f"{type(self).__name__}({self.patterns!r})"
+
+    def match(self, relpath):
+        """Return whether `relpath` is excluded"""
+        if os.sep != "/":
+            relpath = relpath.replace(os.sep, "/")
+        if self._suffixes and relpath.casefold().endswith(self._suffixes):
+            return True
+        if self._regexs is not None and self._regexs.search(relpath):
+            return True
+        if self._globs is not None and (
+            self._globs.match(relpath)
+            or self._globs.match(relpath.rpartition("/")[2])
+        ):
+            return True
+        if self._anchored is not None:
+            # Single files are their own top level
+            below = relpath.partition("/")[2] or relpath
+            return bool(self._anchored.match(below))
+        return False
+
+
+def matcher(exclude):
+    """Return `exclude` as an :class:`ExcludeMatcher`"""
+    if isinstance(exclude, ExcludeMatcher):
+        return exclude
+    return ExcludeMatcher(exclude or ())
@@ -0,0 +1,59 @@
+import os
+import sys
+from array import array
+from collections.abc import Sequence
+
+
+class FileTable(Sequence):
+    """
+    Compact list of (filepath, size) pairs
+
+    Inputs with millions of files would need a tuple, a full path and a
+    size object per file. Here each directory path is stored once, file
+    names are interned and sizes and directory indexes are kept in arrays,
+    while items are still read as (filepath, size) tuples.
+    """
+
+    def __init__(self, files=()):
+        self._dirs = []
+        self._dir_indexes = {}
+        self._file_dirs = array("L")
+        self._names = []
+        self._sizes = array("Q")
+        for filepath, size in files:
+            self.append(filepath, size)
+
+    def append(self, filepath, size):
+        directory, name = os.path.split(filepath)
+        index = self._dir_indexes.get(directory)
+        if index is None:
+            index = self._dir_indexes[directory] = len(self._dirs)
+            self._dirs.append(directory)
+        self._file_dirs.append(index)
+        self._names.append(sys.intern(name))
+        self._sizes.append(size)
+
+    def __len__(self):
+        return len(self._sizes)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        directory = self._dirs[self._file_dirs[index]]
+        return os.path.join(directory, self._names[index]), self._sizes[index]
+
+    def __iter__(self):
+        dirs = self._dirs
+        join = os.path.join
+        for dir_index, name, size in zip(
+            self._file_dirs, self._names, self._sizes, strict=True
+        ):
+            yield join(dirs[dir_index], name), size
+
+    def __repr__(self):
+        return f"{type(self).__name__}({len(self)} files)"
+
+    @property
+    def size(self):
+        """Total size of all files"""
+        return sum(self._sizes)
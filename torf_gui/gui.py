@@ -1,27 +1,46 @@
 #!/usr/bin/env python3
 
-import json
+import importlib
 import os
-import stat
 import sys
-from datetime import datetime
-from fnmatch import fnmatch
+import threading
+import time
 
-import humanfriendly
-import qdarktheme
-import torf
 from PyQt5 import QtCore, QtWidgets
-from PyQt5.QtGui import QColorConstants, QPalette
+from PyQt5.QtGui import (
+    QColorConstants,
+    QPalette,
+    QStandardItem,
+    QStandardItemModel,
+)
 from PyQt5.QtWidgets import QApplication
-from qdarktheme import _style_loader
 
-from torf_gui import Ui_AboutDialog, Ui_MainWindow, __version__
+from torf_gui import (
+    Ui_AboutDialog,
+    Ui_MainWindow,
+    __version__,
+    engine,
+    jobqueue,
+)
+from torf_gui.checkpoint import Checkpoint
+from torf_gui.engine import (
+    PIECE_SIZES,
+    THREAD_BUDGET,
+    format_duration,
+    format_size,
+    profile_groups,
+)
+from torf_gui.exclude import ExcludeMatcher
+from torf_gui.hashcache import CACHE_FILENAME, DEFAULT_MAX_SIZE, HashCache
+from torf_gui.jobqueue import QUEUE_FILENAME, JobQueue, JobRunner
+from torf_gui.merkle import VERSIONS
+from torf_gui.metrics import JobMetrics, MetricsFile
+from torf_gui.outputindex import OutputIndex
+from torf_gui.tuning import TUNING_FILENAME, ThreadTuner
+from torf_gui.verify import read_torrent, verify_torrent
 
 PROGRAM_NAME = "torf-gui"
 PROGRAM_NAME_VERSION = f"{PROGRAM_NAME} {__version__}"
-CREATOR = f"torf-gui/{__version__} (https://github.com/SavageCore/torf-gui)"
-
-PIECE_SIZES = [None] + [2**i for i in range(14, 27)]
 
 if getattr(sys, "frozen", False):
     _basedir = sys._MEIPASS
@@ -33,11 +52,38 @@ class CreateTorrentQThread(QtCore.QThread):
     progress_update = QtCore.pyqtSignal(str, int, int)
     onError = QtCore.pyqtSignal(str)
 
-    def __init__(self, torrent, save_path):
+    def __init__(
+        self,
+        torrent,
+        save_path,
+        cache=None,
+        profiles=None,
+        checkpoint=None,
+        files=None,
+        metrics=None,
+        scan_seconds=0,
+        threads=None,
+        tuner=None,
+        index=None,
+    ):
         super().__init__()
         self.torrent = torrent
         self.save_path = save_path
+        self.cache = cache
+        self.profiles = profiles
+        self.checkpoint = checkpoint
+        self.files = files
+        self.threads = threads
+        self.tuner = tuner
+        self.index = index
+        # Records are only kept if `metrics` is a MetricsFile
+        self.metrics = metrics
+        self.job_metrics = JobMetrics(torrent.name, scan_seconds=scan_seconds)
         self.success = False
+        self._cancelled = threading.Event()
+
+    def cancel(self):
+        self._cancelled.set()
 
     def run(self):
         def progress_callback(*args):
@@ -47,95 +93,230 @@ class CreateTorrentQThread(QtCore.QThread):
             self.progress_update.emit(filename, args[2], args[3])
             return None
 
-        self.torrent.creation_date = datetime.now()
-        self.torrent.created_by = CREATOR
         try:
-            self.success = self.torrent.generate(callback=progress_callback)
+            self.success = engine.create_torrent(
+                self.torrent,
+                self.save_path,
+                callback=progress_callback,
+                interval=engine.PROGRESS_INTERVAL,
+                cache=self.cache,
+                profiles=self.profiles,
+                cancelled=self._cancelled,
+                checkpoint=self.checkpoint,
+                files=self.files,
+                metrics=self.job_metrics,
+                threads=self.threads,
+                tuner=self.tuner,
+                index=self.index,
+            )
         except Exception as exc:
             self.onError.emit(str(exc))
-            return
-        if self.success:
-            self.torrent.write(self.save_path, overwrite=True)
+        finally:
+            if self.metrics is not None:
+                record = self.job_metrics.record(self.success)
+                try:
+                    self.metrics.write(record)
+                except OSError as exc:
+                    self.onError.emit(f"Metrics not recorded: {exc}")
 
 
 class CreateTorrentBatchQThread(QtCore.QThread):
+    progress_update = QtCore.pyqtSignal(str, int, int)
+    entry_progress = QtCore.pyqtSignal(str, int, int)
+    onError = QtCore.pyqtSignal(str)
+
+    def __init__(self, **kwargs):
+        super().__init__()
+        self.batch = engine.BatchCreator(**kwargs)
+        self.success = False
+
+    def cancel(self):
+        self.batch.cancel()
+
+    def run(self):
+        try:
+            self.success = self.batch.run(
+                progress=self.progress_update.emit,
+                entry_progress=self.entry_progress.emit,
+            )
+        except Exception as exc:
+            self.onError.emit(str(exc))
+
+
+class VerifyTorrentQThread(QtCore.QThread):
     progress_update = QtCore.pyqtSignal(str, int, int)
     onError = QtCore.pyqtSignal(str)
 
     def __init__(
-        self,
-        path,
-        exclude,
-        save_dir,
-        trackers,
-        web_seeds,
-        private,
-        source,
-        randomize_infohash,
-        comment,
-        include_md5,
+        self, torrent, path, stop_on_error=False, threads=None, tuner=None
     ):
         super().__init__()
+        self.torrent = torrent
+        self.path = path
+        self.stop_on_error = stop_on_error
+        self.threads = threads
+        self.tuner = tuner
+        self.result = None
+        self.success = False
+        self._cancelled = threading.Event()
+
+    def cancel(self):
+        self._cancelled.set()
+
+    def run(self):
+        def progress_callback(torrent, filepath, pieces_done, pieces_total):
+            filename = os.path.split(filepath)[1]
+            self.progress_update.emit(filename, pieces_done, pieces_total)
+
+        try:
+            threads = self.threads
+            if not threads and self.tuner is not None:
+                threads = self.tuner.threads(
+                    self.path, cancelled=self._cancelled
+                )
+            self.result = verify_torrent(
+                self.torrent,
+                self.path,
+                threads=threads,
+                callback=progress_callback,
+                cancelled=self._cancelled,
+                stop_on_error=self.stop_on_error,
+            )
+            self.success = not self.result.cancelled
+        except Exception as exc:
+            self.onError.emit(str(exc))
+
+
+class JobQThread(QtCore.QThread):
+    progress_update = QtCore.pyqtSignal(int, int, int)
+
+    def __init__(self, runner):
+        super().__init__()
+        self.runner = runner
+        self.success = False
+        self.error = None
+
+    def cancel(self):
+        self.runner.cancel()
+
+    def run(self):
+        job_id = self.runner.job.id
+
+        def progress(done, total):
+            self.progress_update.emit(job_id, done, total)
+
+        try:
+            self.success = self.runner.run(progress=progress)
+        except Exception as exc:
+            # Failed jobs are marked in the queue instead of interrupting
+            # the user with an error message
+            self.error = str(exc)
+
+
+class ScanInputQThread(QtCore.QThread):
+    progress_update = QtCore.pyqtSignal(int, "qint64")
+    onError = QtCore.pyqtSignal(str)
+
+    def __init__(self, path, exclude, parent=None):
+        super().__init__(parent)
         self.path = path
         self.exclude = exclude
-        self.save_dir = save_dir
-        self.trackers = trackers
-        self.web_seeds = web_seeds
-        self.private = private
-        self.source = source
-        self.randomize_infohash = randomize_infohash
-        self.comment = comment
-        self.include_md5 = include_md5
+        self.files = None
+        self.torrent = None
+        self.excluded = (0, 0)
+        self.seconds = 0
+        self._cancelled = threading.Event()
 
-    def has_hidden_attribute(self, filepath):
-        return bool(
-            os.stat(filepath).st_file_attributes & stat.FILE_ATTRIBUTE_HIDDEN
-        )
+    def cancel(self):
+        self._cancelled.set()
 
-    def is_hidden_file(self, path):
-        name = os.path.basename(os.path.abspath(path))
-        return name.startswith(".") or self.has_hidden_attribute(path)
+    @property
+    def cancelled(self):
+        return self._cancelled.is_set()
 
     def run(self):
-        def callback(*args):
-            return None
+        started = time.monotonic()
+        try:
+            files = engine.scan(
+                self.path,
+                progress=self.progress_update.emit,
+                cancelled=self._cancelled,
+            )
+            if files is None:
+                return
+            import torf
 
-        self.success = False
+            torrent = torf.Torrent()
+            self.excluded = engine.select_files(
+                torrent, self.path, files, self.exclude
+            )
+            self.files, self.torrent = files, torrent
+            self.seconds = time.monotonic() - started
+        except Exception as exc:
+            if not self.cancelled:
+                self.onError.emit(str(exc))
 
-        entries = os.listdir(self.path)
-
-        for i, p in enumerate(entries):
-            if any(fnmatch(p, ex) for ex in self.exclude):
-                continue
-            p = os.path.join(self.path, p)
-
-            if not self.is_hidden_file(p):
-                sfn = os.path.split(p)[1] + ".torrent"
-                self.progress_update.emit(sfn, i, len(entries))
-                t = torf.Torrent(
-                    path=p,
-                    exclude_globs=self.exclude,
-                    trackers=self.trackers,
-                    webseeds=self.web_seeds,
-                    private=self.private,
-                    source=self.source,
-                    randomize_infohash=self.randomize_infohash,
-                    comment=self.comment,
-                    creation_date=datetime.now(),
-                    created_by=CREATOR,
-                )
-                try:
-                    self.success = t.generate(callback=callback)
-                # Ignore empty inputs
-                except torf.TorfError as exc:
-                    if "Empty or all files excluded" in str(exc):
-                        continue
-                    self.onError.emit(str(exc))
-                    return
-                if self.isInterruptionRequested():
-                    return
-                if self.success:
-                    t.write(os.path.join(self.save_dir, sfn), overwrite=True)
+
+class PreloadQThread(QtCore.QThread):
+    """Import modules that aren't needed to show the main window"""
+
+    def __init__(self, modules):
+        super().__init__()
+        self.modules = modules
+        self.elapsed = 0
+
+    def run(self):
+        started = time.perf_counter()
+        for module in self.modules:
+            importlib.import_module(module)
+        self.elapsed = time.perf_counter() - started
+
+
+class StartupProfile:
+    """Time startup phases and print them with --startup-profile"""
+
+    def __init__(self, enabled):
+        self.enabled = enabled
+        # Only the CPU time is known for the time before main(), so it isn't
+        # added to the wall-clock time of the phases
+        self.before_main = time.process_time()
+        self.marks = []
+        self.last = time.perf_counter()
+
+    def mark(self, name):
+        now = time.perf_counter()
+        self.marks.append((name, now - self.last))
+        self.last = now
+
+    def report(self, background=()):
+        if not self.enabled:
+            return
+        print(
+            f"{self.before_main * 1000:9.1f} ms  before main() (CPU time)",
+            file=sys.stderr,
+        )
+        total = 0
+        for name, seconds in self.marks:
+            total += seconds
+            print(f"{seconds * 1000:9.1f} ms  {name}", file=sys.stderr)
+        print(f"{total * 1000:9.1f} ms  total", file=sys.stderr)
+        for name, seconds in background:
+            print(f"{seconds * 1000:9.1f} ms  {name}", file=sys.stderr)
+
+
+class FirstPaintFilter(QtCore.QObject):
+    """Call `callback` once the widget it filters is first painted"""
+
+    def __init__(self, callback):
+        super().__init__()
+        self.callback = callback
+
+    def eventFilter(self, obj, event):
+        if event.type() == QtCore.QEvent.Paint:
+            obj.removeEventFilter(self)
+            # Called once the paint event is handled
+            QtCore.QTimer.singleShot(0, self.callback)
+        return False
 
 
 class TorfGUI(Ui_MainWindow):
@@ -144,10 +325,30 @@ class TorfGUI(Ui_MainWindow):
 
         self.torrent = None
         self.MainWindow = MainWindow
+        self.creation_thread = None
+        self.scan_thread = None
+        self.scanned_path = None
+        self.scanned_files = None
+        self.scan_seconds = 0
+        self.excluded = (0, 0)
+        self.planner = None
+        self.hash_rate = None
+        self.batch_progress = (0, 0)
+        self.settings_loaded = False
+        self.last_input_dir = None
+        self.last_output_dir = None
+        self.metrics_path = None
+        self.index_path = None
+        self.output_index = None
+        self.creation_started_at = None
+        self.thread_tuner = None
 
         self.actionImportProfile.triggered.connect(self.import_profile)
         self.actionExportProfile.triggered.connect(self.export_profile)
         self.actionAbout.triggered.connect(self.showAboutDialog)
+        self.actionVerify.triggered.connect(self.verifyTorrent)
+        self.actionRecordMetrics.triggered.connect(self.recordMetricsToggled)
+        self.actionWriteIndex.triggered.connect(self.writeIndexToggled)
         self.actionQuit.triggered.connect(self.MainWindow.close)
 
         self.fileRadioButton.toggled.connect(self.inputModeToggle)
@@ -156,17 +357,24 @@ class TorfGUI(Ui_MainWindow):
 
         self.browseButton.clicked.connect(self.browseInput)
         self.batchModeCheckBox.stateChanged.connect(self.batchModeChanged)
+        self.batchJobsSpinBox.setMaximum(THREAD_BUDGET)
+        self.batchJobsLabel.hide()
+        self.batchJobsSpinBox.hide()
+        self.incrementalCheckBox.hide()
+
+        # Exclusions are applied to the scanned files once typing pauses
+        self.excludeTimer = QtCore.QTimer(self.MainWindow)
+        self.excludeTimer.setSingleShot(True)
+        self.excludeTimer.setInterval(500)
+        self.excludeTimer.timeout.connect(self.applyExclusions)
+        self.excludeEdit.textChanged.connect(self.excludeTimer.start)
 
         self.inputEdit.dragEnterEvent = self.inputDragEnterEvent
         self.inputEdit.dropEvent = self.inputDropEvent
         self.pasteButton.clicked.connect(self.pasteInput)
 
         self.pieceCountLabel.hide()
-        self.pieceSizeComboBox.addItem("Auto")
-        for x in PIECE_SIZES[1:]:
-            self.pieceSizeComboBox.addItem(
-                humanfriendly.format_size(x, binary=True)
-            )
+        self.setupPiecePlan()
 
         self.pieceSizeComboBox.currentIndexChanged.connect(
             self.pieceSizeChanged
@@ -185,13 +393,24 @@ class TorfGUI(Ui_MainWindow):
         )
 
         self.md5CheckBox.stateChanged.connect(self.md5Changed)
+        self.versionComboBox.currentIndexChanged.connect(self.versionChanged)
+
+        self.output_profiles = []
+        self.outputProfilesButton.clicked.connect(self.selectOutputProfiles)
+        self.outputProfilesClearButton.clicked.connect(
+            self.clearOutputProfiles
+        )
+        self.updateOutputProfilesLabel()
 
         self.progressBar.hide()
         self.createButton.setEnabled(False)
         self.createButton.clicked.connect(self.createButtonClicked)
+        self.queueButton.setEnabled(False)
+        self.queueButton.clicked.connect(self.queueButtonClicked)
         self.cancelButton.hide()
         self.cancelButton.clicked.connect(self.cancel_creation)
         self.resetButton.clicked.connect(self.reset)
+        self.setupQueue()
 
         self._statusBarMsg("Ready")
 
@@ -207,12 +426,25 @@ class TorfGUI(Ui_MainWindow):
             PROGRAM_NAME,
         )
 
+    def loadGeometry(self):
+        settings = self.getSettings()
+        mainwindow_size = settings.value("geometry/size")
+        if mainwindow_size:
+            self.MainWindow.resize(mainwindow_size)
+        mainwindow_position = settings.value("geometry/position")
+        if mainwindow_position:
+            self.MainWindow.move(mainwindow_position)
+
     def loadSettings(self):
         settings = self.getSettings()
         if settings.value("input/mode") == "directory":
             self.directoryRadioButton.setChecked(True)
         batch_mode = bool(int(settings.value("input/batch_mode") or 0))
         self.batchModeCheckBox.setChecked(batch_mode)
+        batch_jobs = int(settings.value("input/batch_jobs") or 1)
+        self.batchJobsSpinBox.setValue(batch_jobs)
+        incremental = bool(int(settings.value("input/incremental") or 0))
+        self.incrementalCheckBox.setChecked(incremental)
         exclude = settings.value("input/exclude")
         if exclude:
             self.excludeEdit.setPlainText(exclude)
@@ -234,23 +466,44 @@ class TorfGUI(Ui_MainWindow):
         compute_md5 = bool(int(settings.value("options/compute_md5") or 0))
         if compute_md5:
             self.md5CheckBox.setChecked(compute_md5)
-        mainwindow_size = settings.value("geometry/size")
-        if mainwindow_size:
-            self.MainWindow.resize(mainwindow_size)
-        mainwindow_position = settings.value("geometry/position")
-        if mainwindow_position:
-            self.MainWindow.move(mainwindow_position)
+        self.threadsSpinBox.setValue(
+            int(settings.value("options/threads") or 0)
+        )
+        self.setTorrentVersion(settings.value("options/torrent_version"))
+        hash_cache = bool(int(settings.value("options/hash_cache") or 0))
+        self.hashCacheCheckBox.setChecked(hash_cache)
+        self.hash_cache_max_size = int(
+            settings.value("options/hash_cache_max_size") or DEFAULT_MAX_SIZE
+        )
+        self.hash_rate = float(settings.value("options/hash_rate") or 0)
+        verify_stop_on_error = bool(
+            int(settings.value("options/verify_stop_on_error") or 0)
+        )
+        self.actionVerifyStopOnError.setChecked(verify_stop_on_error)
+        self.metrics_path = settings.value("options/metrics_file") or None
+        self.actionRecordMetrics.setChecked(bool(self.metrics_path))
+        self.index_path = settings.value("options/index_file") or None
+        self.actionWriteIndex.setChecked(bool(self.index_path))
         self.last_input_dir = settings.value("history/last_input_dir") or None
         self.last_output_dir = (
             settings.value("history/last_output_dir") or None
         )
+        self.loadQueue()
+        self.settings_loaded = True
 
     def saveSettings(self):
+        # Don't overwrite settings that were never loaded
+        if not self.settings_loaded:
+            return
         settings = self.getSettings()
         settings.setValue("input/mode", self.inputMode)
         settings.setValue(
             "input/batch_mode", int(self.batchModeCheckBox.isChecked())
         )
+        settings.setValue("input/batch_jobs", self.batchJobsSpinBox.value())
+        settings.setValue(
+            "input/incremental", int(self.incrementalCheckBox.isChecked())
+        )
         settings.setValue("input/exclude", self.excludeEdit.toPlainText())
         settings.setValue("seeding/trackers", self.trackerEdit.toPlainText())
         settings.setValue("seeding/web_seeds", self.webSeedEdit.toPlainText())
@@ -265,6 +518,22 @@ class TorfGUI(Ui_MainWindow):
         settings.setValue(
             "options/compute_md5", int(self.md5CheckBox.isChecked())
         )
+        settings.setValue("options/threads", self.threadsSpinBox.value())
+        settings.setValue("options/torrent_version", self.torrentVersion())
+        settings.setValue(
+            "options/hash_cache", int(self.hashCacheCheckBox.isChecked())
+        )
+        settings.setValue(
+            "options/hash_cache_max_size", self.hash_cache_max_size
+        )
+        if self.hash_rate:
+            settings.setValue("options/hash_rate", self.hash_rate)
+        settings.setValue(
+            "options/verify_stop_on_error",
+            int(self.actionVerifyStopOnError.isChecked()),
+        )
+        settings.setValue("options/metrics_file", self.metrics_path or "")
+        settings.setValue("options/index_file", self.index_path or "")
         settings.setValue("geometry/size", self.MainWindow.size())
         settings.setValue("geometry/position", self.MainWindow.pos())
         if self.last_input_dir:
@@ -272,9 +541,134 @@ class TorfGUI(Ui_MainWindow):
         if self.last_output_dir:
             settings.setValue("history/last_output_dir", self.last_output_dir)
 
+    def getSettingsDir(self):
+        return os.path.dirname(self.getSettings().fileName())
+
+    def getHashCache(self, enabled=None):
+        if enabled is None:
+            enabled = self.hashCacheCheckBox.isChecked()
+        if not enabled:
+            return None
+        try:
+            return HashCache(
+                os.path.join(self.getSettingsDir(), CACHE_FILENAME),
+                max_size=self.hash_cache_max_size,
+            )
+        except Exception as e:
+            self._showError(f"Piece hash cache disabled: {e}")
+            return None
+
+    def torrentVersion(self):
+        return VERSIONS[self.versionComboBox.currentIndex()]
+
+    def setTorrentVersion(self, version):
+        if version in VERSIONS:
+            self.versionComboBox.setCurrentIndex(VERSIONS.index(version))
+
+    def getThreadTuner(self, threads=None):
+        """Return the thread tuner if `threads` is auto"""
+        if threads is None:
+            threads = self.threadsSpinBox.value()
+        if threads:
+            return None
+        if self.thread_tuner is None:
+            # Shared so devices are only probed once per session
+            self.thread_tuner = ThreadTuner(
+                os.path.join(self.getSettingsDir(), TUNING_FILENAME),
+                THREAD_BUDGET,
+            )
+        return self.thread_tuner
+
+    def getMetricsFile(self):
+        if not self.metrics_path:
+            return None
+        return MetricsFile(self.metrics_path)
+
+    def recordMetricsToggled(self, checked):
+        if not checked:
+            self.metrics_path = None
+            return
+        fn = QtWidgets.QFileDialog.getSaveFileName(
+            self.MainWindow,
+            "Record job metrics",
+            self.metrics_path or self.last_output_dir,
+            filter=(
+                "JSON lines (*.jsonl *.json);;CSV (*.csv);;"
+                "Prometheus textfile (*.prom)"
+            ),
+            options=QtWidgets.QFileDialog.DontConfirmOverwrite,
+        )[0]
+        if fn:
+            self.metrics_path = fn
+        else:
+            self.actionRecordMetrics.setChecked(False)
+
+    def getOutputIndex(self):
+        if not self.index_path:
+            return None
+        # Shared by concurrent jobs, whose rows are written one at a time
+        index = self.output_index
+        if index is None or index.path != self.index_path:
+            index = self.output_index = OutputIndex(self.index_path)
+        return index
+
+    def writeIndexToggled(self, checked):
+        if not checked:
+            self.index_path = None
+            return
+        fn = QtWidgets.QFileDialog.getSaveFileName(
+            self.MainWindow,
+            "Write output index",
+            self.index_path or self.last_output_dir,
+            filter="JSON lines (*.jsonl *.json);;CSV (*.csv)",
+            options=QtWidgets.QFileDialog.DontConfirmOverwrite,
+        )[0]
+        if fn:
+            self.index_path = fn
+        else:
+            self.actionWriteIndex.setChecked(False)
+
     def _statusBarMsg(self, msg):
         self.MainWindow.statusBar().showMessage(msg)
 
+    def getCheckpoint(self, save_path):
+        """
+        Return the checkpoint to resume hashing for `save_path` from or
+        None if no output is hashed with one
+
+        Only the size of the checkpoint file is checked here; whether it
+        belongs to the same input is checked in the creation thread.
+        """
+        checkpoint = Checkpoint.for_output(save_path)
+        if self.output_profiles:
+            groups = profile_groups(self.output_profiles)
+            versions = [version for _, version, _, _ in groups]
+        else:
+            versions = [self.torrentVersion()]
+        checkpoints = [checkpoint.for_group(i) for i in range(len(versions))]
+        # v2 and hybrid torrents are hashed without checkpoints, so any
+        # checkpoint for them is left over from an earlier v1 run
+        for group_checkpoint, version in zip(
+            checkpoints, versions, strict=True
+        ):
+            if version != "v1":
+                group_checkpoint.remove()
+        if "v1" not in versions:
+            return None
+        group_checkpoint = checkpoints[versions.index("v1")]
+        pieces_done = group_checkpoint.pieces_stored(self.torrent)
+        if pieces_done:
+            answer = QtWidgets.QMessageBox.question(
+                self.MainWindow,
+                "Resume",
+                f"{pieces_done} of {self.torrent.pieces} pieces were already "
+                "hashed by an earlier run. Resume from there?",
+            )
+            if answer != QtWidgets.QMessageBox.Yes:
+                for group_checkpoint in checkpoints:
+                    group_checkpoint.remove()
+        return checkpoint
+
     def _showError(self, msg):
         errdlg = QtWidgets.QErrorMessage()
         errdlg.setWindowTitle("Error")
@@ -282,6 +676,8 @@ class TorfGUI(Ui_MainWindow):
         errdlg.exec_()
 
     def showAboutDialog(self):
+        import torf
+
         qdlg = QtWidgets.QDialog()
         ad = Ui_AboutDialog()
         ad.setupUi(qdlg)
@@ -294,6 +690,9 @@ class TorfGUI(Ui_MainWindow):
             self.inputMode = "file"
             self.batchModeCheckBox.setEnabled(False)
             self.batchModeCheckBox.hide()
+            self.batchJobsLabel.hide()
+            self.batchJobsSpinBox.hide()
+            self.incrementalCheckBox.hide()
             self.pieceSizeComboBox.setEnabled(True)
             if self.torrent:
                 self.pieceCountLabel.show()
@@ -303,6 +702,9 @@ class TorfGUI(Ui_MainWindow):
             self.batchModeCheckBox.show()
             # If batch mode is enabled, disable piece size selection
             if self.batchModeCheckBox.isChecked():
+                self.batchJobsLabel.show()
+                self.batchJobsSpinBox.show()
+                self.incrementalCheckBox.show()
                 self.pieceSizeComboBox.setCurrentIndex(0)
                 self.pieceSizeComboBox.setEnabled(False)
                 self.pieceCountLabel.hide()
@@ -332,6 +734,9 @@ class TorfGUI(Ui_MainWindow):
                 self.batchModeCheckBox.setCheckState(QtCore.Qt.Unchecked)
                 self.batchModeCheckBox.setEnabled(False)
                 self.batchModeCheckBox.hide()
+                self.batchJobsLabel.hide()
+                self.batchJobsSpinBox.hide()
+                self.incrementalCheckBox.hide()
             else:
                 self.directoryRadioButton.setChecked(True)
                 self.inputMode = "directory"
@@ -344,59 +749,154 @@ class TorfGUI(Ui_MainWindow):
     def inputDragEnterEvent(self, event):
         if event.mimeData().hasUrls():
             urls = event.mimeData().urls()
-            if len(urls) == 1 and urls[0].isLocalFile():
+            if all(url.isLocalFile() for url in urls):
                 event.accept()
                 return
         event.ignore()
 
     def inputDropEvent(self, event):
-        path = event.mimeData().urls()[0].toLocalFile()
-        self.injectInputPath(path)
+        paths = [url.toLocalFile() for url in event.mimeData().urls()]
+        self.injectInputPaths(paths)
 
     def pasteInput(self):
         mimeData = self.clipboard().mimeData()
         if mimeData.hasText():
-            path = mimeData.text().strip("'\"")
-            self.injectInputPath(path)
+            paths = [
+                line.strip().strip("'\"")
+                for line in mimeData.text().splitlines()
+                if line.strip()
+            ]
+            self.injectInputPaths(paths)
+
+    def injectInputPaths(self, paths):
+        # Several inputs at once become queued jobs
+        if len(paths) == 1:
+            self.injectInputPath(paths[0])
+        elif paths:
+            self.queuePaths(paths)
 
     def batchModeChanged(self, state):
         if state == QtCore.Qt.Checked:
             self.pieceSizeComboBox.setCurrentIndex(0)
             self.pieceSizeComboBox.setEnabled(False)
             self.pieceCountLabel.hide()
+            self.batchJobsLabel.show()
+            self.batchJobsSpinBox.show()
+            self.incrementalCheckBox.show()
         else:
+            self.batchJobsLabel.hide()
+            self.batchJobsSpinBox.hide()
+            self.incrementalCheckBox.hide()
             self.pieceSizeComboBox.setEnabled(True)
             if self.torrent:
                 self.pieceCountLabel.show()
 
+    def cancelScan(self):
+        if self.scan_thread is not None:
+            self.scan_thread.cancel()
+            self.scan_thread = None
+
     def initializeTorrent(self):
-        self.torrent = torf.Torrent(self.inputEdit.text())
-        try:
-            t_info = self.get_info(self.torrent)
+        # Scanning huge or remote directories takes a while, so it runs in
+        # the background and is replaced by scans of newer inputs
+        self.cancelScan()
+        self.torrent = None
+        self.scanned_files = None
+        self.createButton.setEnabled(False)
+        self.queueButton.setEnabled(False)
+        self.pieceCountLabel.hide()
+        self._statusBarMsg("Scanning...")
+        # Invalid patterns are applied once they are fixed
+        exclude = self.getExclusions() or ExcludeMatcher()
+        thread = ScanInputQThread(
+            self.inputEdit.text(), exclude, self.MainWindow
+        )
+        thread.progress_update.connect(
+            lambda files, size: self._scan_progress(thread, files, size)
+        )
+        thread.onError.connect(lambda msg: self._scan_error(thread, msg))
+        thread.finished.connect(lambda: self.scan_finished(thread))
+        thread.finished.connect(thread.deleteLater)
+        self.scan_thread = thread
+        thread.start()
+
+    def _scan_progress(self, thread, files, size):
+        if thread is self.scan_thread:
+            self._statusBarMsg(
+                f"Scanning... {files} files, {format_size(size)}"
+            )
 
-            # Check if the input path is empty
-            if t_info[1] == 0:
-                self.torrent = None
-                self._showError("Input path must be non-empty")
-                return
-        except Exception as e:
-            self.torrent = None
-            self._showError(str(e))
+    def _scan_error(self, thread, msg):
+        if thread is self.scan_thread:
+            self._statusBarMsg("")
+            self._showError(msg)
+
+    def scan_finished(self, thread):
+        # Results of canceled scans are dropped
+        if thread is not self.scan_thread:
+            return
+        self.scan_thread = None
+        if thread.torrent is None:
+            return
+        # Check if the input path is empty
+        if not any(size for _, size in thread.files):
+            self._statusBarMsg("")
+            self._showError("Input path must be non-empty")
             return
+        self.torrent = thread.torrent
+        self.scanned_path = thread.path
+        self.scanned_files = thread.files
+        self.scan_seconds = thread.seconds
+        self.excluded = thread.excluded
+        self.pieceSizeComboBox.setCurrentIndex(0)
+        self.torrentFilesChanged()
+
+    def getExclusions(self):
+        """Return the compiled exclusion patterns or `None` if invalid"""
+        try:
+            return ExcludeMatcher(
+                self.excludeEdit.toPlainText().strip().splitlines()
+            )
+        except ValueError as e:
+            self._statusBarMsg(str(e))
+            return None
+
+    def applyExclusions(self):
+        """Apply the exclusion patterns and return whether they are valid"""
+        self.excludeTimer.stop()
+        exclude = self.getExclusions()
+        if exclude is None:
+            return False
+        if self.torrent is None or self.scanned_files is None:
+            return True
+        self.excluded = engine.select_files(
+            self.torrent, self.scanned_path, self.scanned_files, exclude
+        )
+        if self.torrent.size:
+            index = self.pieceSizeComboBox.currentIndex()
+            engine.set_piece_size(self.torrent, PIECE_SIZES[index])
+        self.torrentFilesChanged()
+        return True
+
+    def torrentFilesChanged(self):
+        size = self.torrent.size or 0
+        self.planner = engine.PiecePlanner(self.torrent) if size else None
+        files = self.planner.files if size else 0
         ptail = os.path.split(self.torrent.path)[1]
         if self.inputMode == "file":
-            self._statusBarMsg(
-                f"{ptail}: {humanfriendly.format_size(t_info[0], binary=True)}"
-            )
+            msg = f"{ptail}: {format_size(size)}"
         else:
-            self._statusBarMsg(
-                f"{ptail}: {t_info[1]} files, "
-                f"{humanfriendly.format_size(t_info[0], binary=True)}"
+            msg = f"{ptail}: {files} files, {format_size(size)}"
+        excluded_files, excluded_size = self.excluded
+        if excluded_files:
+            msg += (
+                f" ({excluded_files} excluded, {format_size(excluded_size)})"
             )
-        self.pieceSizeComboBox.setCurrentIndex(0)
-        self.updatePieceCountLabel(t_info[3], t_info[2])
-        self.pieceCountLabel.show()
-        self.createButton.setEnabled(True)
+        self._statusBarMsg(msg)
+        self.updatePiecePlan()
+        self.pieceCountLabel.setVisible(bool(size))
+        self.createButton.setEnabled(bool(size))
+        self.queueButton.setEnabled(bool(size))
 
     def commentEdited(self, comment):
         if getattr(self, "torrent", None):
@@ -406,21 +906,54 @@ class TorfGUI(Ui_MainWindow):
         if getattr(self, "torrent", None):
             self.torrent.source = source
 
+    def setupPiecePlan(self):
+        # The piece size drop-down lists the piece count, .torrent size and
+        # hashing time of every piece size once the input is scanned
+        self.piecePlanModel = QStandardItemModel(0, 4, self.MainWindow)
+        self.piecePlanModel.setHorizontalHeaderLabels(
+            ["Piece size", "Pieces", ".torrent size", "Hashing time"]
+        )
+        for x in PIECE_SIZES:
+            name = format_size(x) if x else "Auto"
+            self.piecePlanModel.appendRow(
+                [QStandardItem(name)] + [QStandardItem() for _ in range(3)]
+            )
+        view = QtWidgets.QTableView(self.pieceSizeComboBox)
+        view.setSelectionBehavior(QtWidgets.QAbstractItemView.SelectRows)
+        view.verticalHeader().hide()
+        view.setShowGrid(False)
+        self.pieceSizeComboBox.setModel(self.piecePlanModel)
+        self.pieceSizeComboBox.setView(view)
+        self.pieceSizeComboBox.setModelColumn(0)
+        self.updatePiecePlan()
+
+    def updatePiecePlan(self):
+        view = self.pieceSizeComboBox.view()
+        for column in range(1, 4):
+            view.setColumnHidden(column, self.planner is None)
+        if self.planner is not None:
+            plan = self.planner.plan(self.hash_rate)
+            for row, (_, pieces, size, seconds) in enumerate(plan):
+                eta = engine.format_duration(seconds) if seconds else "?"
+                for column, text in enumerate(
+                    [str(pieces), format_size(size), eta], start=1
+                ):
+                    item = self.piecePlanModel.item(row, column)
+                    item.setText(text)
+                    item.setTextAlignment(QtCore.Qt.AlignRight)
+            index = self.pieceSizeComboBox.currentIndex()
+            piece_size, pieces = plan[index][:2]
+            self.updatePieceCountLabel(piece_size, pieces)
+        view.resizeColumnsToContents()
+        view.setMinimumWidth(view.horizontalHeader().length() + 2)
+
     def pieceSizeChanged(self, index):
         if getattr(self, "torrent", None):
-            # If piece size is greater than piece_size_max_default (16 MiB),
-            # set piece_size_max to the selected piece size
-            if (
-                PIECE_SIZES[index] is not None
-                and PIECE_SIZES[index] > 16777216
-            ):
-                self.torrent.piece_size_max = PIECE_SIZES[index]
-            self.torrent.piece_size = PIECE_SIZES[index]
-            t_info = self.get_info(self.torrent)
-            self.updatePieceCountLabel(t_info[3], t_info[2])
+            engine.set_piece_size(self.torrent, PIECE_SIZES[index])
+            self.updatePiecePlan()
 
     def updatePieceCountLabel(self, ps, pc):
-        ps = humanfriendly.format_size(ps, binary=True)
+        ps = format_size(ps)
         self.pieceCountLabel.setText(f"{pc} pieces @ {ps} each")
 
     def privateTorrentChanged(self, state):
@@ -435,10 +968,20 @@ class TorfGUI(Ui_MainWindow):
         if getattr(self, "torrent", None):
             self.torrent.include_md5 = state == QtCore.Qt.Checked
 
-    def createButtonClicked(self):
-        self.torrent.exclude_globs = (
-            self.excludeEdit.toPlainText().strip().splitlines()
-        )
+    def versionChanged(self, index):
+        # MD5 digests are only computed for v1 torrents
+        v1 = VERSIONS[index] == "v1"
+        if not v1:
+            self.md5CheckBox.setChecked(False)
+        self.md5CheckBox.setEnabled(v1)
+
+    def validateInput(self):
+        if not self.applyExclusions():
+            self._showError(self.statusbar.currentMessage())
+            return False
+        if not self.batchModeCheckBox.isChecked() and not self.torrent.size:
+            self._showError("All files are excluded")
+            return False
         # Validate trackers and web seed URLs
         trackers = self.trackerEdit.toPlainText().strip().split()
         web_seeds = self.webSeedEdit.toPlainText().strip().split()
@@ -447,6 +990,11 @@ class TorfGUI(Ui_MainWindow):
             self.torrent.webseeds = web_seeds
         except Exception as e:
             self._showError(str(e))
+            return False
+        return True
+
+    def createButtonClicked(self):
+        if not self.validateInput():
             return
         self.torrent.private = self.privateTorrentCheckBox.isChecked()
         self.torrent.randomize_infohash = (
@@ -455,6 +1003,7 @@ class TorfGUI(Ui_MainWindow):
         self.torrent.comment = self.commentEdit.text() or None
         self.torrent.source = self.sourceEdit.text() or None
         self.torrent.include_md5 = self.md5CheckBox.isChecked()
+        self.torrent.torrent_version = self.torrentVersion()
         if (
             self.inputMode == "directory"
             and self.batchModeCheckBox.isChecked()
@@ -463,7 +1012,76 @@ class TorfGUI(Ui_MainWindow):
         else:
             self.createTorrent()
 
+    def selectOutputProfiles(self):
+        fns = QtWidgets.QFileDialog.getOpenFileNames(
+            self.MainWindow,
+            "Select output profiles",
+            self.last_input_dir,
+            filter=("JSON configuration file (*.json)"),
+        )[0]
+        if fns:
+            profiles = []
+            for fn in fns:
+                name = os.path.splitext(os.path.split(fn)[1])[0]
+                try:
+                    profiles.append((name, engine.read_profile(fn)))
+                except Exception as e:
+                    self._showError(f"{fn}: {e}")
+                    return
+            self.output_profiles = profiles
+            self.updateOutputProfilesLabel()
+
+    def clearOutputProfiles(self):
+        self.output_profiles = []
+        self.updateOutputProfilesLabel()
+
+    def updateOutputProfilesLabel(self):
+        if self.output_profiles:
+            names = ", ".join(name for name, _ in self.output_profiles)
+            self.outputProfilesLabel.setText(names)
+            self.outputProfilesLabel.setToolTip(names)
+            self.outputProfilesClearButton.show()
+        else:
+            self.outputProfilesLabel.setText("None")
+            self.outputProfilesLabel.setToolTip("")
+            self.outputProfilesClearButton.hide()
+
+    def createTorrentForProfiles(self):
+        save_dir = QtWidgets.QFileDialog.getExistingDirectory(
+            self.MainWindow, "Select output directory", self.last_output_dir
+        )
+        if save_dir:
+            self.last_output_dir = save_dir
+            if os.path.isfile(self.inputEdit.text()):
+                save_base = os.path.splitext(
+                    os.path.split(self.inputEdit.text())[1]
+                )[0]
+            else:
+                save_base = self.inputEdit.text().split(os.sep)[-1]
+            save_base = os.path.join(save_dir, save_base)
+            self.creation_thread = CreateTorrentQThread(
+                self.torrent,
+                save_base,
+                cache=self.getHashCache(),
+                profiles=self.output_profiles,
+                checkpoint=self.getCheckpoint(save_base),
+                files=self.scanned_files,
+                metrics=self.getMetricsFile(),
+                scan_seconds=self.scan_seconds,
+                threads=self.threadsSpinBox.value(),
+                tuner=self.getThreadTuner(),
+                index=self.getOutputIndex(),
+            )
+            self.creation_thread.started.connect(self.creation_started)
+            self.creation_thread.progress_update.connect(self._progress_update)
+            self.creation_thread.finished.connect(self.creation_finished)
+            self.creation_thread.onError.connect(self._showError)
+            self.creation_thread.start()
+
     def createTorrent(self):
+        if self.output_profiles:
+            self.createTorrentForProfiles()
+            return
         if os.path.isfile(self.inputEdit.text()):
             save_fn = (
                 os.path.splitext(os.path.split(self.inputEdit.text())[1])[0]
@@ -481,7 +1099,17 @@ class TorfGUI(Ui_MainWindow):
         )[0]
         if fn:
             self.last_output_dir = os.path.split(fn)[0]
-            self.creation_thread = CreateTorrentQThread(self.torrent, fn)
+            self.creation_thread = CreateTorrentQThread(
+                self.torrent,
+                fn,
+                cache=self.getHashCache(),
+                checkpoint=self.getCheckpoint(fn),
+                metrics=self.getMetricsFile(),
+                scan_seconds=self.scan_seconds,
+                threads=self.threadsSpinBox.value(),
+                tuner=self.getThreadTuner(),
+                index=self.getOutputIndex(),
+            )
             self.creation_thread.started.connect(self.creation_started)
             self.creation_thread.progress_update.connect(self._progress_update)
             self.creation_thread.finished.connect(self.creation_finished)
@@ -507,32 +1135,141 @@ class TorfGUI(Ui_MainWindow):
                 comment=self.commentEdit.text(),
                 randomize_infohash=self.randomizeInfoHashCheckBox.isChecked(),
                 include_md5=self.md5CheckBox.isChecked(),
+                torrent_version=self.torrentVersion(),
+                incremental=self.incrementalCheckBox.isChecked(),
+                jobs=self.batchJobsSpinBox.value(),
+                cache=self.getHashCache(),
+                profiles=self.output_profiles,
+                metrics=self.getMetricsFile(),
+                threads=self.threadsSpinBox.value(),
+                tuner=self.getThreadTuner(),
+                index=self.getOutputIndex(),
             )
             self.creation_thread.started.connect(self.creation_started)
             self.creation_thread.progress_update.connect(
                 self._progress_update_batch
             )
+            self.creation_thread.entry_progress.connect(
+                self._entry_progress_batch
+            )
             self.creation_thread.finished.connect(self.creation_finished)
             self.creation_thread.onError.connect(self._showError)
             self.creation_thread.start()
 
+    def verifyTorrent(self):
+        fn = QtWidgets.QFileDialog.getOpenFileName(
+            self.MainWindow,
+            "Open torrent",
+            self.last_output_dir,
+            filter=("Torrent file (*.torrent)"),
+        )[0]
+        if not fn:
+            return
+        try:
+            torrent = read_torrent(fn)
+        except Exception as e:
+            self._showError(str(e))
+            return
+        title = f"Select data of {torrent.name}"
+        if "files" in torrent.metainfo["info"]:
+            path = QtWidgets.QFileDialog.getExistingDirectory(
+                self.MainWindow, title, self.last_input_dir
+            )
+        else:
+            path = QtWidgets.QFileDialog.getOpenFileName(
+                self.MainWindow, title, self.last_input_dir
+            )[0]
+        if not path:
+            return
+        self.creation_thread = VerifyTorrentQThread(
+            torrent,
+            path,
+            self.actionVerifyStopOnError.isChecked(),
+            threads=self.threadsSpinBox.value(),
+            tuner=self.getThreadTuner(),
+        )
+        self.creation_thread.started.connect(self.creation_started)
+        self.creation_thread.progress_update.connect(self._progress_update)
+        self.creation_thread.finished.connect(self.verification_finished)
+        self.creation_thread.onError.connect(self._showError)
+        self.creation_thread.start()
+
+    def verification_finished(self):
+        result = self.creation_thread.result
+        self.creation_finished()
+        if result is None or result.cancelled:
+            return
+        self._statusBarMsg(str(result))
+        if result.ok:
+            return
+        details = [
+            f"{filepath}: {result.file_errors[filepath]}"
+            if filepath in result.file_errors
+            else filepath
+            for filepath in result.bad_files
+        ]
+        if result.bad_pieces:
+            pieces = ", ".join(map(str, result.bad_pieces))
+            details.append(f"Bad pieces: {pieces}")
+        box = QtWidgets.QMessageBox(
+            QtWidgets.QMessageBox.Warning,
+            "Verification failed",
+            str(result),
+            parent=self.MainWindow,
+        )
+        box.setDetailedText("\n".join(details))
+        box.exec_()
+
     def cancel_creation(self):
-        self.creation_thread.terminate()
+        # Hashing stops after the current piece and the thread finishes once
+        # torf's hasher threads are joined, so nothing is left running
+        self.creation_thread.cancel()
+        self.cancelButton.setEnabled(False)
+        self._statusBarMsg("Canceling...")
+
+    def shutdown(self):
+        self.cancelScan()
+        # Canceled scans may still be building their torrent
+        for thread in self.MainWindow.findChildren(ScanInputQThread):
+            thread.wait()
+        if self.creation_thread is not None:
+            self.creation_thread.cancel()
+            self.creation_thread.wait()
+        # Running jobs are queued again on the next start and resume from
+        # their checkpoints
+        for thread in self.job_threads.values():
+            thread.cancel()
+        for thread in self.job_threads.values():
+            thread.wait()
 
     def _progress_update(self, fn, pc, pt):
         fn = os.path.split(fn)[1]
-        msg = f"{fn} ({pc}/{pt})"
+        torrent = self.creation_thread.torrent
+        self.throughput.update(engine.bytes_hashed(torrent, pc), torrent.size)
+        msg = f"{fn}: {self.throughput}"
         self.updateProgress(msg, int(round(100 * pc / pt)))
 
     def _progress_update_batch(self, fn, tc, tt):
+        self.batch_progress = (tc, tt)
         msg = f"({tc}/{tt}) {fn}"
         self.updateProgress(msg, int(round(100 * tc / tt)))
 
+    def _entry_progress_batch(self, fn, pc, pt):
+        tc, tt = self.batch_progress
+        msg = f"({tc}/{tt}) {fn} {int(100 * pc / pt)}%"
+        self._statusBarMsg(msg)
+
     def updateProgress(self, statusMsg, pv):
         self._statusBarMsg(statusMsg)
         self.progressBar.setValue(pv)
 
     def creation_started(self):
+        self.batch_progress = (0, 0)
+        # Batch threads create many torrents
+        torrent = getattr(self.creation_thread, "torrent", None)
+        self.throughput = engine.Throughput(torrent.size if torrent else 0)
+        self.creation_started_at = time.monotonic()
+        self.actionVerify.setEnabled(False)
         self.inputGroupBox.setEnabled(False)
         self.seedingGroupBox.setEnabled(False)
         self.optionGroupBox.setEnabled(False)
@@ -542,19 +1279,258 @@ class TorfGUI(Ui_MainWindow):
         self.resetButton.setEnabled(False)
 
     def creation_finished(self):
+        self.actionVerify.setEnabled(True)
         self.inputGroupBox.setEnabled(True)
         self.seedingGroupBox.setEnabled(True)
         self.optionGroupBox.setEnabled(True)
         self.progressBar.hide()
         self.createButton.show()
         self.cancelButton.hide()
+        self.cancelButton.setEnabled(True)
         self.resetButton.setEnabled(True)
         if self.creation_thread.success:
-            self._statusBarMsg("Finished")
+            elapsed = time.monotonic() - self.creation_started_at
+            msg = f"Finished in {format_duration(elapsed)}"
+            if self.throughput.done:
+                msg += f", {format_size(self.throughput.rate)}/s"
+            batch = getattr(self.creation_thread, "batch", None)
+            if batch is not None and batch.summary():
+                msg += f" ({batch.summary()})"
+            self._statusBarMsg(msg)
+            # Remember the hashing speed for the piece size plan, unless the
+            # hashes came from the cache
+            if self.throughput.elapsed >= 1 and self.throughput.done:
+                self.hash_rate = self.throughput.rate
         else:
             self._statusBarMsg("Canceled")
         self.creation_thread = None
 
+    def setupQueue(self):
+        self.job_queue = JobQueue()
+        self.job_threads = {}
+        self.queueModel = QStandardItemModel(0, 5, self.MainWindow)
+        self.queueModel.setHorizontalHeaderLabels(
+            ["Input", "Priority", "Status", "Progress", "Output"]
+        )
+        self.queueView.setModel(self.queueModel)
+        self.queueConcurrencySpinBox.setMaximum(THREAD_BUDGET)
+        self.queueConcurrencySpinBox.valueChanged.connect(
+            self.queueConcurrencyChanged
+        )
+        self.queuePauseButton.toggled.connect(self.queuePauseToggled)
+        self.queueRaiseButton.clicked.connect(lambda: self.changePriority(1))
+        self.queueLowerButton.clicked.connect(lambda: self.changePriority(-1))
+        self.queuePauseJobButton.clicked.connect(self.pauseJobs)
+        self.queueRemoveButton.clicked.connect(self.removeJobs)
+        self.queueClearButton.clicked.connect(self.clearFinishedJobs)
+
+    def loadQueue(self):
+        self.job_queue = JobQueue(
+            os.path.join(self.getSettingsDir(), QUEUE_FILENAME)
+        )
+        self.queueConcurrencySpinBox.setValue(self.job_queue.max_concurrent)
+        self.queuePauseButton.setChecked(self.job_queue.paused)
+        self.updateQueueView()
+        self.startJobs()
+
+    def getJobSettings(self):
+        """Return a snapshot of the current settings for a queued job"""
+        batch = (
+            self.inputMode == "directory"
+            and self.batchModeCheckBox.isChecked()
+        )
+        return {
+            **self.getProfile(),
+            "comment": self.commentEdit.text(),
+            "piece_size": PIECE_SIZES[self.pieceSizeComboBox.currentIndex()],
+            "batch": batch,
+            "batch_jobs": self.batchJobsSpinBox.value(),
+            "incremental": self.incrementalCheckBox.isChecked(),
+            "profiles": self.output_profiles,
+            "hash_cache": self.hashCacheCheckBox.isChecked(),
+        }
+
+    def queueButtonClicked(self):
+        if self.validateInput():
+            self.addJobs([self.inputEdit.text()], self.getJobSettings())
+
+    def queuePaths(self, paths):
+        missing = [path for path in paths if not os.path.exists(path)]
+        if missing:
+            self._showError("Not found: " + ", ".join(missing))
+            return
+        if self.getExclusions() is None:
+            self._showError(self.statusbar.currentMessage())
+            return
+        import torf
+
+        settings = self.getJobSettings()
+        try:
+            torf.Torrent(
+                trackers=settings["trackers"], webseeds=settings["web_seeds"]
+            )
+        except Exception as e:
+            self._showError(str(e))
+            return
+        # The piece size of one input doesn't fit the others
+        settings["piece_size"] = None
+        self.addJobs(paths, settings)
+
+    def addJobs(self, paths, settings):
+        save_dir = QtWidgets.QFileDialog.getExistingDirectory(
+            self.MainWindow, "Select output directory", self.last_output_dir
+        )
+        if not save_dir:
+            return
+        self.last_output_dir = save_dir
+        for path in paths:
+            job_settings = dict(settings)
+            job_settings["batch"] = settings["batch"] and os.path.isdir(path)
+            self.job_queue.add(path, save_dir, job_settings)
+        self._statusBarMsg(f"{len(paths)} jobs queued")
+        self.updateQueueView()
+        self.startJobs()
+
+    def startJobs(self):
+        running = len(self.job_threads)
+        for job in self.job_queue.next_jobs(running):
+            self.startJob(job)
+        self.updateQueueView()
+
+    def startJob(self, job):
+        cache = self.getHashCache(job.settings["hash_cache"])
+        # Running jobs share the hasher threads like batch entries do
+        runner = JobRunner(
+            job,
+            cache,
+            self.getMetricsFile(),
+            self.getThreadTuner(job.settings["threads"]),
+            self.job_queue.max_concurrent,
+            self.getOutputIndex(),
+        )
+        thread = JobQThread(runner)
+        thread.progress_update.connect(self._job_progress)
+        thread.finished.connect(lambda: self.jobFinished(job.id, thread))
+        self.job_threads[job.id] = thread
+        self.job_queue.set_status(job, jobqueue.RUNNING)
+        thread.start()
+
+    def _job_progress(self, job_id, done, total):
+        for row in range(self.queueModel.rowCount()):
+            item = self.queueModel.item(row, 0)
+            if item.data(QtCore.Qt.UserRole) == job_id:
+                progress = f"{100 * done // total}%" if total else ""
+                self.queueModel.item(row, 3).setText(progress)
+                return
+
+    def jobFinished(self, job_id, thread):
+        del self.job_threads[job_id]
+        job = self.job_queue.get(job_id)
+        # Removed jobs are gone already and paused ones stay paused
+        if job is not None and job.status == jobqueue.RUNNING:
+            if thread.error is not None:
+                self.job_queue.set_status(job, jobqueue.FAILED, thread.error)
+            elif thread.success:
+                self.job_queue.set_status(job, jobqueue.FINISHED)
+            else:
+                self.job_queue.set_status(job, jobqueue.QUEUED)
+        self.startJobs()
+
+    def selectedJobs(self):
+        rows = self.queueView.selectionModel().selectedRows()
+        job_ids = [
+            self.queueModel.item(index.row(), 0).data(QtCore.Qt.UserRole)
+            for index in rows
+        ]
+        jobs = [self.job_queue.get(job_id) for job_id in job_ids]
+        return [job for job in jobs if job is not None]
+
+    def updateQueueView(self):
+        selected = {job.id for job in self.selectedJobs()}
+        order = [jobqueue.RUNNING, jobqueue.QUEUED, jobqueue.PAUSED]
+        pending = {job.id: i for i, job in enumerate(self.job_queue.pending())}
+        jobs = sorted(
+            self.job_queue.jobs,
+            key=lambda job: (
+                order.index(job.status) if job.status in order else 3,
+                pending.get(job.id, 0),
+                job.id,
+            ),
+        )
+        self.queueModel.removeRows(0, self.queueModel.rowCount())
+        for job in jobs:
+            items = [
+                QStandardItem(job.name),
+                QStandardItem(str(job.priority)),
+                QStandardItem(job.status.capitalize()),
+                QStandardItem(
+                    "100%" if job.status == jobqueue.FINISHED else ""
+                ),
+                QStandardItem(job.output),
+            ]
+            items[0].setData(job.id, QtCore.Qt.UserRole)
+            items[0].setToolTip(job.path)
+            items[2].setToolTip(job.message)
+            self.queueModel.appendRow(items)
+            if job.id in selected:
+                self.queueView.selectRow(self.queueModel.rowCount() - 1)
+        self.queueView.resizeColumnsToContents()
+
+    def changePriority(self, delta):
+        for job in self.selectedJobs():
+            job.priority += delta
+        self.job_queue.save()
+        self.updateQueueView()
+
+    def pauseJobs(self):
+        for job in self.selectedJobs():
+            if job.status == jobqueue.RUNNING:
+                self.job_queue.set_status(job, jobqueue.PAUSED)
+                self.job_threads[job.id].cancel()
+            elif job.status == jobqueue.QUEUED:
+                self.job_queue.set_status(job, jobqueue.PAUSED)
+            elif job.status in (jobqueue.PAUSED, jobqueue.FAILED):
+                self.job_queue.set_status(job, jobqueue.QUEUED)
+        self.startJobs()
+
+    def removeJobs(self):
+        for job in self.selectedJobs():
+            if job.id in self.job_threads:
+                self.job_threads[job.id].cancel()
+            self.job_queue.remove(job.id)
+        self.updateQueueView()
+
+    def clearFinishedJobs(self):
+        self.job_queue.clear_finished()
+        self.updateQueueView()
+
+    def queueConcurrencyChanged(self, value):
+        self.job_queue.max_concurrent = value
+        self.job_queue.save()
+        self.startJobs()
+
+    def queuePauseToggled(self, checked):
+        # Running jobs finish, but no new ones are started
+        self.queuePauseButton.setText(
+            "Resume queue" if checked else "Pause queue"
+        )
+        self.job_queue.paused = checked
+        self.job_queue.save()
+        self.startJobs()
+
+    def getProfile(self):
+        return {
+            "exclude": self.excludeEdit.toPlainText().strip().splitlines(),
+            "trackers": self.trackerEdit.toPlainText().strip().split(),
+            "web_seeds": self.webSeedEdit.toPlainText().strip().split(),
+            "private": self.privateTorrentCheckBox.isChecked(),
+            "compute_md5": self.md5CheckBox.isChecked(),
+            "randomize_infohash": self.randomizeInfoHashCheckBox.isChecked(),
+            "source": self.sourceEdit.text(),
+            "threads": self.threadsSpinBox.value(),
+            "torrent_version": self.torrentVersion(),
+        }
+
     def export_profile(self):
         fn = QtWidgets.QFileDialog.getSaveFileName(
             self.MainWindow,
@@ -563,24 +1539,7 @@ class TorfGUI(Ui_MainWindow):
             filter=("JSON configuration file (*.json)"),
         )[0]
         if fn:
-            exclude = self.excludeEdit.toPlainText().strip().splitlines()
-            trackers = self.trackerEdit.toPlainText().strip().split()
-            web_seeds = self.webSeedEdit.toPlainText().strip().split()
-            private = self.privateTorrentCheckBox.isChecked()
-            randomize_infohash = self.randomizeInfoHashCheckBox.isChecked()
-            compute_md5 = self.md5CheckBox.isChecked()
-            source = self.sourceEdit.text()
-            data = {
-                "exclude": exclude,
-                "trackers": trackers,
-                "web_seeds": web_seeds,
-                "private": private,
-                "compute_md5": compute_md5,
-                "randomize_infohash": randomize_infohash,
-                "source": source,
-            }
-            with open(fn, "w") as f:
-                json.dump(data, f, indent=4, sort_keys=True)
+            engine.write_profile(fn, self.getProfile())
             self._statusBarMsg("Profile saved to " + fn)
 
     def import_profile(self):
@@ -591,33 +1550,43 @@ class TorfGUI(Ui_MainWindow):
             filter=("JSON configuration file (*.json)"),
         )[0]
         if fn:
-            with open(fn) as f:
-                data = json.load(f)
-            exclude = data.get("exclude", [])
-            trackers = data.get("trackers", [])
-            web_seeds = data.get("web_seeds", [])
-            private = data.get("private", False)
-            randomize_infohash = data.get("randomize_infohash", False)
-            compute_md5 = data.get("compute_md5", False)
-            source = data.get("source", "")
+            try:
+                data = engine.read_profile(fn)
+            except Exception as e:
+                self._showError(f"{fn}: {e}")
+                return
+            exclude = data["exclude"]
+            trackers = data["trackers"]
+            web_seeds = data["web_seeds"]
+            private = data["private"]
+            randomize_infohash = data["randomize_infohash"]
+            compute_md5 = data["compute_md5"]
+            source = data["source"]
+            threads = data["threads"]
+            torrent_version = data["torrent_version"]
             try:
                 self.excludeEdit.setPlainText(os.linesep.join(exclude))
                 self.trackerEdit.setPlainText(os.linesep.join(trackers))
                 self.webSeedEdit.setPlainText(os.linesep.join(web_seeds))
                 self.privateTorrentCheckBox.setChecked(private)
                 self.randomizeInfoHashCheckBox.setChecked(randomize_infohash)
+                self.setTorrentVersion(torrent_version)
                 self.md5CheckBox.setChecked(compute_md5)
                 self.sourceEdit.setText(source)
+                self.threadsSpinBox.setValue(threads)
             except Exception as e:
                 self._showError(str(e))
                 return
             self._statusBarMsg(f"Profile {os.path.split(fn)[1]} loaded")
 
     def reset(self):
+        self.cancelScan()
         self._statusBarMsg("")
         self.createButton.setEnabled(False)
+        self.queueButton.setEnabled(False)
         self.fileRadioButton.setChecked(True)
         self.batchModeCheckBox.setChecked(False)
+        self.batchJobsSpinBox.setValue(1)
         self.inputEdit.setText(None)
         self.excludeEdit.setPlainText(None)
         self.trackerEdit.setPlainText(None)
@@ -628,40 +1597,60 @@ class TorfGUI(Ui_MainWindow):
         self.privateTorrentCheckBox.setChecked(False)
         self.randomizeInfoHashCheckBox.setChecked(False)
         self.md5CheckBox.setChecked(False)
+        self.versionComboBox.setCurrentIndex(0)
+        self.hashCacheCheckBox.setChecked(False)
         self.sourceEdit.setText(None)
+        self.clearOutputProfiles()
         self.torrent = None
+        self.scanned_files = None
+        self.planner = None
+        self.updatePiecePlan()
         self._statusBarMsg("Ready")
 
-    def get_info(self, torrent):
-        t_info = []
-        t_info.append(torrent.size)
-        t_info.append(len(torrent.files))
-        t_info.append(torrent.pieces)
-        t_info.append(torrent.piece_size)
-        return t_info
+
+def enable_hi_dpi():
+    # Same as qdarktheme.enable_hi_dpi() without importing qdarktheme before
+    # the window is shown
+    QApplication.setAttribute(QtCore.Qt.AA_UseHighDpiPixmaps)
+    QApplication.setAttribute(QtCore.Qt.AA_EnableHighDpiScaling)
+    os.environ["QT_ENABLE_HIGHDPI_SCALING"] = "1"
+    QApplication.setHighDpiScaleFactorRoundingPolicy(
+        QtCore.Qt.HighDpiScaleFactorRoundingPolicy.PassThrough
+    )
+
+
+def setup_theme():
+    import qdarktheme
+    from qdarktheme import _style_loader
+
+    qdarktheme.setup_theme("auto")
+
+    # Hack for https://github.com/5yutan5/PyQtDarkTheme/issues/229
+    qpalette = qdarktheme.load_palette("auto")
+    theme = _style_loader._detect_system_theme("light")
+
+    if sys.platform == "win32" and theme == "dark":
+        qpalette.setColor(QPalette.WindowText, QColorConstants.White)
+        QApplication.instance().setPalette(qpalette)
 
 
 def main():
     try:
-        qdarktheme.enable_hi_dpi()
+        argv = list(sys.argv)
+        profile = StartupProfile("--startup-profile" in argv)
+        if profile.enabled:
+            argv.remove("--startup-profile")
+
+        enable_hi_dpi()
 
         if sys.platform == "win32":
-            app = QApplication(sys.argv + ["-platform", "windows:darkmode=2"])
+            app = QApplication(argv + ["-platform", "windows:darkmode=2"])
         else:
-            app = QApplication(sys.argv)
+            app = QApplication(argv)
         app.setAttribute(
             QtCore.Qt.ApplicationAttribute.AA_DisableWindowContextHelpButton
         )
-
-        qdarktheme.setup_theme("auto")
-
-        # Hack for https://github.com/5yutan5/PyQtDarkTheme/issues/229
-        qpalette = qdarktheme.load_palette("auto")
-        theme = _style_loader._detect_system_theme("light")
-
-        if sys.platform == "win32" and theme == "dark":
-            qpalette.setColor(QPalette.WindowText, QColorConstants.White)
-            QApplication.instance().setPalette(qpalette)
+        profile.mark("QApplication")
 
         MainWindow = QtWidgets.QMainWindow()
         ui = TorfGUI()
@@ -669,9 +1658,31 @@ def main():
 
         MainWindow.setWindowTitle(PROGRAM_NAME_VERSION)
 
-        ui.loadSettings()
+        ui.loadGeometry()
         ui.clipboard = app.clipboard
         app.aboutToQuit.connect(lambda: ui.saveSettings())
+        app.aboutToQuit.connect(ui.shutdown)
+        profile.mark("main window setup")
+
+        # Theme, settings and torf are loaded once the window is painted
+        preload = PreloadQThread(["torf"])
+
+        def preloaded():
+            profile.report(
+                background=[("import torf (background)", preload.elapsed)]
+            )
+
+        def deferred_startup():
+            profile.mark("first paint")
+            preload.start()
+            setup_theme()
+            profile.mark("theme")
+            ui.loadSettings()
+            profile.mark("settings")
+
+        preload.finished.connect(preloaded)
+        first_paint = FirstPaintFilter(deferred_startup)
+        MainWindow.installEventFilter(first_paint)
         MainWindow.show()
         sys.exit(app.exec_())
     except Exception as e:
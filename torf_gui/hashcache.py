@@ -0,0 +1,110 @@
+import hashlib
+import json
+import os
+import sqlite3
+import time
+from contextlib import closing
+
+from torf_gui.hasher import metainfo_files
+
+CACHE_FILENAME = "piece-hashes.sqlite"
+
+# Upper limit for all cached piece hashes, 20 bytes per piece
+DEFAULT_MAX_SIZE = 256 * 2**20
+
+
+class HashCache:
+    """
+    On-disk cache of piece hashes keyed by file identity and piece size
+
+    The least recently used entries are evicted once the cache grows beyond
+    `max_size` bytes.
+    """
+
+    def __init__(self, path, max_size=DEFAULT_MAX_SIZE):
+        self.path = path
+        self.max_size = max_size
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with closing(self._connect()) as db, db:
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS pieces ("
+                "key TEXT PRIMARY KEY, "
+                "pieces BLOB NOT NULL, "
+                "size INTEGER NOT NULL, "
+                "last_used REAL NOT NULL)"
+            )
+            db.execute(
+                "CREATE INDEX IF NOT EXISTS pieces_last_used "
+                "ON pieces (last_used)"
+            )
+
+    def _connect(self):
+        # Batch entries are hashed in pool threads, so every call gets its
+        # own short-lived connection
+        return sqlite3.connect(self.path, timeout=30)
+
+    @staticmethod
+    def key(torrent):
+        """Return the cache key for `torrent` or `None` if it has no files"""
+        identity = [torrent.piece_size]
+        path = str(torrent.path)
+        for parts, _ in metainfo_files(torrent):
+            try:
+                st = os.stat(os.path.join(path, *parts[1:]))
+            except OSError:
+                return None
+            identity.append(
+                [os.path.join(*parts), st.st_size, st.st_mtime_ns, st.st_ino]
+            )
+        if len(identity) < 2:
+            return None
+        data = json.dumps(identity, separators=(",", ":")).encode()
+        return hashlib.sha256(data).hexdigest()
+
+    def load(self, torrent):
+        """
+        Set the piece hashes of `torrent` from the cache
+
+        :return: ``True`` if the cache had matching piece hashes
+        """
+        key = self.key(torrent)
+        if key is None:
+            return False
+        with closing(self._connect()) as db, db:
+            row = db.execute(
+                "SELECT pieces FROM pieces WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None or len(row[0]) != torrent.pieces * 20:
+                return False
+            db.execute(
+                "UPDATE pieces SET last_used = ? WHERE key = ?",
+                (time.time(), key),
+            )
+        torrent.metainfo["info"]["pieces"] = bytes(row[0])
+        return True
+
+    def store(self, torrent):
+        """Add the piece hashes of a generated `torrent` to the cache"""
+        pieces = torrent.metainfo["info"].get("pieces")
+        key = self.key(torrent)
+        if not pieces or key is None or len(pieces) > self.max_size:
+            return
+        with closing(self._connect()) as db, db:
+            db.execute(
+                "INSERT OR REPLACE INTO pieces VALUES (?, ?, ?, ?)",
+                (key, pieces, len(pieces), time.time()),
+            )
+            self._evict(db)
+
+    def _evict(self, db):
+        total = db.execute("SELECT TOTAL(size) FROM pieces").fetchone()[0]
+        if total <= self.max_size:
+            return
+        rows = db.execute(
+            "SELECT key, size FROM pieces ORDER BY last_used"
+        ).fetchall()
+        for key, size in rows:
+            if total <= self.max_size:
+                break
+            db.execute("DELETE FROM pieces WHERE key = ?", (key,))
+            total -= size
@@ -0,0 +1,572 @@
+import bisect
+import errno
+import io
+import os
+import queue
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import closing, contextmanager
+from hashlib import md5, sha1
+
+from torf_gui.filetable import FileTable
+
+# "stock" reads every piece into a new bytes object, "readinto" fills
+# reusable buffers
+READERS = ("stock", "readinto")
+
+# Bytes of prefetched files held in memory at most
+PREFETCH_BUDGET = 64 * 2**20
+
+# Larger files are read piece by piece as usual; the round trips of opening
+# them are small compared to reading them
+PREFETCH_MAX_SIZE = 4 * 2**20
+
+# Pieces in flight per hasher thread, enough to keep all hashers busy while
+# reading
+PIECES_PER_THREAD = 3
+
+
+class _PieceStream:
+    # Splits a stream of files into pieces, dropping the data of pieces
+    # that contain unreadable bytes
+
+    def __init__(self, piece_size, index):
+        self.piece_size = piece_size
+        self.index = index
+        self.chunks = []
+        self.length = 0
+        self.broken = False
+
+    def add(self, chunk, length):
+        # `chunk` is None for `length` unreadable bytes
+        if chunk is None:
+            self.broken = True
+        elif not self.broken:
+            self.chunks.append(chunk)
+        self.length += length
+        return self.length == self.piece_size
+
+    def pop(self):
+        # Pieces within one file are read in one chunk, which isn't copied
+        if self.broken:
+            data = None
+        elif len(self.chunks) == 1:
+            data = self.chunks[0]
+        else:
+            data = b"".join(self.chunks)
+        self.chunks = []
+        self.length = 0
+        self.broken = False
+        self.index += 1
+        return self.index - 1, data
+
+
+def _chunk_sizes(first, remaining, piece_size):
+    # Split `remaining` bytes at piece boundaries, `first` bytes before the
+    # first one
+    size = min(first, remaining)
+    while size:
+        yield size
+        remaining -= size
+        size = min(piece_size, remaining)
+
+
+def _read_whole(filepath, size):
+    with open(filepath, "rb") as f:
+        return f.read(size)
+
+
+class Prefetcher:
+    """
+    Read the files of `files` ahead of the piece reader
+
+    Up to `count` files after the one that is being read are opened and
+    read completely on `count` threads, which hides the latency of opening
+    and reading many small files one after another, e.g. on network shares.
+    Prefetched files that wait to be read take up at most `budget` bytes
+    and files larger than `max_size` aren't prefetched.
+    """
+
+    def __init__(
+        self,
+        files,
+        count,
+        budget=PREFETCH_BUDGET,
+        max_size=PREFETCH_MAX_SIZE,
+    ):
+        self.files = files
+        self.count = count
+        self.budget = budget
+        self.max_size = min(max_size, budget)
+        # File index -> (future, size)
+        self._pending = {}
+        self._size = 0
+        self._next = 0
+        self._pool = ThreadPoolExecutor(max_workers=count)
+
+    def _fill(self):
+        while self._next < len(self.files) and len(self._pending) < self.count:
+            filepath, size = self.files[self._next]
+            if filepath is not None and size <= self.max_size:
+                if self._size + size > self.budget:
+                    break
+                future = self._pool.submit(_read_whole, filepath, size)
+                self._pending[self._next] = (future, size)
+                self._size += size
+            self._next += 1
+
+    def _release(self, index):
+        future, size = self._pending.pop(index)
+        self._size -= size
+        return future
+
+    def get(self, index):
+        """
+        Return a future of the content of the file `index` or ``None`` if
+        it isn't prefetched
+
+        Files are expected to be requested in order; prefetched files
+        before `index` are dropped.
+        """
+        for skipped in [i for i in self._pending if i < index]:
+            self._release(skipped).cancel()
+        self._next = max(self._next, index)
+        self._fill()
+        future = self._release(index) if index in self._pending else None
+        self._fill()
+        return future
+
+    def close(self):
+        # Reads that are running can't be interrupted, so they aren't
+        # waited for
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+
+class _Padding(io.RawIOBase):
+    # Endless zero bytes that BEP 47 pad files consist of
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        return offset
+
+    def readinto(self, view):
+        view[:] = bytes(len(view))
+        return len(view)
+
+
+def _open(filepath, prefetched, buffering=-1):
+    # Return the file or the future `prefetched` of its content as file
+    # Pad files have no path and aren't stored
+    if filepath is None:
+        return _Padding()
+    if prefetched is not None:
+        return io.BytesIO(prefetched.result())
+    return open(filepath, "rb", buffering=buffering)
+
+
+def _read_file(filepath, offset, sizes, on_error, prefetched=None):
+    # Yield (chunk, size) for each of `sizes` bytes of the file, with None
+    # as chunk for bytes that couldn't be read
+    size = None
+    try:
+        with _open(filepath, prefetched) as f:
+            f.seek(offset)
+            for size in sizes:
+                chunk = f.read(size)
+                if len(chunk) < size:
+                    raise OSError(
+                        errno.EIO, "File is smaller than expected", filepath
+                    )
+                yield chunk, size
+                size = None
+    except OSError as exc:
+        if on_error is None:
+            raise
+        on_error(filepath, exc)
+        if size is not None:
+            yield None, size
+        for size in sizes:
+            yield None, size
+
+
+def metainfo_files(torrent):
+    """
+    Yield (parts, size) for each file of `torrent`, in piece order
+
+    `parts` are the path components of the file, starting with the torrent
+    name. Unlike :attr:`torf.Torrent.files`, this doesn't create an object
+    for every file.
+    """
+    info = torrent.metainfo["info"]
+    if "files" in info:
+        for file in info["files"]:
+            yield [info["name"], *file["path"]], file["length"]
+    elif "length" in info:
+        yield [info["name"]], info["length"]
+
+
+def torrent_files(torrent):
+    """
+    Return a :class:`~torf_gui.filetable.FileTable` of the files of
+    `torrent` beneath its path, in piece order
+    """
+    path = str(torrent.path)
+    return FileTable(
+        (os.path.join(path, *parts[1:]), size)
+        for parts, size in metainfo_files(torrent)
+    )
+
+
+def read_pieces(torrent, start=0, files=None, on_error=None, prefetch=0):
+    """
+    Yield (index, filepath, data) for each piece of `torrent` from the piece
+    with index `start` on
+
+    Pieces span file boundaries the same way torf reads them: all files are
+    treated as one stream in the order of :attr:`torf.Torrent.files`.
+    `files` is a list of (filepath, size) to read instead, e.g. to verify a
+    torrent against other data. Files without a `filepath` are read as
+    zero bytes, like the BEP 47 pad files of hybrid torrents; `filepath` is
+    the last file with a path then.
+
+    Missing, unreadable and short files raise :class:`OSError`, unless
+    `on_error` is given. It is called with the file path and the exception
+    instead, and `data` is ``None`` for all pieces that include bytes of
+    that file that couldn't be read.
+
+    If `prefetch` is given, a :class:`Prefetcher` reads up to `prefetch`
+    files ahead.
+    """
+    if files is None:
+        files = torrent_files(torrent)
+    piece_size = torrent.piece_size
+    stream = _PieceStream(piece_size, start)
+    filepath = None
+    with _prefetching(files, prefetch) as prefetched:
+        for i, path, skip, sizes in _file_reads(
+            files, start, stream, piece_size
+        ):
+            if path is not None:
+                filepath = path
+            for chunk, length in _read_file(
+                path, skip, sizes, on_error, prefetched(i)
+            ):
+                if stream.add(chunk, length):
+                    index, data = stream.pop()
+                    yield index, filepath, data
+    if stream.length:
+        index, data = stream.pop()
+        yield index, filepath, data
+
+
+def _file_reads(files, start, stream, piece_size):
+    # Yield (file index, filepath, offset, chunk sizes) for each file that
+    # is read from the piece with index `start` on
+    skip = start * piece_size
+    for i, (filepath, size) in enumerate(files):
+        if skip >= size:
+            skip -= size
+            continue
+        sizes = _chunk_sizes(
+            piece_size - stream.length, size - skip, piece_size
+        )
+        yield i, filepath, skip, sizes
+        skip = 0
+
+
+@contextmanager
+def _prefetching(files, prefetch):
+    # Provide a function that returns Prefetcher.get() of a file index or
+    # None without prefetching
+    if not prefetch:
+        yield lambda index: None
+        return
+    prefetcher = Prefetcher(files, prefetch)
+    try:
+        yield prefetcher.get
+    finally:
+        prefetcher.close()
+
+
+class _PieceBuffer:
+    # Fills pieces into reusable buffers from `pool`, dropping the data of
+    # pieces that contain unreadable bytes
+
+    def __init__(self, piece_size, index, pool):
+        self.piece_size = piece_size
+        self.index = index
+        self.pool = pool
+        self.buffer = None
+        self.length = 0
+        self.broken = False
+
+    def view(self, length):
+        # Return the next `length` bytes of the buffer to read into
+        if self.buffer is None:
+            self.buffer = memoryview(self.pool.get())
+        return self.buffer[self.length : self.length + length]
+
+    def add(self, length, ok):
+        if not ok:
+            self.broken = True
+        self.length += length
+        return self.length == self.piece_size
+
+    def pop(self):
+        if self.broken or self.buffer is None:
+            if self.buffer is not None:
+                self.pool.put(self.buffer.obj)
+            data = None
+        else:
+            data = self.buffer[: self.length]
+        self.buffer = None
+        self.length = 0
+        self.broken = False
+        self.index += 1
+        return self.index - 1, data
+
+
+def _readinto(f, view):
+    # Fill `view` from `f`, return whether it was filled completely
+    while view:
+        size = f.readinto(view)
+        if not size:
+            return False
+        view = view[size:]
+    return True
+
+
+def _readinto_file(filepath, offset, sizes, stream, on_error, prefetched):
+    # Like _read_file(), but read the chunks into `stream` and yield their
+    # size and whether they were read
+    size = None
+    try:
+        with _open(filepath, prefetched, buffering=0) as f:
+            f.seek(offset)
+            for size in sizes:
+                if not _readinto(f, stream.view(size)):
+                    raise OSError(
+                        errno.EIO, "File is smaller than expected", filepath
+                    )
+                yield size, True
+                size = None
+    except OSError as exc:
+        if on_error is None:
+            raise
+        on_error(filepath, exc)
+        if size is not None:
+            yield size, False
+        for size in sizes:
+            yield size, False
+
+
+def readinto_pieces(
+    torrent, pool, start=0, files=None, on_error=None, prefetch=0
+):
+    """
+    Like :func:`read_pieces`, but read each piece into a ``bytearray`` of
+    the piece size from the :class:`queue.SimpleQueue` `pool`
+
+    `data` is a :class:`memoryview` of the buffer. Pieces that span files
+    are read into one buffer without copying. The caller puts the buffer
+    (``data.obj``) back into `pool` once it is done with `data`.
+    """
+    if files is None:
+        files = torrent_files(torrent)
+    piece_size = torrent.piece_size
+    stream = _PieceBuffer(piece_size, start, pool)
+    filepath = None
+    with _prefetching(files, prefetch) as prefetched:
+        for i, path, skip, sizes in _file_reads(
+            files, start, stream, piece_size
+        ):
+            if path is not None:
+                filepath = path
+            for length, ok in _readinto_file(
+                path, skip, sizes, stream, on_error, prefetched(i)
+            ):
+                if stream.add(length, ok):
+                    index, data = stream.pop()
+                    yield index, filepath, data
+    if stream.length:
+        index, data = stream.pop()
+        yield index, filepath, data
+
+
+def _sha1(data):
+    return sha1(data).digest()
+
+
+class FileMD5:
+    """
+    MD5 digests of `files`, computed from the pieces of their piece stream
+
+    `files` is a list of (filepath, size) like :func:`torrent_files`
+    returns. :meth:`add` splits each piece at file boundaries and updates
+    the digests of its files on `threads` worker threads, so the digests of
+    different files are computed in parallel while the updates of each
+    file stay in order.
+    """
+
+    def __init__(self, files, piece_size, threads=None):
+        self.files = files
+        self.piece_size = piece_size
+        self._hashes = [md5() for _ in files]
+        self._offsets = []
+        offset = 0
+        for _, size in files:
+            self._offsets.append(offset)
+            offset += size
+        # Last update of each file, which the next update waits for
+        self._last = {}
+        self._pool = ThreadPoolExecutor(
+            max_workers=threads or os.cpu_count() or 1
+        )
+
+    def _update(self, previous, i, data):
+        # Workers take updates in the order they were submitted, so
+        # `previous` is already running or done
+        if previous is not None:
+            previous.result()
+        self._hashes[i].update(data)
+
+    def add(self, index, data):
+        """
+        Add the piece `index` to the digests of its files
+
+        `data` must not change until all returned futures are done.
+        """
+        start = index * self.piece_size
+        end = start + len(data)
+        view = memoryview(data)
+        futures = []
+        i = bisect.bisect_right(self._offsets, start) - 1
+        while i < len(self.files) and self._offsets[i] < end:
+            offset = self._offsets[i]
+            chunk = view[
+                max(0, offset - start) : offset + self.files[i][1] - start
+            ]
+            if chunk:
+                future = self._pool.submit(
+                    self._update, self._last.get(i), i, chunk
+                )
+                self._last[i] = future
+                futures.append(future)
+            i += 1
+        return futures
+
+    def hexdigests(self):
+        """Return the MD5 digest of each file once all pieces were added"""
+        for future in self._last.values():
+            future.result()
+        return [h.hexdigest() for h in self._hashes]
+
+    def close(self):
+        self._pool.shutdown(wait=True, cancel_futures=True)
+
+
+def _pieces(torrent, start, files, on_error, reader, buffers, prefetch):
+    # Return the piece iterator of `reader` and the buffer pool, if any
+    if reader == "readinto":
+        pool = queue.SimpleQueue()
+        for _ in range(buffers):
+            pool.put(bytearray(torrent.piece_size))
+        pieces = readinto_pieces(
+            torrent, pool, start, files, on_error, prefetch
+        )
+        return pieces, pool
+    if reader not in (None, "stock"):
+        raise ValueError(f"Unknown reader: {reader}")
+    return read_pieces(torrent, start, files, on_error, prefetch), None
+
+
+def iter_ordered(submit, threads=None):
+    """
+    Yield the jobs that ``submit(pool)`` yields, in order, while a
+    :class:`~concurrent.futures.ThreadPoolExecutor` `pool` with `threads`
+    threads works on them
+
+    Jobs are tuples that end with their :class:`~concurrent.futures.Future`.
+    Each job is yielded once :data:`PIECES_PER_THREAD` jobs per thread are
+    submitted after it, or once `submit` is exhausted. Closing the generator
+    cancels the jobs that haven't started and waits for the others.
+    """
+    threads = threads or os.cpu_count() or 1
+    window = threads * PIECES_PER_THREAD
+    pending = deque()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        try:
+            for job in submit(pool):
+                pending.append(job)
+                if len(pending) >= window:
+                    yield pending.popleft()
+            while pending:
+                yield pending.popleft()
+        finally:
+            for *_, future in pending:
+                future.cancel()
+
+
+def iter_piece_hashes(
+    torrent,
+    start=0,
+    threads=None,
+    files=None,
+    on_error=None,
+    reader=None,
+    md5=None,
+    prefetch=0,
+):
+    """
+    Yield (index, filepath, hash) for each piece of `torrent` from the piece
+    with index `start` on, in order
+
+    Pieces are read in the calling thread and hashed by `threads` pool
+    threads. Closing the generator waits only for the pieces that are
+    already being hashed. `files` and `on_error` are passed on to
+    :func:`read_pieces`; `hash` is ``None`` for unreadable pieces.
+    `reader` is one of :data:`READERS`. Pieces are also added to the
+    :class:`FileMD5` `md5` if it is given, from the same buffers.
+    `prefetch` is the number of files a :class:`Prefetcher` reads ahead.
+    """
+    threads = threads or os.cpu_count() or 1
+    # One more buffer than pieces in flight for the piece being read
+    pieces, buffers = _pieces(
+        torrent,
+        start,
+        files,
+        on_error,
+        reader,
+        threads * PIECES_PER_THREAD + 1,
+        prefetch,
+    )
+
+    def submit(pool):
+        for index, filepath, data in pieces:
+            md5_futures = ()
+            if data is None:
+                future = Future()
+                future.set_result(None)
+            else:
+                future = pool.submit(_sha1, data)
+                if md5 is not None:
+                    md5_futures = md5.add(index, data)
+            yield index, filepath, data, md5_futures, future
+
+    def result(data, md5_futures, future):
+        piece_hash = future.result()
+        # Buffers are only reused once the MD5 workers are done with them
+        for md5_future in md5_futures:
+            md5_future.result()
+        if buffers is not None and data is not None:
+            buffers.put(data.obj)
+        return piece_hash
+
+    with closing(iter_ordered(submit, threads)) as jobs:
+        for index, filepath, *job in jobs:
+            yield index, filepath, result(*job)
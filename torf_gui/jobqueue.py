@@ -0,0 +1,300 @@
+import contextlib
+import json
+import os
+import threading
+
+from torf_gui import engine
+from torf_gui.checkpoint import Checkpoint
+from torf_gui.metrics import JobMetrics
+
+QUEUE_FILENAME = "queue.json"
+
+QUEUED = "queued"
+RUNNING = "running"
+PAUSED = "paused"
+FINISHED = "finished"
+FAILED = "failed"
+
+# Settings of a job on top of engine.PROFILE_DEFAULTS
+JOB_DEFAULTS = {
+    "comment": "",
+    "piece_size": None,
+    "batch": False,
+    "batch_jobs": 1,
+    "incremental": False,
+    "profiles": [],
+    "hash_cache": False,
+}
+
+
+class Job:
+    """
+    Create the torrent of `path` in the directory `output` later
+
+    `settings` is a snapshot of everything needed to create the torrent, so
+    later changes in the main window don't affect queued jobs.
+    """
+
+    def __init__(
+        self,
+        id,
+        path,
+        output,
+        settings,
+        priority=0,
+        status=QUEUED,
+        message="",
+    ):
+        self.id = id
+        self.path = path
+        self.output = output
+        self.settings = {**engine.PROFILE_DEFAULTS, **JOB_DEFAULTS, **settings}
+        self.priority = priority
+        self.status = status
+        self.message = message
+
+    @property
+    def name(self):
+        return os.path.split(os.path.normpath(self.path))[1]
+
+    @property
+    def save_path(self):
+        """Torrent file, or output path without extension with profiles"""
+        save_base = os.path.join(self.output, engine.output_name(self.path))
+        return (
+            save_base if self.settings["profiles"] else save_base + ".torrent"
+        )
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "path": self.path,
+            "output": self.output,
+            "settings": self.settings,
+            "priority": self.priority,
+            "status": self.status,
+            "message": self.message,
+        }
+
+
+class JobQueue:
+    """
+    Jobs that are run in order of priority, then in the order they were
+    added
+
+    The queue is saved to the JSON file `path` whenever it changes. Jobs that
+    were running when the queue was saved last are queued again on load.
+    """
+
+    def __init__(self, path=None):
+        self.path = path
+        self.jobs = []
+        self.max_concurrent = 1
+        self.paused = False
+        if path is not None:
+            self._load()
+
+    def _load(self):
+        try:
+            with open(self.path) as f:
+                data = json.load(f)
+            jobs = [Job(**job) for job in data.get("jobs", [])]
+        except (OSError, ValueError, TypeError, AttributeError):
+            return
+        self.max_concurrent = data.get("max_concurrent", 1)
+        self.paused = data.get("paused", False)
+        for job in jobs:
+            # Interrupted jobs resume from their checkpoint
+            if job.status == RUNNING:
+                job.status = QUEUED
+        self.jobs = jobs
+
+    def save(self):
+        if self.path is None:
+            return
+        data = {
+            "max_concurrent": self.max_concurrent,
+            "paused": self.paused,
+            "jobs": [job.to_dict() for job in self.jobs],
+        }
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        tmp_path = self.path + ".part"
+        with open(tmp_path, "w") as f:
+            json.dump(data, f, indent=4)
+        os.replace(tmp_path, self.path)
+
+    def add(self, path, output, settings, priority=0):
+        job_id = max((job.id for job in self.jobs), default=0) + 1
+        job = Job(job_id, path, output, settings, priority)
+        self.jobs.append(job)
+        self.save()
+        return job
+
+    def get(self, job_id):
+        for job in self.jobs:
+            if job.id == job_id:
+                return job
+        return None
+
+    def remove(self, job_id):
+        self.jobs = [job for job in self.jobs if job.id != job_id]
+        self.save()
+
+    def clear_finished(self):
+        self.jobs = [job for job in self.jobs if job.status != FINISHED]
+        self.save()
+
+    def set_status(self, job, status, message=""):
+        job.status = status
+        job.message = message
+        self.save()
+
+    def pending(self):
+        """Return the queued jobs in the order they are run"""
+        return sorted(
+            (job for job in self.jobs if job.status == QUEUED),
+            key=lambda job: (-job.priority, job.id),
+        )
+
+    def next_jobs(self, running):
+        """Return the jobs to start while `running` jobs are running"""
+        if self.paused:
+            return []
+        return self.pending()[: max(0, self.max_concurrent - running)]
+
+
+class JobRunner:
+    """
+    Run `job` while `jobs` jobs share the hasher threads
+
+    The job's thread count is picked by the
+    :class:`~torf_gui.tuning.ThreadTuner` `tuner` if it is set to auto.
+    Single torrents resume from their checkpoint, so paused and interrupted
+    jobs continue where they stopped. Records are written to the
+    :class:`~torf_gui.metrics.MetricsFile` `metrics` if it is given and
+    written torrents are added to the
+    :class:`~torf_gui.outputindex.OutputIndex` `index`.
+    """
+
+    def __init__(
+        self, job, cache=None, metrics=None, tuner=None, jobs=1, index=None
+    ):
+        self.job = job
+        self.cache = cache
+        self.metrics = metrics
+        self.tuner = tuner
+        self.jobs = jobs
+        self.index = index
+        self._cancelled = threading.Event()
+        self._batch = None
+
+    def cancel(self):
+        self._cancelled.set()
+        if self._batch is not None:
+            self._batch.cancel()
+
+    def threads(self, files=None):
+        """Return the hasher threads of this job"""
+        budget = self.job.settings["threads"]
+        if not budget and self.tuner is not None:
+            budget = self.tuner.threads(self.job.path, files, self._cancelled)
+        return engine.split_thread_budget(
+            budget or engine.THREAD_BUDGET, self.jobs
+        )
+
+    def run(self, progress=None):
+        """
+        Create the torrent or torrents of the job
+
+        `progress` is called with the number of finished and total pieces,
+        or entries in batch mode.
+
+        :return: ``False`` if the job was canceled
+        """
+        if self.job.settings["batch"]:
+            return self._run_batch(progress)
+        if self.metrics is None:
+            return self._run_single(progress, None)
+        metrics = JobMetrics(self.job.name, "queue")
+        success = False
+        try:
+            success = self._run_single(progress, metrics)
+        finally:
+            # Paused jobs are recorded again when they are resumed
+            if success or not self._cancelled.is_set():
+                self.metrics.write(metrics.record(success))
+        return success
+
+    def _run_single(self, progress, metrics):
+        s = self.job.settings
+        with metrics.phase("scan") if metrics else contextlib.nullcontext():
+            files = engine.scan(self.job.path, cancelled=self._cancelled)
+        if files is None:
+            return False
+        torrent = engine.torrent_from_scan(
+            self.job.path,
+            files,
+            exclude=s["exclude"],
+            trackers=s["trackers"],
+            webseeds=s["web_seeds"],
+            private=s["private"],
+            source=s["source"] or None,
+            randomize_infohash=s["randomize_infohash"],
+            comment=s["comment"] or None,
+        )
+        torrent.include_md5 = s["compute_md5"]
+        torrent.torrent_version = s["torrent_version"]
+        engine.set_piece_size(torrent, s["piece_size"])
+
+        def callback(torrent, filepath, pieces_done, pieces_total):
+            if progress is not None:
+                progress(pieces_done, pieces_total)
+
+        save_path = self.job.save_path
+        return engine.create_torrent(
+            torrent,
+            save_path,
+            threads=self.threads(files),
+            callback=callback,
+            interval=engine.PROGRESS_INTERVAL,
+            cache=self.cache,
+            profiles=s["profiles"],
+            cancelled=self._cancelled,
+            checkpoint=Checkpoint.for_output(save_path),
+            files=files,
+            metrics=metrics,
+            index=self.index,
+        )
+
+    def _run_batch(self, progress):
+        s = self.job.settings
+        os.makedirs(self.job.output, exist_ok=True)
+        self._batch = engine.BatchCreator(
+            path=self.job.path,
+            exclude=s["exclude"],
+            save_dir=self.job.output,
+            trackers=s["trackers"],
+            web_seeds=s["web_seeds"],
+            private=s["private"],
+            source=s["source"],
+            randomize_infohash=s["randomize_infohash"],
+            comment=s["comment"],
+            include_md5=s["compute_md5"],
+            jobs=s["batch_jobs"],
+            threads=self.threads(),
+            cache=self.cache,
+            profiles=s["profiles"],
+            metrics=self.metrics,
+            torrent_version=s["torrent_version"],
+            incremental=s["incremental"],
+            index=self.index,
+        )
+        # cancel() may have been called before the batch existed
+        if self._cancelled.is_set():
+            return False
+
+        def batch_progress(name, done, total):
+            if progress is not None:
+                progress(done, total)
+
+        return self._batch.run(progress=batch_progress)
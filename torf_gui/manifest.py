@@ -0,0 +1,99 @@
+import hashlib
+import json
+import os
+import threading
+import time
+
+MANIFEST_FILENAME = ".torf-gui-batch.json"
+
+# Seconds between writes of the manifest while a batch is running
+SAVE_INTERVAL = 5
+
+
+def fingerprint(settings):
+    """Return a hash of the JSON serializable `settings`"""
+    data = json.dumps(settings, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(data.encode()).hexdigest()
+
+
+class BatchManifest:
+    """
+    Files, settings and info hashes of the torrents of a batch, kept in the
+    JSON file `path` in the output directory
+
+    Each entry is recorded with the path, size and modification time of
+    all of its files and the :func:`fingerprint` of the settings it was
+    created with, so later batches can skip entries that didn't change.
+    The file is written at most every `interval` seconds and by
+    :meth:`save`.
+    """
+
+    def __init__(self, path, interval=SAVE_INTERVAL):
+        self.path = path
+        self.interval = interval
+        self.entries = {}
+        self._lock = threading.Lock()
+        self._last_save = 0
+        self._load()
+
+    @classmethod
+    def for_output(cls, save_dir):
+        """Return the manifest of the batch written to `save_dir`"""
+        return cls(os.path.join(save_dir, MANIFEST_FILENAME))
+
+    def _load(self):
+        try:
+            with open(self.path) as f:
+                self.entries = dict(json.load(f)["entries"])
+        except (OSError, ValueError, TypeError, KeyError):
+            self.entries = {}
+
+    def save(self):
+        with self._lock:
+            self._save()
+
+    def _save(self):
+        tmp_path = self.path + ".part"
+        with open(tmp_path, "w") as f:
+            json.dump({"entries": self.entries}, f)
+        os.replace(tmp_path, self.path)
+        self._last_save = time.monotonic()
+
+    def is_current(self, name, files, settings, outputs):
+        """
+        Return whether the entry `name` was created of `files` with the
+        `settings` fingerprint and all of its `outputs` still exist
+        """
+        entry = self.entries.get(name)
+        return (
+            entry is not None
+            and entry["files"] == files
+            and entry["settings"] == settings
+            and all(map(os.path.exists, outputs))
+        )
+
+    def update(self, name, files, settings, infohashes):
+        """
+        Record that the entry `name` was created
+
+        :return: whether the entry was recorded before
+        """
+        with self._lock:
+            known = name in self.entries
+            self.entries[name] = {
+                "files": files,
+                "settings": settings,
+                "infohashes": infohashes,
+                "time": round(time.time()),
+            }
+            if time.monotonic() - self._last_save >= self.interval:
+                self._save()
+        return known
+
+    def forget(self, names):
+        """Remove all entries not in `names` and return their names"""
+        with self._lock:
+            removed = sorted(set(self.entries) - set(names))
+            for name in removed:
+                del self.entries[name]
+        return removed
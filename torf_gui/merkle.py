@@ -0,0 +1,249 @@
+import math
+from contextlib import closing
+from hashlib import sha1, sha256
+
+from torf_gui import bencode
+from torf_gui.hasher import (
+    iter_ordered,
+    metainfo_files,
+    read_pieces,
+    torrent_files,
+)
+
+# "v1" torrents are hashed by torf, "v2" only have per-file merkle trees
+# (BEP 52) and "hybrid" ones have both, with v1 pieces aligned to files by
+# padding (BEP 47)
+VERSIONS = ("v1", "v2", "hybrid")
+
+# Leaves of the merkle trees are the hashes of 16 KiB blocks
+BLOCK_SIZE = 2**14
+
+_ZERO_HASH = bytes(32)
+
+
+def _power_of_two(count):
+    # Return the smallest power of two >= `count`
+    return 1 << max(0, count - 1).bit_length()
+
+
+def merkle_root(hashes, width, pad=_ZERO_HASH):
+    """
+    Return the root of a merkle tree with `width` leaves
+
+    `width` is a power of two. The leaves are `hashes`, followed by `pad`
+    for each missing leaf.
+    """
+    layer = list(hashes)
+    while width > 1:
+        if len(layer) % 2:
+            layer.append(pad)
+        layer = [
+            sha256(layer[i] + layer[i + 1]).digest()
+            for i in range(0, len(layer), 2)
+        ]
+        pad = sha256(pad + pad).digest()
+        width //= 2
+    return layer[0] if layer else pad
+
+
+def _hash_piece(data, blocks, padding):
+    # Return the SHA-1 of the piece followed by `padding` zero bytes, or
+    # None if `padding` is None, and the merkle root of its `blocks` blocks
+    leaves = [
+        sha256(data[i : i + BLOCK_SIZE]).digest()
+        for i in range(0, len(data), BLOCK_SIZE)
+    ]
+    root = merkle_root(leaves, blocks)
+    if padding is None:
+        return None, root
+    piece_hash = sha1(data)
+    if padding:
+        piece_hash.update(bytes(padding))
+    return piece_hash.digest(), root
+
+
+class Layers:
+    """
+    Hashes of a v2 or hybrid torrent that torf has no place for
+
+    `files` is a list of (path, size, pieces root, piece layer) in file tree
+    order. `path` is the list of path components in the file tree and the
+    piece layer is ``None`` for files of up to one piece. Empty files have
+    neither. `pieces` are the
+    v1 piece hashes of hybrid torrents, with every file starting a piece.
+    """
+
+    def __init__(self, version, piece_size, files, pieces=None):
+        self.version = version
+        self.piece_size = piece_size
+        self.files = files
+        self.pieces = pieces
+
+
+def _tree_files(torrent):
+    # Return (path, size, filepath) in file tree order, where path is the
+    # file's path in the file tree
+    singlefile = "files" not in torrent.metainfo["info"]
+    files = [
+        (parts if singlefile else parts[1:], size, filepath)
+        for (parts, size), (filepath, _) in zip(
+            metainfo_files(torrent), torrent_files(torrent), strict=True
+        )
+    ]
+    # Bencoded dictionaries are sorted by their raw keys
+    files.sort(key=lambda f: [part.encode() for part in f[0]])
+    return files
+
+
+def _submit(pool, torrent, files, hybrid):
+    # Yield (file index, filepath, future) for each piece; every file starts
+    # a new piece
+    piece_size = torrent.piece_size
+    for i, (_, size, filepath) in enumerate(files):
+        if size > piece_size:
+            blocks = piece_size // BLOCK_SIZE
+        else:
+            blocks = _power_of_two(math.ceil(size / BLOCK_SIZE))
+        for _, _, data in read_pieces(torrent, files=[(filepath, size)]):
+            padding = None
+            if hybrid:
+                # The last file isn't padded
+                last = i == len(files) - 1
+                padding = 0 if last else piece_size - len(data)
+            yield i, filepath, pool.submit(_hash_piece, data, blocks, padding)
+
+
+def _iter_hashes(torrent, files, hybrid, threads=None):
+    # Yield (file index, filepath, (piece hash, root)) for each piece, in
+    # order, like hasher.iter_piece_hashes()
+    def submit(pool):
+        return _submit(pool, torrent, files, hybrid)
+
+    with closing(iter_ordered(submit, threads)) as jobs:
+        for i, filepath, future in jobs:
+            yield i, filepath, future.result()
+
+
+def _layer_files(files, roots, piece_size):
+    # Return Layers.files from the roots of the pieces of each file
+    # Piece layers are padded with the roots of pieces of zeros
+    pad = merkle_root((), piece_size // BLOCK_SIZE)
+    layer_files = []
+    for (path, size, _), piece_roots in zip(files, roots, strict=True):
+        if not piece_roots:
+            # Empty files have no pieces root (BEP 52)
+            layer_files.append((path, size, None, None))
+        elif len(piece_roots) == 1:
+            layer_files.append((path, size, piece_roots[0], None))
+        else:
+            root = merkle_root(
+                piece_roots, _power_of_two(len(piece_roots)), pad
+            )
+            layer_files.append((path, size, root, b"".join(piece_roots)))
+    return layer_files
+
+
+def generate(torrent, version, threads=None, callback=None):
+    """
+    Hash `torrent` as a `version` torrent from :data:`VERSIONS` other than
+    "v1" and set its :attr:`layers`
+
+    Each byte is read once and hashed with SHA-256 for the merkle trees and,
+    for hybrid torrents, with SHA-1 for the v1 pieces. `callback` is called
+    like the :meth:`torf.Torrent.generate` callback after each piece.
+
+    :return: ``False`` if hashing was cancelled by `callback`
+    """
+    import torf
+
+    if not torrent.size:
+        raise torf.PathError(torrent.path, msg="Empty or all files excluded")
+    piece_size = torrent.piece_size
+    if piece_size < BLOCK_SIZE or piece_size & (piece_size - 1):
+        raise ValueError(
+            f"{version} torrents need a piece size that is a power of two "
+            f"of at least {BLOCK_SIZE} bytes"
+        )
+    files = _tree_files(torrent)
+    pieces_total = sum(math.ceil(size / piece_size) for _, size, _ in files)
+    hybrid = version == "hybrid"
+    pieces = bytearray()
+    roots = [[] for _ in files]
+    hashes = _iter_hashes(torrent, files, hybrid, threads)
+    try:
+        for done, (i, filepath, (piece_hash, root)) in enumerate(
+            hashes, start=1
+        ):
+            if hybrid:
+                pieces += piece_hash
+            roots[i].append(root)
+            if callback is not None and callback(
+                torrent, filepath, done, pieces_total
+            ):
+                return False
+    finally:
+        hashes.close()
+    torrent.layers = Layers(
+        version,
+        piece_size,
+        _layer_files(files, roots, piece_size),
+        bytes(pieces) if hybrid else None,
+    )
+    return True
+
+
+def _padded_files(layers):
+    # Return the v1 file list of a hybrid torrent with BEP 47 pad files
+    files = []
+    for i, (path, size, _, _) in enumerate(layers.files):
+        files.append({"length": size, "path": path})
+        padding = -size % layers.piece_size
+        if padding and i < len(layers.files) - 1:
+            files.append(
+                {
+                    "attr": "p",
+                    "length": padding,
+                    "path": [".pad", str(padding)],
+                }
+            )
+    return files
+
+
+def metainfo(torrent, layers):
+    """Return the metainfo of `torrent` with the hashes from `layers`"""
+    meta = dict(torrent.metainfo)
+    info = meta["info"] = dict(meta["info"])
+    tree = {}
+    for path, size, root, _ in layers.files:
+        node = tree
+        for part in path:
+            node = node.setdefault(part, {})
+        node[""] = {"length": size}
+        if root is not None:
+            node[""]["pieces root"] = root
+    info["file tree"] = tree
+    info["meta version"] = 2
+    meta["piece layers"] = {
+        root: layer for _, _, root, layer in layers.files if layer is not None
+    }
+    if layers.version == "v2":
+        for key in ("files", "length", "pieces", "md5sum"):
+            info.pop(key, None)
+    else:
+        info["pieces"] = layers.pieces
+        if "files" in info:
+            info["files"] = _padded_files(layers)
+    return meta
+
+
+def infohash(torrent, layers, v2=False):
+    """
+    Return the info hash of `torrent` with the hashes from `layers`
+
+    This is the SHA-256 info hash for v2 torrents and the SHA-1 one that
+    v1 clients use for hybrid torrents, unless `v2` is true.
+    """
+    hash_object = sha256() if v2 or layers.version == "v2" else sha1()
+    return bencode.digest(
+        metainfo(torrent, layers)["info"], hash_object
+    ).hexdigest()
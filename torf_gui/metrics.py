@@ -0,0 +1,264 @@
+import csv
+import json
+import os
+import socket
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+from torf_gui.engine import bytes_hashed, file_count
+from torf_gui.version import __version__
+
+FORMATS = ("json", "csv", "prometheus")
+
+# Seconds over which the peak hashing rate is measured
+PEAK_WINDOW = 1
+
+FIELDS = [
+    "time",
+    "version",
+    "host",
+    "name",
+    "mode",
+    "success",
+    "wall_seconds",
+    "scan_seconds",
+    "hash_seconds",
+    "write_seconds",
+    "size",
+    "bytes_hashed",
+    "avg_bytes_per_second",
+    "peak_bytes_per_second",
+    "files",
+    "piece_size",
+    "pieces",
+    "threads",
+    "cached",
+    "infohashes",
+]
+
+
+class JobMetrics:
+    """
+    Timing and throughput of creating the torrent `name`
+
+    `scan_seconds` is the time it took to scan the input if that happened
+    before the job was started, e.g. in the main window.
+    """
+
+    def __init__(self, name, mode="single", scan_seconds=0):
+        self.name = name
+        self.mode = mode
+        self.started = time.monotonic() - scan_seconds
+        self.seconds = {"scan": scan_seconds, "hash": 0, "write": 0}
+        self.size = 0
+        self.bytes_hashed = 0
+        self.peak_rate = 0
+        self.files = 0
+        self.piece_size = 0
+        self.pieces = 0
+        self.threads = 0
+        self.cached = False
+        self.infohashes = []
+        self._window = None
+
+    @contextmanager
+    def phase(self, name):
+        """Add the time spent in the with block to phase `name`"""
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self.seconds[name] += time.monotonic() - started
+
+    @contextmanager
+    def hashing(self, torrent, threads=None):
+        """Time hashing `torrent` with `threads` threads"""
+        self.size = torrent.size
+        self.files = file_count(torrent)
+        self.piece_size = torrent.piece_size
+        self.pieces = torrent.pieces
+        self.threads = threads or os.cpu_count() or 1
+        self.bytes_hashed += torrent.size
+        self._window = (time.monotonic(), 0)
+        with self.phase("hash"):
+            yield
+        # Jobs shorter than the peak window don't get a sample
+        if not self.peak_rate and self.seconds["hash"] > 0:
+            self.peak_rate = self.bytes_hashed / self.seconds["hash"]
+
+    def skipped(self, torrent, pieces):
+        """Don't count `pieces` that were resumed or loaded from a cache"""
+        done = bytes_hashed(torrent, pieces)
+        self.bytes_hashed -= done
+        self._window = (time.monotonic(), done)
+
+    def sample(self, torrent, pieces_done):
+        """Update the peak rate with the progress of the torrent"""
+        now = time.monotonic()
+        done = bytes_hashed(torrent, pieces_done)
+        started, started_done = self._window
+        if now - started >= PEAK_WINDOW:
+            rate = (done - started_done) / (now - started)
+            self.peak_rate = max(self.peak_rate, rate)
+            self._window = (now, done)
+
+    def written(self, infohash):
+        """Record the info hash of a written torrent"""
+        self.infohashes.append(infohash)
+
+    def record(self, success):
+        """Return the metrics as a dict with the keys in :data:`FIELDS`"""
+        hash_seconds = self.seconds["hash"]
+        return {
+            "time": datetime.now().astimezone().isoformat(timespec="seconds"),
+            "version": __version__,
+            "host": socket.gethostname(),
+            "name": self.name,
+            "mode": self.mode,
+            "success": success,
+            "wall_seconds": round(time.monotonic() - self.started, 3),
+            "scan_seconds": round(self.seconds["scan"], 3),
+            "hash_seconds": round(hash_seconds, 3),
+            "write_seconds": round(self.seconds["write"], 3),
+            "size": self.size,
+            "bytes_hashed": self.bytes_hashed,
+            "avg_bytes_per_second": round(
+                self.bytes_hashed / hash_seconds if hash_seconds else 0
+            ),
+            "peak_bytes_per_second": round(self.peak_rate),
+            "files": self.files,
+            "piece_size": self.piece_size,
+            "pieces": self.pieces,
+            "threads": self.threads,
+            "cached": self.cached,
+            "infohashes": self.infohashes,
+        }
+
+
+def format_from_path(path):
+    """Guess the format of the metrics file `path` from its extension"""
+    extension = os.path.splitext(path)[1].lower()
+    if extension == ".csv":
+        return "csv"
+    if extension == ".prom":
+        return "prometheus"
+    return "json"
+
+
+def append_row(path, fields, row, format):
+    """
+    Append the dict `row` to `path` as a JSON line or, if `format` is
+    "csv", as a CSV row with the columns `fields`
+
+    The CSV header is written first if `path` is empty.
+    """
+    if format == "csv":
+        new = not os.path.exists(path) or not os.path.getsize(path)
+        with open(path, "a", newline="") as f:
+            writer = csv.DictWriter(f, fields)
+            if new:
+                writer.writeheader()
+            writer.writerow(row)
+    else:
+        with open(path, "a") as f:
+            f.write(json.dumps(row) + "\n")
+
+
+def _label(value):
+    value = str(value).replace("\\", "\\\\").replace('"', '\\"')
+    return value.replace("\n", "\\n")
+
+
+class MetricsFile:
+    """
+    Append job records to `path` as JSON lines, CSV or a Prometheus
+    textfile collector file
+
+    Prometheus files only describe the last job, plus counters over all
+    jobs that are carried over from the existing file. Writing is thread
+    safe, so batch entries can share one :class:`MetricsFile`.
+    """
+
+    def __init__(self, path, format=None):
+        self.path = path
+        self.format = format or format_from_path(path)
+        if self.format not in FORMATS:
+            raise ValueError(f"Unknown metrics format: {self.format}")
+        self._lock = threading.Lock()
+
+    def write(self, record):
+        with self._lock:
+            if self.format == "prometheus":
+                self._write_prometheus(record)
+                return
+            if self.format == "csv":
+                record = {
+                    **record,
+                    "infohashes": " ".join(record["infohashes"]),
+                }
+            append_row(self.path, FIELDS, record, self.format)
+
+    def _read_counters(self):
+        counters = {}
+        try:
+            with open(self.path) as f:
+                for line in f:
+                    name, _, value = line.partition(" ")
+                    if name.endswith("_total"):
+                        counters[name] = float(value)
+        except (OSError, ValueError):
+            pass
+        return counters
+
+    def _write_prometheus(self, record):
+        counters = self._read_counters()
+        status = "success" if record["success"] else "failure"
+        for name, value in [
+            (f"torf_gui_jobs_{status}_total", 1),
+            ("torf_gui_hashed_bytes_total", record["bytes_hashed"]),
+            ("torf_gui_hash_seconds_total", record["hash_seconds"]),
+        ]:
+            counters[name] = counters.get(name, 0) + value
+        gauges = {
+            "timestamp_seconds": round(time.time()),
+            "success": int(record["success"]),
+            "wall_seconds": record["wall_seconds"],
+            "scan_seconds": record["scan_seconds"],
+            "hash_seconds": record["hash_seconds"],
+            "write_seconds": record["write_seconds"],
+            "size_bytes": record["size"],
+            "hashed_bytes": record["bytes_hashed"],
+            "avg_bytes_per_second": record["avg_bytes_per_second"],
+            "peak_bytes_per_second": record["peak_bytes_per_second"],
+            "files": record["files"],
+            "piece_size_bytes": record["piece_size"],
+            "threads": record["threads"],
+        }
+        lines = []
+        for name, value in sorted(counters.items()):
+            value = int(value) if float(value).is_integer() else value
+            lines += [f"# TYPE {name} counter", f"{name} {value}"]
+        for name, value in gauges.items():
+            name = f"torf_gui_last_job_{name}"
+            lines += [f"# TYPE {name} gauge", f"{name} {value}"]
+        labels = ",".join(
+            f'{key}="{_label(value)}"'
+            for key, value in [
+                ("name", record["name"]),
+                ("mode", record["mode"]),
+                ("version", record["version"]),
+                ("host", record["host"]),
+                ("infohash", " ".join(record["infohashes"])),
+            ]
+        )
+        lines += [
+            "# TYPE torf_gui_last_job_info gauge",
+            f"torf_gui_last_job_info{{{labels}}} 1",
+        ]
+        # The collector may read the file at any time
+        tmp = self.path + ".part"
+        with open(tmp, "w") as f:
+            f.write("\n".join(lines) + "\n")
+        os.replace(tmp, self.path)
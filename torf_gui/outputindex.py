@@ -0,0 +1,92 @@
+import os
+import threading
+from urllib.parse import quote
+
+from torf_gui import merkle
+from torf_gui.engine import file_count
+from torf_gui.metrics import append_row, format_from_path
+
+FORMATS = ("json", "csv")
+
+FIELDS = [
+    "name",
+    "path",
+    "infohash",
+    "magnet",
+    "size",
+    "files",
+    "piece_size",
+    "created",
+]
+
+
+def magnet_uri(torrent, infohash):
+    """
+    Return the magnet link of `torrent` with the info hash `infohash`
+
+    Like :meth:`torf.Torrent.magnet`, but without validating `torrent`
+    again. v2 torrents are linked by their SHA-256 info hash and hybrid
+    torrents by both (BEP 52).
+    """
+    layers = getattr(torrent, "layers", None)
+    if layers is None:
+        topics = [f"urn:btih:{infohash}"]
+    elif layers.version == "v2":
+        topics = [f"urn:btmh:1220{infohash}"]
+    else:
+        v2_infohash = merkle.infohash(torrent, layers, v2=True)
+        topics = [f"urn:btih:{infohash}", f"urn:btmh:1220{v2_infohash}"]
+    params = [
+        ("dn", torrent.name),
+        ("xl", torrent.size),
+        *(("tr", url) for tier in torrent.trackers for url in tier),
+        *(("ws", url) for url in torrent.webseeds),
+    ]
+    return "magnet:?" + "&".join(
+        [f"xt={topic}" for topic in topics]
+        + [f"{key}={quote(str(value), safe='')}" for key, value in params]
+    )
+
+
+def index_row(torrent, filepath, infohash):
+    """Return the row of the torrent file `filepath` of `torrent`"""
+    created = torrent.creation_date
+    return {
+        "name": torrent.name,
+        "path": os.path.abspath(filepath),
+        "infohash": infohash,
+        "magnet": magnet_uri(torrent, infohash),
+        "size": torrent.size,
+        "files": file_count(torrent),
+        "piece_size": torrent.piece_size,
+        "created": (
+            created.astimezone().isoformat(timespec="seconds")
+            if created
+            else None
+        ),
+    }
+
+
+class OutputIndex:
+    """
+    Append a row with the keys in :data:`FIELDS` to `path` for each written
+    torrent file, as JSON lines or CSV
+
+    Rows are written as soon as each torrent is, so an index of thousands
+    of outputs can be read at once instead of decoding every torrent file.
+    Writing is thread safe, so batch entries can share one
+    :class:`OutputIndex`.
+    """
+
+    def __init__(self, path, format=None):
+        self.path = path
+        self.format = format or format_from_path(path)
+        if self.format not in FORMATS:
+            raise ValueError(f"Unknown index format: {self.format}")
+        self._lock = threading.Lock()
+
+    def add(self, torrent, filepath, infohash):
+        """Add the torrent file `filepath` of `torrent`"""
+        row = index_row(torrent, filepath, infohash)
+        with self._lock:
+            append_row(self.path, FIELDS, row, self.format)
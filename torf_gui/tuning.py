@@ -0,0 +1,289 @@
+import json
+import os
+import re
+import sys
+import threading
+import time
+
+from torf_gui.hasher import iter_piece_hashes
+
+TUNING_FILENAME = "thread-tuning.json"
+
+# Thread count setting that lets a ThreadTuner decide
+AUTO = 0
+
+# Bytes read at the start of the input to compare thread counts
+PROBE_SIZE = 256 * 2**20
+
+PROBE_PIECE_SIZE = 2**20
+
+# Inputs smaller than this are hashed too quickly to be worth probing
+MIN_PROBE_SIZE = 64 * 2**20
+
+# Files read ahead of the hasher on network filesystems
+PREFETCH_FILES = 16
+
+# Types of Linux filesystems that are accessed over the network
+NETWORK_FILESYSTEMS = frozenset(
+    {
+        "9p",
+        "afs",
+        "ceph",
+        "cifs",
+        "davfs",
+        "fuse.rclone",
+        "fuse.sshfs",
+        "glusterfs",
+        "lustre",
+        "ncpfs",
+        "nfs",
+        "nfs4",
+        "smb3",
+        "smbfs",
+    }
+)
+
+# Thread counts whose rates are within this factor of the fastest one are
+# considered equally fast, and the smallest of them wins
+TOLERANCE = 0.95
+
+
+def candidates(budget):
+    """Return the thread counts to probe for `budget` CPU threads"""
+    counts = {budget}
+    count = 1
+    # More threads than CPUs only help if reads have high latency
+    while count <= min(2 * budget, 64):
+        counts.add(count)
+        count *= 2
+    return sorted(counts)
+
+
+def default_path():
+    """Return the tuning file of the command line tool"""
+    base = os.environ.get("XDG_CACHE_HOME") or os.environ.get("LOCALAPPDATA")
+    if not base:
+        base = os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(base, "torf-gui", TUNING_FILENAME)
+
+
+def device_id(path):
+    """Return a key that identifies the device `path` is stored on"""
+    return str(os.stat(path).st_dev)
+
+
+def _mount_points(mounts="/proc/self/mounts"):
+    # Return (mount point, filesystem type) of each mounted filesystem
+    with open(mounts) as f:
+        fields = [line.split() for line in f]
+    # Spaces and other special characters are escaped as octal numbers
+    unescape = re.compile(r"\\([0-7]{3})")
+    return [
+        (unescape.sub(lambda m: chr(int(m[1], 8)), field[1]), field[2])
+        for field in fields
+        if len(field) >= 3
+    ]
+
+
+def filesystem_type(path):
+    """
+    Return the type of the filesystem `path` is on, e.g. "ext4" or "nfs4"
+
+    Only Linux is supported; ``None`` is returned elsewhere or if the type
+    can't be found.
+    """
+    try:
+        mounts = _mount_points()
+    except OSError:
+        return None
+    path = os.path.realpath(path)
+    # The longest mount point that contains `path` is the one it's on
+    best = None
+    for mount_point, fstype in mounts:
+        inside = path == mount_point or path.startswith(
+            mount_point.rstrip("/") + "/"
+        )
+        if inside and (best is None or len(mount_point) >= len(best[0])):
+            best = (mount_point, fstype)
+    return best[1] if best else None
+
+
+# GetDriveTypeW() result of network drives
+_DRIVE_REMOTE = 4
+
+
+def _is_remote_drive(path):
+    # Return whether `path` is on a network share on Windows
+    import ctypes
+
+    drive = os.path.splitdrive(os.path.abspath(path))[0]
+    if drive.startswith("\\\\"):
+        return True
+    return ctypes.windll.kernel32.GetDriveTypeW(drive + "\\") == _DRIVE_REMOTE
+
+
+def is_network_path(path):
+    """
+    Return whether `path` is on a network filesystem like NFS or SMB
+
+    Only Linux mounts and Windows drives and UNC paths are recognized.
+    """
+    if sys.platform == "win32":
+        try:
+            return _is_remote_drive(path)
+        except (OSError, AttributeError):
+            return False
+    return filesystem_type(path) in NETWORK_FILESYSTEMS
+
+
+# device_id() -> prefetch_files() result, so mounts are only looked up once
+# per device
+_prefetch_by_device = {}
+
+
+def prefetch_files(path):
+    """
+    Return the number of files to read ahead of the hasher for the input
+    `path`
+
+    Files are only read ahead on network filesystems, where opening and
+    reading many small files one after another is dominated by round
+    trips. The result is cached for the device `path` is on.
+    """
+    try:
+        device = device_id(path)
+    except OSError:
+        # Hashing reports the error
+        return 0
+    if device not in _prefetch_by_device:
+        _prefetch_by_device[device] = (
+            PREFETCH_FILES if is_network_path(path) else 0
+        )
+    return _prefetch_by_device[device]
+
+
+class _Probe:
+    # read_pieces() only needs the piece size if it is given the files
+    piece_size = PROBE_PIECE_SIZE
+
+
+def probe_rate(files, offset, length, threads, cancelled=None):
+    """
+    Return the bytes per second it takes to read and hash `length` bytes of
+    `files` from `offset` on with `threads` threads
+
+    `files` is a list of (filepath, size) as returned by
+    :func:`~torf_gui.engine.scan`. Returns ``None`` if `cancelled` is set
+    or nothing was hashed.
+    """
+    start = offset // PROBE_PIECE_SIZE
+    pieces = max(1, length // PROBE_PIECE_SIZE)
+    done = 0
+    started = time.monotonic()
+    hashes = iter_piece_hashes(_Probe, start, threads, files)
+    try:
+        for done, _ in enumerate(hashes, start=1):
+            if cancelled is not None and cancelled.is_set():
+                return None
+            if done == pieces:
+                break
+    finally:
+        hashes.close()
+    if not done:
+        return None
+    return done * PROBE_PIECE_SIZE / (time.monotonic() - started)
+
+
+class ThreadTuner:
+    """
+    Pick the fastest number of hasher threads for each storage device
+
+    The first `probe_size` bytes of an input are split between the thread
+    counts from :func:`candidates`, so each count reads data that isn't in
+    the page cache yet. Results are stored per device in the JSON file
+    `path` and reused for all later inputs on the same device.
+    """
+
+    def __init__(self, path=None, budget=None, probe_size=PROBE_SIZE):
+        self.path = path
+        self.budget = budget or os.cpu_count() or 1
+        self.probe_size = probe_size
+        self.devices = {}
+        # Probing devices concurrently would make them look slower
+        self._lock = threading.Lock()
+        if path is not None:
+            self._load()
+
+    def _load(self):
+        try:
+            with open(self.path) as f:
+                self.devices = dict(json.load(f))
+        except (OSError, ValueError, TypeError):
+            self.devices = {}
+
+    def save(self):
+        if self.path is None:
+            return
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        tmp_path = self.path + ".part"
+        with open(tmp_path, "w") as f:
+            json.dump(self.devices, f, indent=4)
+        os.replace(tmp_path, self.path)
+
+    def threads(self, path, files=None, cancelled=None):
+        """
+        Return the number of hasher threads for the input `path`
+
+        `files` is the :func:`~torf_gui.engine.scan` result of `path`; it
+        is only scanned if the device must be probed and `files` isn't
+        given. Inputs that are too small or fail to probe get
+        :attr:`budget` threads.
+        """
+        try:
+            device = device_id(path)
+        except OSError:
+            return self.budget
+        with self._lock:
+            if device in self.devices:
+                return self.devices[device]["threads"]
+            if files is None:
+                from torf_gui.engine import scan
+
+                files = scan(path, cancelled=cancelled) or []
+            if sum(size for _, size in files) < MIN_PROBE_SIZE:
+                return self.budget
+            try:
+                rates = self.probe(files, cancelled)
+            except OSError:
+                rates = None
+            if rates is None:
+                return self.budget
+            fastest = max(rates.values())
+            threads = min(
+                count
+                for count, rate in rates.items()
+                if rate >= fastest * TOLERANCE
+            )
+            self.devices[device] = {
+                "threads": threads,
+                "rates": {str(count): round(r) for count, r in rates.items()},
+                "time": round(time.time()),
+            }
+            self.save()
+            return threads
+
+    def probe(self, files, cancelled=None):
+        """
+        Return {threads: bytes per second} or ``None`` if canceled or
+        nothing could be hashed
+        """
+        counts = candidates(self.budget)
+        size = min(self.probe_size, sum(size for _, size in files))
+        length = size // len(counts)
+        rates = {}
+        for i, count in enumerate(counts):
+            rate = probe_rate(files, i * length, length, count, cancelled)
+            if rate is None:
+                return None
+            rates[count] = rate
+        return rates
@@ -66,6 +66,31 @@ class Ui_MainWindow:
         self.batchModeCheckBox = QtWidgets.QCheckBox(self.inputGroupBox)
         self.batchModeCheckBox.setObjectName("batchModeCheckBox")
         self.gridLayout.addWidget(self.batchModeCheckBox, 4, 0, 1, 1)
+        self.incrementalCheckBox = QtWidgets.QCheckBox(self.inputGroupBox)
+        self.incrementalCheckBox.setObjectName("incrementalCheckBox")
+        self.gridLayout.addWidget(self.incrementalCheckBox, 4, 1, 1, 1)
+        self.batchJobsLabel = QtWidgets.QLabel(self.inputGroupBox)
+        sizePolicy = QtWidgets.QSizePolicy(
+            QtWidgets.QSizePolicy.Preferred, QtWidgets.QSizePolicy.Fixed
+        )
+        sizePolicy.setHorizontalStretch(0)
+        sizePolicy.setVerticalStretch(0)
+        sizePolicy.setHeightForWidth(
+            self.batchJobsLabel.sizePolicy().hasHeightForWidth()
+        )
+        self.batchJobsLabel.setSizePolicy(sizePolicy)
+        self.batchJobsLabel.setAlignment(
+            QtCore.Qt.AlignRight
+            | QtCore.Qt.AlignTrailing
+            | QtCore.Qt.AlignVCenter
+        )
+        self.batchJobsLabel.setObjectName("batchJobsLabel")
+        self.gridLayout.addWidget(self.batchJobsLabel, 4, 2, 1, 1)
+        self.batchJobsSpinBox = QtWidgets.QSpinBox(self.inputGroupBox)
+        self.batchJobsSpinBox.setMinimum(1)
+        self.batchJobsSpinBox.setMaximum(64)
+        self.batchJobsSpinBox.setObjectName("batchJobsSpinBox")
+        self.gridLayout.addWidget(self.batchJobsSpinBox, 4, 3, 1, 1)
         self.excludeLabel = QtWidgets.QLabel(self.inputGroupBox)
         sizePolicy = QtWidgets.QSizePolicy(
             QtWidgets.QSizePolicy.Preferred, QtWidgets.QSizePolicy.Fixed
@@ -256,6 +281,59 @@ class Ui_MainWindow:
         self.md5CheckBox = QtWidgets.QCheckBox(self.optionGroupBox)
         self.md5CheckBox.setObjectName("md5CheckBox")
         self.gridLayout_2.addWidget(self.md5CheckBox, 10, 0, 1, 2)
+        self.hashCacheCheckBox = QtWidgets.QCheckBox(self.optionGroupBox)
+        self.hashCacheCheckBox.setObjectName("hashCacheCheckBox")
+        self.gridLayout_2.addWidget(self.hashCacheCheckBox, 11, 0, 1, 2)
+        self.outputProfilesButton = QtWidgets.QPushButton(self.optionGroupBox)
+        self.outputProfilesButton.setObjectName("outputProfilesButton")
+        self.gridLayout_2.addWidget(self.outputProfilesButton, 12, 0, 1, 1)
+        self.horizontalLayout_outputProfiles = QtWidgets.QHBoxLayout()
+        self.horizontalLayout_outputProfiles.setObjectName(
+            "horizontalLayout_outputProfiles"
+        )
+        self.outputProfilesLabel = QtWidgets.QLabel(self.optionGroupBox)
+        sizePolicy = QtWidgets.QSizePolicy(
+            QtWidgets.QSizePolicy.Ignored, QtWidgets.QSizePolicy.Fixed
+        )
+        sizePolicy.setHorizontalStretch(1)
+        sizePolicy.setVerticalStretch(0)
+        sizePolicy.setHeightForWidth(
+            self.outputProfilesLabel.sizePolicy().hasHeightForWidth()
+        )
+        self.outputProfilesLabel.setSizePolicy(sizePolicy)
+        self.outputProfilesLabel.setObjectName("outputProfilesLabel")
+        self.horizontalLayout_outputProfiles.addWidget(
+            self.outputProfilesLabel
+        )
+        self.outputProfilesClearButton = QtWidgets.QPushButton(
+            self.optionGroupBox
+        )
+        self.outputProfilesClearButton.setObjectName(
+            "outputProfilesClearButton"
+        )
+        self.horizontalLayout_outputProfiles.addWidget(
+            self.outputProfilesClearButton
+        )
+        self.gridLayout_2.addLayout(
+            self.horizontalLayout_outputProfiles, 12, 1, 1, 1
+        )
+        self.threadsLabel = QtWidgets.QLabel(self.optionGroupBox)
+        self.threadsLabel.setObjectName("threadsLabel")
+        self.gridLayout_2.addWidget(self.threadsLabel, 13, 0, 1, 1)
+        self.threadsSpinBox = QtWidgets.QSpinBox(self.optionGroupBox)
+        self.threadsSpinBox.setMinimum(0)
+        self.threadsSpinBox.setMaximum(64)
+        self.threadsSpinBox.setObjectName("threadsSpinBox")
+        self.gridLayout_2.addWidget(self.threadsSpinBox, 13, 1, 1, 1)
+        self.versionLabel = QtWidgets.QLabel(self.optionGroupBox)
+        self.versionLabel.setObjectName("versionLabel")
+        self.gridLayout_2.addWidget(self.versionLabel, 14, 0, 1, 1)
+        self.versionComboBox = QtWidgets.QComboBox(self.optionGroupBox)
+        self.versionComboBox.setObjectName("versionComboBox")
+        self.versionComboBox.addItem("")
+        self.versionComboBox.addItem("")
+        self.versionComboBox.addItem("")
+        self.gridLayout_2.addWidget(self.versionComboBox, 14, 1, 1, 1)
         self.randomizeInfoHashCheckBox = QtWidgets.QCheckBox(
             self.optionGroupBox
         )
@@ -319,6 +397,9 @@ class Ui_MainWindow:
         self.createButton = QtWidgets.QPushButton(self.centralwidget)
         self.createButton.setObjectName("createButton")
         self.horizontalLayout.addWidget(self.createButton)
+        self.queueButton = QtWidgets.QPushButton(self.centralwidget)
+        self.queueButton.setObjectName("queueButton")
+        self.horizontalLayout.addWidget(self.queueButton)
         self.cancelButton = QtWidgets.QPushButton(self.centralwidget)
         self.cancelButton.setObjectName("cancelButton")
         self.horizontalLayout.addWidget(self.cancelButton)
@@ -338,10 +419,97 @@ class Ui_MainWindow:
         self.statusbar = QtWidgets.QStatusBar(MainWindow)
         self.statusbar.setObjectName("statusbar")
         MainWindow.setStatusBar(self.statusbar)
+        self.queueDockWidget = QtWidgets.QDockWidget(MainWindow)
+        self.queueDockWidget.setFeatures(
+            QtWidgets.QDockWidget.DockWidgetFloatable
+            | QtWidgets.QDockWidget.DockWidgetMovable
+        )
+        self.queueDockWidget.setObjectName("queueDockWidget")
+        self.queueDockContents = QtWidgets.QWidget()
+        self.queueDockContents.setObjectName("queueDockContents")
+        self.verticalLayout_queue = QtWidgets.QVBoxLayout(
+            self.queueDockContents
+        )
+        self.verticalLayout_queue.setObjectName("verticalLayout_queue")
+        self.queueView = QtWidgets.QTableView(self.queueDockContents)
+        self.queueView.setEditTriggers(
+            QtWidgets.QAbstractItemView.NoEditTriggers
+        )
+        self.queueView.setSelectionBehavior(
+            QtWidgets.QAbstractItemView.SelectRows
+        )
+        self.queueView.setShowGrid(False)
+        self.queueView.setObjectName("queueView")
+        self.queueView.horizontalHeader().setStretchLastSection(True)
+        self.queueView.verticalHeader().setVisible(False)
+        self.verticalLayout_queue.addWidget(self.queueView)
+        self.horizontalLayout_queueJobs = QtWidgets.QHBoxLayout()
+        self.horizontalLayout_queueJobs.setObjectName(
+            "horizontalLayout_queueJobs"
+        )
+        self.queueRaiseButton = QtWidgets.QPushButton(self.queueDockContents)
+        self.queueRaiseButton.setObjectName("queueRaiseButton")
+        self.horizontalLayout_queueJobs.addWidget(self.queueRaiseButton)
+        self.queueLowerButton = QtWidgets.QPushButton(self.queueDockContents)
+        self.queueLowerButton.setObjectName("queueLowerButton")
+        self.horizontalLayout_queueJobs.addWidget(self.queueLowerButton)
+        self.queuePauseJobButton = QtWidgets.QPushButton(
+            self.queueDockContents
+        )
+        self.queuePauseJobButton.setObjectName("queuePauseJobButton")
+        self.horizontalLayout_queueJobs.addWidget(self.queuePauseJobButton)
+        self.queueRemoveButton = QtWidgets.QPushButton(self.queueDockContents)
+        self.queueRemoveButton.setObjectName("queueRemoveButton")
+        self.horizontalLayout_queueJobs.addWidget(self.queueRemoveButton)
+        self.queueClearButton = QtWidgets.QPushButton(self.queueDockContents)
+        self.queueClearButton.setObjectName("queueClearButton")
+        self.horizontalLayout_queueJobs.addWidget(self.queueClearButton)
+        self.verticalLayout_queue.addLayout(self.horizontalLayout_queueJobs)
+        self.horizontalLayout_queueOptions = QtWidgets.QHBoxLayout()
+        self.horizontalLayout_queueOptions.setObjectName(
+            "horizontalLayout_queueOptions"
+        )
+        self.queueConcurrencyLabel = QtWidgets.QLabel(self.queueDockContents)
+        self.queueConcurrencyLabel.setObjectName("queueConcurrencyLabel")
+        self.horizontalLayout_queueOptions.addWidget(
+            self.queueConcurrencyLabel
+        )
+        self.queueConcurrencySpinBox = QtWidgets.QSpinBox(
+            self.queueDockContents
+        )
+        self.queueConcurrencySpinBox.setMinimum(1)
+        self.queueConcurrencySpinBox.setObjectName("queueConcurrencySpinBox")
+        self.horizontalLayout_queueOptions.addWidget(
+            self.queueConcurrencySpinBox
+        )
+        spacerItem = QtWidgets.QSpacerItem(
+            QtWidgets.QSizePolicy.Expanding, QtWidgets.QSizePolicy.Minimum
+        )
+        self.horizontalLayout_queueOptions.addItem(spacerItem)
+        self.queuePauseButton = QtWidgets.QPushButton(self.queueDockContents)
+        self.queuePauseButton.setCheckable(True)
+        self.queuePauseButton.setObjectName("queuePauseButton")
+        self.horizontalLayout_queueOptions.addWidget(self.queuePauseButton)
+        self.verticalLayout_queue.addLayout(self.horizontalLayout_queueOptions)
+        self.queueDockWidget.setWidget(self.queueDockContents)
+        MainWindow.addDockWidget(
+            QtCore.Qt.DockWidgetArea(2), self.queueDockWidget
+        )
         self.actionImportProfile = QtWidgets.QAction(MainWindow)
         self.actionImportProfile.setObjectName("actionImportProfile")
         self.actionExportProfile = QtWidgets.QAction(MainWindow)
         self.actionExportProfile.setObjectName("actionExportProfile")
+        self.actionVerify = QtWidgets.QAction(MainWindow)
+        self.actionVerify.setObjectName("actionVerify")
+        self.actionVerifyStopOnError = QtWidgets.QAction(MainWindow)
+        self.actionVerifyStopOnError.setCheckable(True)
+        self.actionVerifyStopOnError.setObjectName("actionVerifyStopOnError")
+        self.actionRecordMetrics = QtWidgets.QAction(MainWindow)
+        self.actionRecordMetrics.setCheckable(True)
+        self.actionRecordMetrics.setObjectName("actionRecordMetrics")
+        self.actionWriteIndex = QtWidgets.QAction(MainWindow)
+        self.actionWriteIndex.setCheckable(True)
+        self.actionWriteIndex.setObjectName("actionWriteIndex")
         self.actionAbout = QtWidgets.QAction(MainWindow)
         self.actionAbout.setObjectName("actionAbout")
         self.actionQuit = QtWidgets.QAction(MainWindow)
@@ -349,10 +517,17 @@ class Ui_MainWindow:
         self.menuFile.addAction(self.actionImportProfile)
         self.menuFile.addAction(self.actionExportProfile)
         self.menuFile.addSeparator()
+        self.menuFile.addAction(self.actionVerify)
+        self.menuFile.addAction(self.actionVerifyStopOnError)
+        self.menuFile.addSeparator()
+        self.menuFile.addAction(self.actionRecordMetrics)
+        self.menuFile.addAction(self.actionWriteIndex)
+        self.menuFile.addSeparator()
         self.menuFile.addAction(self.actionQuit)
         self.menuHelp.addAction(self.actionAbout)
         self.menubar.addAction(self.menuFile.menuAction())
         self.menubar.addAction(self.menuHelp.menuAction())
+        self.queueConcurrencyLabel.setBuddy(self.queueConcurrencySpinBox)
 
         self.retranslateUi(MainWindow)
         QtCore.QMetaObject.connectSlotsByName(MainWindow)
@@ -369,10 +544,32 @@ class Ui_MainWindow:
             )
         )
         self.batchModeCheckBox.setText(_translate("MainWindow", "Batch mode"))
+        self.incrementalCheckBox.setToolTip(
+            _translate(
+                "MainWindow",
+                "<html><head/><body><p>If enabled, a manifest in the output directory records the files and settings of each entry, and entries that haven't changed since the last batch into that directory are skipped.</p></body></html>",
+            )
+        )
+        self.incrementalCheckBox.setText(
+            _translate("MainWindow", "Skip unchanged")
+        )
+        self.batchJobsLabel.setText(_translate("MainWindow", "Parallel jobs"))
+        self.batchJobsSpinBox.setToolTip(
+            _translate(
+                "MainWindow",
+                "<html><head/><body><p>Number of batch entries hashed at the same time. The available CPU threads are shared between all running entries.</p></body></html>",
+            )
+        )
         self.excludeLabel.setText(
             _translate(
                 "MainWindow",
-                "Filename exclusion patterns (globs, one per line)",
+                "Exclusion patterns (globs or re:regex, one per line)",
+            )
+        )
+        self.excludeEdit.setToolTip(
+            _translate(
+                "MainWindow",
+                "<html><head/><body><p>Globs like *.nfo match the file name or the whole path. Globs starting with / are anchored below the torrent name, e.g. /Extras/*. Lines starting with re: are regular expressions searched for in the path. Globs ignore case.</p></body></html>",
             )
         )
         self.browseButton.setText(_translate("MainWindow", "Browse..."))
@@ -402,6 +599,50 @@ class Ui_MainWindow:
         self.md5CheckBox.setText(
             _translate("MainWindow", "Compute MD5 hashes")
         )
+        self.hashCacheCheckBox.setToolTip(
+            _translate(
+                "MainWindow",
+                "<html><head/><body><p>If enabled, piece hashes are stored in the settings directory and reused when the same unchanged files are hashed again with the same piece size, e.g. to create a torrent for another tracker.</p></body></html>",
+            )
+        )
+        self.hashCacheCheckBox.setText(
+            _translate("MainWindow", "Reuse piece hashes of unchanged files")
+        )
+        self.outputProfilesButton.setToolTip(
+            _translate(
+                "MainWindow",
+                "<html><head/><body><p>Select exported profiles to write one torrent per profile from a single hashing pass. Each torrent uses the trackers, web seeds, source, private flag and exclusion patterns of its profile.</p></body></html>",
+            )
+        )
+        self.outputProfilesButton.setText(
+            _translate("MainWindow", "Output profiles...")
+        )
+        self.outputProfilesLabel.setText(_translate("MainWindow", "None"))
+        self.outputProfilesClearButton.setText(
+            _translate("MainWindow", "Clear")
+        )
+        self.threadsLabel.setText(_translate("MainWindow", "Hasher threads"))
+        self.threadsSpinBox.setToolTip(
+            _translate(
+                "MainWindow",
+                "<html><head/><body><p>Threads that read and hash pieces. Auto times a few thread counts on the first part of the input and remembers the fastest one for each storage device.</p></body></html>",
+            )
+        )
+        self.threadsSpinBox.setSpecialValueText(
+            _translate("MainWindow", "Auto")
+        )
+        self.versionLabel.setText(_translate("MainWindow", "Torrent version"))
+        self.versionComboBox.setToolTip(
+            _translate(
+                "MainWindow",
+                "<html><head/><body><p>v2 torrents have a SHA-256 merkle tree for each file. Hybrid torrents also have v1 pieces for older clients, with padding files that start every file on a new piece. Both hashes are computed from a single read of the data.</p></body></html>",
+            )
+        )
+        self.versionComboBox.setItemText(0, _translate("MainWindow", "v1"))
+        self.versionComboBox.setItemText(1, _translate("MainWindow", "v2"))
+        self.versionComboBox.setItemText(
+            2, _translate("MainWindow", "Hybrid (v1 + v2)")
+        )
         self.randomizeInfoHashCheckBox.setToolTip(
             _translate(
                 "MainWindow",
@@ -430,10 +671,57 @@ class Ui_MainWindow:
         )
         self.sourceLabel.setText(_translate("MainWindow", "Source"))
         self.createButton.setText(_translate("MainWindow", "Create..."))
+        self.queueButton.setToolTip(
+            _translate(
+                "MainWindow",
+                "Create the torrent later with the current settings, after the jobs before it",
+            )
+        )
+        self.queueButton.setText(_translate("MainWindow", "Add to queue..."))
         self.cancelButton.setText(_translate("MainWindow", "Cancel"))
         self.resetButton.setText(_translate("MainWindow", "Reset"))
         self.menuFile.setTitle(_translate("MainWindow", "File"))
         self.menuHelp.setTitle(_translate("MainWindow", "Help"))
+        self.queueDockWidget.setWindowTitle(
+            _translate("MainWindow", "Job queue")
+        )
+        self.queueRaiseButton.setToolTip(
+            _translate("MainWindow", "Raise the priority of the selected jobs")
+        )
+        self.queueRaiseButton.setText(_translate("MainWindow", "Raise"))
+        self.queueLowerButton.setToolTip(
+            _translate("MainWindow", "Lower the priority of the selected jobs")
+        )
+        self.queueLowerButton.setText(_translate("MainWindow", "Lower"))
+        self.queuePauseJobButton.setToolTip(
+            _translate("MainWindow", "Pause or resume the selected jobs")
+        )
+        self.queuePauseJobButton.setText(
+            _translate("MainWindow", "Pause/Resume")
+        )
+        self.queueRemoveButton.setToolTip(
+            _translate(
+                "MainWindow",
+                "Remove the selected jobs and cancel them if they are running",
+            )
+        )
+        self.queueRemoveButton.setText(_translate("MainWindow", "Remove"))
+        self.queueClearButton.setToolTip(
+            _translate("MainWindow", "Remove all finished jobs")
+        )
+        self.queueClearButton.setText(
+            _translate("MainWindow", "Clear finished")
+        )
+        self.queueConcurrencyLabel.setText(
+            _translate("MainWindow", "Concurrent jobs")
+        )
+        self.queuePauseButton.setToolTip(
+            _translate(
+                "MainWindow",
+                "Don't start any more jobs until the queue is resumed",
+            )
+        )
+        self.queuePauseButton.setText(_translate("MainWindow", "Pause queue"))
         self.actionImportProfile.setText(
             _translate("MainWindow", "Import profile...")
         )
@@ -446,6 +734,34 @@ class Ui_MainWindow:
         self.actionExportProfile.setShortcut(
             _translate("MainWindow", "Ctrl+S")
         )
+        self.actionVerify.setText(
+            _translate("MainWindow", "Verify torrent...")
+        )
+        self.actionVerify.setToolTip(
+            _translate("MainWindow", "Check data against an existing torrent")
+        )
+        self.actionVerify.setShortcut(_translate("MainWindow", "Ctrl+E"))
+        self.actionVerifyStopOnError.setText(
+            _translate("MainWindow", "Stop verifying at first bad piece")
+        )
+        self.actionRecordMetrics.setText(
+            _translate("MainWindow", "Record job metrics...")
+        )
+        self.actionRecordMetrics.setToolTip(
+            _translate(
+                "MainWindow",
+                "Append timing and throughput of each torrent to a file",
+            )
+        )
+        self.actionWriteIndex.setText(
+            _translate("MainWindow", "Write output index...")
+        )
+        self.actionWriteIndex.setToolTip(
+            _translate(
+                "MainWindow",
+                "Append the infohash and magnet link of each written torrent to a file",
+            )
+        )
         self.actionAbout.setText(_translate("MainWindow", "About"))
         self.actionAbout.setShortcut(_translate("MainWindow", "F1"))
         self.actionQuit.setText(_translate("MainWindow", "Quit"))
@@ -0,0 +1,188 @@
+import bisect
+import os
+
+from torf_gui.engine import PROGRESS_INTERVAL, ProgressCallback
+from torf_gui.hasher import iter_piece_hashes
+from torf_gui.tuning import prefetch_files
+
+
+class VerifyResult:
+    """Outcome of :func:`verify_torrent`"""
+
+    def __init__(self, torrent, files):
+        self.torrent = torrent
+        self.files = files
+        self.pieces_checked = 0
+        self.bad_pieces = []
+        # File path -> error message of missing, unreadable or resized files
+        self.file_errors = {}
+        self.cancelled = False
+        offset = 0
+        self._offsets = []
+        for _, size in files:
+            self._offsets.append(offset)
+            offset += size
+
+    @property
+    def ok(self):
+        return not self.bad_pieces and not self.file_errors
+
+    @property
+    def complete(self):
+        """Whether all pieces were checked"""
+        return self.pieces_checked == self.torrent.pieces
+
+    def piece_files(self, index):
+        """Return the paths of the files piece `index` consists of"""
+        piece_size = self.torrent.piece_size
+        start = index * piece_size
+        first = bisect.bisect_right(self._offsets, start) - 1
+        last = bisect.bisect_left(self._offsets, start + piece_size)
+        return [
+            filepath
+            for filepath, size in self.files[first:last]
+            # Empty files don't belong to any piece and pad files aren't
+            # stored
+            if size and filepath is not None
+        ]
+
+    @property
+    def file_count(self):
+        """Number of files without pad files"""
+        return sum(1 for filepath, _ in self.files if filepath is not None)
+
+    @property
+    def bad_files(self):
+        """
+        Return the paths of all files with errors or in bad pieces, in order
+
+        Pieces span file boundaries, so a bad piece may also include files
+        that are fine.
+        """
+        bad = set(self.file_errors)
+        for index in self.bad_pieces:
+            bad.update(self.piece_files(index))
+        return [filepath for filepath, _ in self.files if filepath in bad]
+
+    def __str__(self):
+        if self.ok:
+            return f"All {self.pieces_checked} pieces are OK"
+        return (
+            f"{len(self.bad_pieces)} of {self.pieces_checked} checked pieces "
+            f"are bad, {len(self.bad_files)} of {self.file_count} files are "
+            "affected"
+        )
+
+
+def read_torrent(filepath):
+    """
+    Return the :class:`torf.Torrent` in `filepath` to verify data with
+
+    v2-only torrents have no v1 pieces to compare, so :class:`ValueError`
+    is raised for them.
+    """
+    import torf
+
+    torrent = torf.Torrent.read(filepath, validate=False)
+    info = torrent.metainfo["info"]
+    if "pieces" not in info and info.get("meta version") == 2:
+        raise ValueError(f"{filepath}: v2-only torrents can't be verified")
+    torrent.validate()
+    return torrent
+
+
+def data_files(torrent, path):
+    """
+    Return (filepath, size) for each file of `torrent` beneath `path`
+
+    `path` is the file or directory the torrent was created of, or the
+    directory that contains it. BEP 47 pad files aren't stored, so their
+    `filepath` is ``None``.
+    """
+    path = os.path.normpath(path)
+    if "files" not in torrent.metainfo["info"]:
+        if os.path.isdir(path):
+            path = os.path.join(path, torrent.name)
+        return [(path, torrent.size)]
+    if os.path.basename(path) != torrent.name and os.path.isdir(
+        os.path.join(path, torrent.name)
+    ):
+        path = os.path.join(path, torrent.name)
+    return [
+        (
+            None
+            if "p" in file.get("attr", "")
+            else os.path.join(path, *file["path"]),
+            file["length"],
+        )
+        for file in torrent.metainfo["info"]["files"]
+    ]
+
+
+def _check_sizes(files, file_errors):
+    # Files with the wrong size can't match even if all their pieces do
+    for filepath, size in files:
+        if filepath is None:
+            continue
+        try:
+            actual = os.path.getsize(filepath)
+        except OSError as exc:
+            file_errors[filepath] = exc.strerror or str(exc)
+            continue
+        if actual != size:
+            file_errors[filepath] = f"Size is {actual} bytes instead of {size}"
+
+
+def verify_torrent(
+    torrent,
+    path,
+    threads=None,
+    callback=None,
+    interval=PROGRESS_INTERVAL,
+    cancelled=None,
+    stop_on_error=False,
+    reader=None,
+    prefetch=None,
+):
+    """
+    Hash the data at `path` and compare it with the pieces of `torrent`
+
+    `path` is mapped onto the files of `torrent` by :func:`data_files`.
+    `callback`, `interval` and `cancelled` work like with
+    :func:`~torf_gui.engine.generate`. Verification stops at the first bad
+    piece or file if `stop_on_error` is true. `reader` is one of
+    :data:`~torf_gui.hasher.READERS` and `prefetch` works like with
+    :func:`~torf_gui.engine.generate`.
+
+    :return: :class:`VerifyResult`
+    """
+    files = data_files(torrent, path)
+    result = VerifyResult(torrent, files)
+    _check_sizes(files, result.file_errors)
+    if result.file_errors and stop_on_error:
+        return result
+
+    def on_error(filepath, exc):
+        result.file_errors.setdefault(filepath, exc.strerror or str(exc))
+
+    callback = ProgressCallback(callback, interval, cancelled)
+    expected = torrent.metainfo["info"]["pieces"]
+    pieces_total = torrent.pieces
+    if prefetch is None:
+        prefetch = prefetch_files(path)
+    hashes = iter_piece_hashes(
+        torrent, 0, threads, files, on_error, reader, prefetch=prefetch
+    )
+    try:
+        for index, filepath, piece_hash in hashes:
+            result.pieces_checked += 1
+            if piece_hash != expected[index * 20 : index * 20 + 20]:
+                result.bad_pieces.append(index)
+                if stop_on_error:
+                    break
+            if callback(torrent, filepath, index + 1, pieces_total):
+                result.cancelled = True
+                break
+    finally:
+        hashes.close()
+    return result
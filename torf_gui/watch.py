@@ -0,0 +1,245 @@
+import ctypes
+import ctypes.util
+import os
+import select
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from torf_gui.engine import snapshot, split_thread_budget
+
+# Seconds an entry must stay unchanged before a torrent is created of it
+SETTLE_TIME = 30
+
+# Seconds between checks of entries that haven't settled yet
+POLL_INTERVAL = 5
+
+# IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO |
+# IN_CREATE | IN_DELETE
+_INOTIFY_MASK = 0x2 | 0x4 | 0x8 | 0x40 | 0x80 | 0x100 | 0x200
+
+
+class PollingNotifier:
+    """Wake up the watcher every `interval` seconds"""
+
+    def __init__(self, interval=POLL_INTERVAL):
+        self.interval = interval
+        self._wakeup = threading.Event()
+
+    def wait(self, timeout=None):
+        """Wait until `timeout` seconds have passed or :meth:`wake`"""
+        self._wakeup.wait(self.interval if timeout is None else timeout)
+        self._wakeup.clear()
+
+    def wake(self):
+        self._wakeup.set()
+
+    def close(self):
+        pass
+
+
+class InotifyNotifier:
+    """
+    Wake up the watcher when an entry is added to, removed from or written
+    to directly in `path`
+
+    Only works on Linux. Changes deeper down aren't reported, which is fine
+    because entries are polled anyway until they have settled.
+    """
+
+    def __init__(self, path):
+        libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        self._fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self._fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed", path)
+        wd = libc.inotify_add_watch(self._fd, os.fsencode(path), _INOTIFY_MASK)
+        if wd < 0:
+            errno = ctypes.get_errno()
+            os.close(self._fd)
+            raise OSError(errno, "inotify_add_watch failed", path)
+        self._wakeup_r, self._wakeup_w = os.pipe()
+        os.set_blocking(self._wakeup_r, False)
+
+    def wait(self, timeout=None):
+        """Wait until `timeout` seconds have passed, `path` changed or
+        :meth:`wake`"""
+        ready, _, _ = select.select(
+            [self._fd, self._wakeup_r], [], [], timeout
+        )
+        for fd in ready:
+            try:
+                while os.read(fd, 65536):
+                    pass
+            except BlockingIOError:
+                pass
+
+    def wake(self):
+        os.write(self._wakeup_w, b"\0")
+
+    def close(self):
+        for fd in (self._fd, self._wakeup_r, self._wakeup_w):
+            os.close(fd)
+
+
+def notifier(path, interval=POLL_INTERVAL):
+    """Return an :class:`InotifyNotifier` if possible, else polling"""
+    if sys.platform.startswith("linux"):
+        try:
+            return InotifyNotifier(path)
+        except (OSError, AttributeError):
+            # AttributeError: libc without inotify
+            pass
+    return PollingNotifier(interval)
+
+
+class Watcher:
+    """
+    Create a torrent of each entry that appears in the input directory of
+    the :class:`~torf_gui.engine.BatchCreator` `batch`
+
+    Entries are queued once none of their files has been added, removed or
+    written to for `settle_time` seconds. Up to ``batch.jobs`` entries are
+    hashed at the same time. Entries whose torrents already exist are
+    skipped, so restarting the watcher doesn't create them again. Entries
+    that fail are only retried after they change.
+    """
+
+    def __init__(
+        self, batch, settle_time=SETTLE_TIME, poll_interval=POLL_INTERVAL
+    ):
+        save_dir = os.path.join(os.path.abspath(batch.save_dir), "")
+        if save_dir.startswith(os.path.join(os.path.abspath(batch.path), "")):
+            msg = "Output directory must not be inside the watched directory"
+            raise ValueError(msg)
+        self.batch = batch
+        self.settle_time = settle_time
+        self.poll_interval = poll_interval
+        self._notifier = None
+        self._stopped = threading.Event()
+        # Entry name -> (snapshot, time of the last change)
+        self._pending = {}
+        # Entry name -> snapshot of the last failed attempt
+        self._failed = {}
+        self._done = set()
+        # Entry name -> snapshot of queued and running entries
+        self._queued = {}
+
+    def stop(self):
+        """Stop watching and cancel running jobs"""
+        self._stopped.set()
+        self.batch.cancel()
+        if self._notifier is not None:
+            self._notifier.wake()
+
+    def is_written(self, name):
+        return all(map(os.path.exists, self.batch.output_paths(name)))
+
+    def _check(self, entry, now, report):
+        # Return whether `entry` has settled
+        name = entry.name
+        if name not in self._pending and self.is_written(name):
+            self._done.add(name)
+            report("skipped", name=name)
+            return False
+        try:
+            files = snapshot(entry)
+        except OSError:
+            # Removed or renamed while it was walked
+            files = None
+        if name in self._failed:
+            if self._failed[name] == files:
+                return False
+            del self._failed[name]
+        last = self._pending.get(name)
+        if last is None or last[0] != files or files is None:
+            self._pending[name] = (files, now)
+            return False
+        return now - last[1] >= self.settle_time
+
+    def poll(self, report):
+        """Return (entry, snapshot) for each entry that settled since the
+        last call"""
+        now = time.monotonic()
+        entries = self.batch.entries()
+        names = {entry.name for entry in entries}
+        settled = []
+        for entry in entries:
+            if entry.name in self._done or entry.name in self._queued:
+                continue
+            if self._check(entry, now, report):
+                files, _ = self._pending.pop(entry.name)
+                settled.append((entry, files))
+        # Forget removed entries so they are created again if they return
+        for name in set(self._pending) - names:
+            del self._pending[name]
+        for name in set(self._failed) - names:
+            del self._failed[name]
+        self._done &= names
+        return settled
+
+    def _finished(self, name, future, report):
+        files = self._queued.pop(name)
+        if self.batch.cancelled:
+            return
+        try:
+            future.result()
+        except Exception as e:
+            self._failed[name] = files
+            report("failed", name=name, message=str(e))
+            return
+        self._done.add(name)
+        if self.is_written(name):
+            report("created", name=name)
+        else:
+            report("skipped", name=name, message="Empty or all files excluded")
+
+    def _watch(self, executor, threads, report, entry_progress):
+        notifier = self._notifier
+        running = {}
+        while not self._stopped.is_set():
+            for name, future in list(running.items()):
+                if future.done():
+                    del running[name]
+                    self._finished(name, future, report)
+            for entry, files in self.poll(report):
+                self._queued[entry.name] = files
+                report("queued", name=entry.name)
+                future = executor.submit(
+                    self.batch.create_entry, entry, threads, entry_progress
+                )
+                future.add_done_callback(lambda f: notifier.wake())
+                running[entry.name] = future
+            # inotify reports new entries, so only poll while some are
+            # still settling
+            notifier.wait(self.poll_interval if self._pending else None)
+
+    def run(self, report=None, entry_progress=None):
+        """
+        Watch until :meth:`stop` is called
+
+        `report` is called with an event name ("queued", "created",
+        "skipped" or "failed") and the entry name as keyword argument
+        `name`, and an error `message` for failed entries.
+        `entry_progress` is passed on to
+        :meth:`~torf_gui.engine.BatchCreator.create_entry`.
+        """
+        if report is None:
+
+            def report(event, **data):
+                pass
+
+        jobs = self.batch.jobs
+        threads = split_thread_budget(self.batch.thread_budget(), jobs)
+        self._notifier = notifier(self.batch.path, self.poll_interval)
+        try:
+            with ThreadPoolExecutor(max_workers=jobs) as executor:
+                try:
+                    self._watch(executor, threads, report, entry_progress)
+                finally:
+                    # Also stop running jobs on KeyboardInterrupt
+                    self.stop()
+                    executor.shutdown(wait=True, cancel_futures=True)
+        finally:
+            self._notifier.close()
+            self._notifier = None